@@ -0,0 +1,217 @@
+"""
+Cover Art Variants
+Renders each cover once into a ladder of sizes in JPEG and WebP, stored under
+a hash of the source image so URLs carrying the hash can be cached forever
+"""
+
+import asyncio
+import hashlib
+import io
+import os
+import re
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from PIL import Image, features
+
+# Edge lengths (px) rendered for every cover, smallest first
+COVER_SIZES = (64, 160, 320, 640)
+
+COVER_FORMATS = {
+    "jpeg": {"pil": "JPEG", "ext": ".jpg", "media_type": "image/jpeg",
+             "options": {"quality": 85, "optimize": True, "progressive": True}},
+    "webp": {"pil": "WEBP", "ext": ".webp", "media_type": "image/webp",
+             "options": {"quality": 80, "method": 4}},
+}
+
+# Colours in a cover palette, dominant first
+PALETTE_SIZE = 5
+
+# Pillow builds without libwebp fall back to JPEG only
+WEBP_SUPPORTED = features.check("webp")
+RENDERED_FORMATS = tuple(fmt for fmt in COVER_FORMATS if fmt != "webp" or WEBP_SUPPORTED)
+
+_DIGEST = re.compile(r"^[0-9a-f]{40}$")
+
+
+def content_hash(data: bytes) -> str:
+    return hashlib.sha1(data).hexdigest()
+
+
+def is_content_hash(value: str) -> bool:
+    return bool(_DIGEST.match(value))
+
+
+def pick_size(requested: Optional[int]) -> int:
+    """Smallest rendered size at least as large as requested (the largest if none is)"""
+    if requested:
+        for size in COVER_SIZES:
+            if size >= requested:
+                return size
+    return COVER_SIZES[-1]
+
+
+def pick_format(requested: Optional[str], accept: str = "") -> str:
+    """Explicit format if given, otherwise WebP when the client accepts it"""
+    if requested == "webp" and WEBP_SUPPORTED:
+        return "webp"
+    if requested == "jpeg":
+        return "jpeg"
+    return "webp" if WEBP_SUPPORTED and "image/webp" in accept else "jpeg"
+
+
+def decode_cover(data: bytes, max_size: int = COVER_SIZES[-1]) -> Image.Image:
+    """
+    Decode image bytes to an RGB image no larger than max_size
+    
+    JPEGs are decoded straight at a reduced scale (draft mode), so large
+    embedded artwork never has to be decoded at full resolution.
+    """
+    img = Image.open(io.BytesIO(data))
+    img.draft("RGB", (max_size, max_size))
+    img = img.convert("RGB")
+    img.thumbnail((max_size, max_size), Image.Resampling.LANCZOS)
+    return img
+
+
+def encode_cover(img: Image.Image, fmt: str) -> bytes:
+    spec = COVER_FORMATS[fmt]
+    buffer = io.BytesIO()
+    img.save(buffer, spec["pil"], **spec["options"])
+    return buffer.getvalue()
+
+
+def render_variants(img: Image.Image, dest: Path):
+    """
+    Write every size and format of a decoded cover into dest
+    
+    Each size is scaled down from the one above it rather than from the
+    source, and files are written via temp names so concurrent renders
+    never expose a partial image.
+    """
+    dest.mkdir(parents=True, exist_ok=True)
+    
+    current = img
+    for size in reversed(COVER_SIZES):
+        if max(current.size) > size:
+            current = current.copy()
+            current.thumbnail((size, size), Image.Resampling.LANCZOS)
+        for fmt in RENDERED_FORMATS:
+            path = dest / f"{size}{COVER_FORMATS[fmt]['ext']}"
+            tmp_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+            tmp_path.write_bytes(encode_cover(current, fmt))
+            os.replace(tmp_path, path)
+
+
+def cover_palette(img: Image.Image, count: int = PALETTE_SIZE, iterations: int = 8) -> List[str]:
+    """
+    Dominant colours of a (small) image as hex strings, most common first
+    
+    Seeds with the most populated cells of a coarse 8x8x8 colour grid, then
+    refines them with a few k-means steps over all pixels.
+    """
+    pixels = np.asarray(img.convert("RGB"), dtype=np.float32).reshape(-1, 3)
+    cells = (pixels // 32).astype(np.int64)
+    keys = cells[:, 0] * 64 + cells[:, 1] * 8 + cells[:, 2]
+    counts = np.bincount(keys, minlength=512)
+    seeds = [key for key in np.argsort(counts)[::-1][:count] if counts[key]]
+    centers = np.stack([pixels[keys == key].mean(axis=0) for key in seeds])
+    
+    for _ in range(iterations):
+        distances = ((pixels[:, None, :] - centers[None, :, :]) ** 2).sum(axis=2)
+        labels = distances.argmin(axis=1)
+        sizes = np.bincount(labels, minlength=len(centers))
+        sums = np.stack([np.bincount(labels, weights=pixels[:, channel], minlength=len(centers))
+                         for channel in range(3)], axis=1)
+        centers = np.where(sizes[:, None] > 0, sums / np.maximum(sizes, 1)[:, None], centers)
+    
+    order = np.argsort(sizes)[::-1]
+    return ["#%02x%02x%02x" % tuple(int(round(c)) for c in centers[index]) for index in order if sizes[index]]
+
+
+class CoverStore:
+    """
+    Content-addressed cover variants on disk
+    
+    Variants of a source image live in variants/<hash of its bytes>/, so an
+    image shared by many tracks or albums is stored and rendered once. The
+    scanner renders embedded artwork as it extracts it; other sources (folder
+    cover.jpg files) are rendered on first request. Source hashes are
+    remembered per (path, size, mtime) so each file is hashed once.
+    """
+    
+    def __init__(self, cover_folder: str = "./covers"):
+        self.root = Path(cover_folder) / "variants"
+        self.root.mkdir(parents=True, exist_ok=True)
+        self._hashes: Dict[Tuple[str, int, int], str] = {}
+        self._rendering: Dict[str, asyncio.Task] = {}
+        # Hashes whose variants are known to be on disk (variants are never deleted)
+        self._rendered = set()
+    
+    def variant_dir(self, digest: str) -> Path:
+        return self.root / digest[:2] / digest
+    
+    def variant_path(self, digest: str, size: int, fmt: str) -> Path:
+        return self.variant_dir(digest) / f"{size}{COVER_FORMATS[fmt]['ext']}"
+    
+    def has_variants(self, digest: str) -> bool:
+        """Whether every variant of a hash has been rendered"""
+        # Variants are written largest first, so the smallest one is written last
+        return self.variant_path(digest, COVER_SIZES[0], RENDERED_FORMATS[-1]).exists()
+    
+    def render(self, data: bytes, digest: Optional[str] = None) -> str:
+        """Render image bytes unless their hash already has variants. Returns the hash."""
+        digest = digest or content_hash(data)
+        if not self.has_variants(digest):
+            render_variants(decode_cover(data), self.variant_dir(digest))
+        return digest
+    
+    def palette(self, digest: str) -> List[str]:
+        """Palette of a stored cover, computed from its smallest variant"""
+        with Image.open(self.variant_path(digest, COVER_SIZES[0], "jpeg")) as img:
+            return cover_palette(img)
+    
+    def source_hash(self, source: Path, stat_result: Optional[os.stat_result] = None) -> str:
+        """Hash of a source image's bytes, cached until the file changes"""
+        stat_result = stat_result or source.stat()
+        key = (str(source), stat_result.st_size, stat_result.st_mtime_ns)
+        digest = self._hashes.get(key)
+        if digest is None:
+            digest = content_hash(source.read_bytes())
+            self._hashes[key] = digest
+        return digest
+    
+    async def variant(self, source: Path, size: int, fmt: str,
+                      version: Optional[Tuple[int, int]] = None) -> Tuple[Path, str]:
+        """
+        Path of one variant of a source image, rendering all variants first if needed
+        
+        version is the source's (size, mtime_ns) as last indexed; with it, a
+        source hashed before is served without touching the file. Returns
+        (variant path, source hash). Raises OSError if the source is missing
+        or not an image.
+        """
+        loop = asyncio.get_running_loop()
+        key = (str(source), *version) if version else None
+        digest = self._hashes.get(key)
+        if digest is None:
+            stat_result = await loop.run_in_executor(None, os.stat, source)
+            digest = await loop.run_in_executor(None, self.source_hash, source, stat_result)
+            if key:
+                self._hashes[key] = digest
+        
+        path = self.variant_path(digest, size, fmt)
+        if digest not in self._rendered:
+            if not await loop.run_in_executor(None, self.has_variants, digest):
+                task = self._rendering.get(digest)
+                if task is None:
+                    task = asyncio.ensure_future(loop.run_in_executor(None, self._render, source, digest))
+                    self._rendering[digest] = task
+                    task.add_done_callback(lambda _: self._rendering.pop(digest, None))
+                await asyncio.shield(task)
+            self._rendered.add(digest)
+        return path, digest
+    
+    def _render(self, source: Path, digest: str):
+        self.render(source.read_bytes(), digest)
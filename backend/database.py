@@ -1,21 +1,113 @@
 import sqlite3
 import json
-from typing import List, Optional, Dict, Any
+import re
+import os
+import base64
+import asyncio
+import functools
+import threading
+import unicodedata
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import List, Optional, Dict, Any, Iterable, Tuple
 from datetime import datetime
 from pathlib import Path
 
+from covers import COVER_SIZES
+
+# Release noise stripped from titles before matching, as the scanner strips it from filenames:
+# bracketed anywhere, bare only as a trailing suffix so titles like "Lyrics of Love" survive
+TITLE_NOISE = re.compile(
+    r"[(\[][^)\]]*\b(?:official|lyrics?|audio|video|visuali[sz]er|hd|hq|4k|feat|ft|featuring)\b[^)\]]*[)\]]"
+)
+TITLE_NOISE_SUFFIX = re.compile(
+    r"(?:\s*[-|:]\s*|\s+)(?:official (?:music |lyric )?video|official audio|lyric video|music video|lyrics)\s*$"
+)
+# Featured artists, in a title or an artist name
+FEATURING = re.compile(r"\s(?:feat|ft|featuring)\b\.?.*$")
+# YouTube auto-generated and label channel names ("Artist - Topic", "ArtistVEVO")
+CHANNEL_SUFFIX = re.compile(r"(?:\s*-\s*topic|vevo)$")
+
 
 class Database:
     """SQLite database for music library"""
     
-    def __init__(self, db_path: str = "./music_library.db"):
+    # Palette of a track (aliased t): its embedded art's, or else its folder cover.jpg's
+    TRACK_PALETTE = """
+        COALESCE((SELECT palette FROM covers WHERE covers.hash = t.cover_hash),
+                 (SELECT c.palette FROM folder_assets fa JOIN covers c ON c.hash = fa.hash
+                  WHERE fa.folder = t.folder AND fa.asset = 'cover.jpg'))
+    """
+    
+    # Columns needed to render tracks in list responses - lyrics are only loaded by get_track
+    TRACK_LIST_COLUMNS = f"""
+        t.id, t.title, t.artist, t.artist_id, t.album, t.album_id, t.duration_ms, t.track_number,
+        t.file_path, t.image_path, t.cover_hash, t.is_saved, t.is_available, t.has_enhanced_version,
+        t.enhanced_file_path, t.enhancement_preset, t.has_lyrics,
+        {TRACK_PALETTE} AS cover_palette
+    """
+    
+    # Album columns with the palette of the album's cover, or else of a folder cover.jpg next to its tracks
+    ALBUM_COLUMNS = """
+        albums.*, COALESCE((SELECT palette FROM covers WHERE covers.hash = albums.cover_hash),
+                           (SELECT c.palette FROM tracks t JOIN folder_assets fa ON fa.folder = t.folder
+                            AND fa.asset = 'cover.jpg' JOIN covers c ON c.hash = fa.hash
+                            WHERE t.album_id = albums.id AND c.palette IS NOT NULL LIMIT 1)) AS cover_palette
+    """
+    
+    # bm25 column weights for tracks_fts: title, artist, album, genre
+    SEARCH_RANK_WEIGHTS = (10.0, 5.0, 4.0, 1.0)
+    
+    # Insert a track row from _track_row, or update it keeping its saved state, play count and enhancement
+    UPSERT_TRACK = """
+        INSERT INTO tracks 
+        (id, title, artist, artist_id, album, album_id, duration_ms, 
+         track_number, year, genre, file_path, folder, image_path, cover_hash, lyrics, has_lyrics,
+         has_enhanced_version, enhanced_file_path, title_key, artist_key)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ON CONFLICT(id) DO UPDATE SET
+            title = excluded.title,
+            artist = excluded.artist,
+            artist_id = excluded.artist_id,
+            album = excluded.album,
+            album_id = excluded.album_id,
+            duration_ms = excluded.duration_ms,
+            track_number = excluded.track_number,
+            year = excluded.year,
+            genre = excluded.genre,
+            file_path = excluded.file_path,
+            folder = excluded.folder,
+            image_path = excluded.image_path,
+            cover_hash = excluded.cover_hash,
+            lyrics = excluded.lyrics,
+            has_lyrics = excluded.has_lyrics,
+            has_enhanced_version = MAX(tracks.has_enhanced_version, excluded.has_enhanced_version),
+            enhanced_file_path = COALESCE(excluded.enhanced_file_path, tracks.enhanced_file_path),
+            title_key = excluded.title_key,
+            artist_key = excluded.artist_key,
+            is_available = 1
+    """
+    
+    def __init__(self, db_path: str = "./music_library.db", pool_size: Optional[int] = None):
         self.db_path = db_path
+        self.pool_size = pool_size or int(os.getenv("DB_POOL_SIZE", "0")) or min(8, (os.cpu_count() or 1) + 2)
+        # Single writer connection - every write goes through _writer(), which holds _write_lock
         self.conn = None
+        self._write_lock = threading.RLock()
+        # One read-only connection per thread, opened lazily by _reader()
+        self._local = threading.local()
+        self._readers: List[sqlite3.Connection] = []
+        self._readers_lock = threading.Lock()
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self.aio = AsyncDatabase(self)
     
     def init_db(self):
         """Initialize database with tables"""
-        self.conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        self.conn = sqlite3.connect(self.db_path, check_same_thread=False, timeout=30)
         self.conn.row_factory = sqlite3.Row
+        # WAL lets the read connections run alongside the writer instead of blocking on it
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
         
         cursor = self.conn.cursor()
         
@@ -41,10 +133,35 @@ class Database:
                 has_enhanced_version INTEGER DEFAULT 0,
                 enhanced_file_path TEXT,
                 enhancement_preset TEXT,
-                enhanced_at TIMESTAMP
+                enhanced_at TIMESTAMP,
+                is_available INTEGER DEFAULT 1
             )
         """)
         
+        # Columns added after the initial schema
+        self._add_column_if_missing(cursor, "tracks", "is_available", "INTEGER DEFAULT 1")
+        self._add_column_if_missing(cursor, "tracks", "cover_hash", "TEXT")
+        self._add_column_if_missing(cursor, "tracks", "folder", "TEXT")
+        self._add_column_if_missing(cursor, "tracks", "title_key", "TEXT")
+        self._add_column_if_missing(cursor, "tracks", "artist_key", "TEXT")
+        self._add_column_if_missing(cursor, "tracks", "has_lyrics", "INTEGER")
+        
+        # Whether a track has lyrics, kept on write so list queries never read the (often overflowing) text
+        cursor.execute("""
+            UPDATE tracks SET lyrics = NULLIF(lyrics, ''), has_lyrics = (lyrics IS NOT NULL AND lyrics != '')
+            WHERE has_lyrics IS NULL
+        """)
+        
+        # Normalized title/artist keys used by duplicate checks
+        cursor.execute("SELECT id, title, artist FROM tracks WHERE title_key IS NULL OR artist_key IS NULL")
+        cursor.executemany("UPDATE tracks SET title_key = ?, artist_key = ? WHERE id = ?",
+                           [(*self.match_keys(row[1], row[2]), row[0]) for row in cursor.fetchall()])
+        
+        # Directory of each track's file, the key into folder_assets
+        cursor.execute("SELECT id, file_path FROM tracks WHERE folder IS NULL")
+        cursor.executemany("UPDATE tracks SET folder = ? WHERE id = ?",
+                           [(os.path.dirname(row[1]), row[0]) for row in cursor.fetchall()])
+        
         # Albums table
         cursor.execute("""
             CREATE TABLE IF NOT EXISTS albums (
@@ -59,6 +176,18 @@ class Database:
                 created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
             )
         """)
+        self._add_column_if_missing(cursor, "albums", "cover_hash", "TEXT")
+        
+        # Covers - one row per distinct artwork image, keyed by the hash of its bytes
+        # (rendered sizes live in covers/variants/<hash>/)
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS covers (
+                hash TEXT PRIMARY KEY,
+                palette TEXT,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        """)
+        self._add_column_if_missing(cursor, "covers", "palette", "TEXT")
         
         # Artists table
         cursor.execute("""
@@ -96,43 +225,296 @@ class Database:
             )
         """)
         
+        # File manifest - last seen on-disk state of every scanned audio file
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS file_manifest (
+                path TEXT PRIMARY KEY,
+                size INTEGER NOT NULL,
+                mtime_ns INTEGER NOT NULL,
+                inode INTEGER NOT NULL,
+                scanned_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        """)
+        
+        # Waveform peaks - (min, max) int8 pairs per bucket, computed once per file version
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS waveforms (
+                track_id TEXT PRIMARY KEY,
+                resolution INTEGER NOT NULL,
+                peaks BLOB NOT NULL,
+                file_size INTEGER NOT NULL,
+                file_mtime_ns INTEGER NOT NULL,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        """)
+        cursor.execute("""
+            CREATE TRIGGER IF NOT EXISTS trg_tracks_waveform_delete AFTER DELETE ON tracks
+            BEGIN
+                DELETE FROM waveforms WHERE track_id = OLD.id;
+            END
+        """)
+        
+        # Acoustic fingerprints - uint32 sub-fingerprints of each track's opening seconds, plus
+        # a sample of them indexed by value so near-duplicates are found without comparing every track
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS fingerprints (
+                track_id TEXT PRIMARY KEY,
+                fingerprint BLOB NOT NULL,
+                file_size INTEGER NOT NULL,
+                file_mtime_ns INTEGER NOT NULL,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        """)
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS fingerprint_keys (
+                hash INTEGER NOT NULL,
+                track_id TEXT NOT NULL,
+                PRIMARY KEY (hash, track_id)
+            ) WITHOUT ROWID
+        """)
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_fingerprint_keys_track ON fingerprint_keys(track_id)")
+        cursor.execute("""
+            CREATE TRIGGER IF NOT EXISTS trg_tracks_fingerprint_delete AFTER DELETE ON tracks
+            BEGIN
+                DELETE FROM fingerprints WHERE track_id = OLD.id;
+                DELETE FROM fingerprint_keys WHERE track_id = OLD.id;
+            END
+        """)
+        
+        # Folder assets - sidecar files (lyrics.lrc, cover.jpg, canvas videos) found next to tracks
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS folder_assets (
+                folder TEXT NOT NULL,
+                asset TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                mtime_ns INTEGER NOT NULL,
+                PRIMARY KEY (folder, asset)
+            ) WITHOUT ROWID
+        """)
+        # Content hash of a folder cover.jpg, which keys its rendered variants and palette in covers
+        self._add_column_if_missing(cursor, "folder_assets", "hash", "TEXT")
+        
         # Create indexes for better performance
         cursor.execute("CREATE INDEX IF NOT EXISTS idx_tracks_artist ON tracks(artist_id)")
         cursor.execute("CREATE INDEX IF NOT EXISTS idx_tracks_album ON tracks(album_id)")
         cursor.execute("CREATE INDEX IF NOT EXISTS idx_albums_artist ON albums(artist_id)")
         cursor.execute("CREATE INDEX IF NOT EXISTS idx_tracks_title ON tracks(title)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_tracks_artist_album ON tracks(artist_id, album_id)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_tracks_match_keys ON tracks(artist_key, title_key, duration_ms)")
+        
+        # Composite (sort key, id) indexes for keyset pagination
+        cursor.execute("DROP INDEX IF EXISTS idx_tracks_available_title")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_tracks_available_title_id ON tracks(is_available, title, id)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_albums_name_id ON albums(name, id)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_artists_name_id ON artists(name, id)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_playlists_created_id ON playlists(created_at, id)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_playlist_tracks_position ON playlist_tracks(playlist_id, position, track_id)")
+        
+        self._create_count_triggers(cursor)
+        self._create_search_index(cursor)
         
         self.conn.commit()
     
-    def check_duplicate_track(self, title: str, artist: str, duration_ms: int = None) -> Optional[Dict]:
-        """Check if track already exists in database"""
-        cursor = self.conn.cursor()
+    def close(self):
+        """Close the thread pool and every connection"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+        with self._readers_lock:
+            for conn in self._readers:
+                conn.close()
+            self._readers.clear()
+        self._local = threading.local()
+        if self.conn is not None:
+            with self._write_lock:
+                self.conn.close()
+                self.conn = None
+    
+    @property
+    def executor(self) -> ThreadPoolExecutor:
+        """Thread pool that AsyncDatabase runs queries on"""
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.pool_size, thread_name_prefix="db")
+        return self._executor
+    
+    def _reader(self) -> sqlite3.Connection:
+        """Return this thread's read-only connection, opening it on first use"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            # check_same_thread is off only so close() can run from the shutdown thread
+            conn = sqlite3.connect(f"{Path(self.db_path).resolve().as_uri()}?mode=ro", uri=True,
+                                   check_same_thread=False, timeout=30)
+            conn.row_factory = sqlite3.Row
+            self._local.conn = conn
+            with self._readers_lock:
+                self._readers.append(conn)
+        return conn
+    
+    @contextmanager
+    def _writer(self):
+        """Yield a cursor on the writer connection, committing on success and rolling back on error"""
+        with self._write_lock:
+            cursor = self.conn.cursor()
+            try:
+                yield cursor
+                self.conn.commit()
+            except Exception:
+                self.conn.rollback()
+                raise
+    
+    def _create_search_index(self, cursor):
+        """
+        Create the FTS5 index over track title, artist, album and genre
+        
+        The index is an external-content table keyed by the tracks rowid and
+        kept in sync by triggers. Run rebuild_search_index() after a VACUUM,
+        which may renumber rowids.
+        """
+        cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'tracks_fts'")
+        needs_rebuild = cursor.fetchone() is None
+        
+        cursor.execute("""
+            CREATE VIRTUAL TABLE IF NOT EXISTS tracks_fts USING fts5(
+                title, artist, album, genre,
+                content = 'tracks',
+                content_rowid = 'rowid',
+                tokenize = 'unicode61 remove_diacritics 2',
+                prefix = '2 3'
+            )
+        """)
+        
+        cursor.execute("""
+            CREATE TRIGGER IF NOT EXISTS trg_tracks_fts_insert AFTER INSERT ON tracks
+            BEGIN
+                INSERT INTO tracks_fts (rowid, title, artist, album, genre)
+                VALUES (NEW.rowid, NEW.title, NEW.artist, NEW.album, NEW.genre);
+            END
+        """)
+        
+        cursor.execute("""
+            CREATE TRIGGER IF NOT EXISTS trg_tracks_fts_delete AFTER DELETE ON tracks
+            BEGIN
+                INSERT INTO tracks_fts (tracks_fts, rowid, title, artist, album, genre)
+                VALUES ('delete', OLD.rowid, OLD.title, OLD.artist, OLD.album, OLD.genre);
+            END
+        """)
+        
+        cursor.execute("""
+            CREATE TRIGGER IF NOT EXISTS trg_tracks_fts_update AFTER UPDATE OF title, artist, album, genre ON tracks
+            BEGIN
+                INSERT INTO tracks_fts (tracks_fts, rowid, title, artist, album, genre)
+                VALUES ('delete', OLD.rowid, OLD.title, OLD.artist, OLD.album, OLD.genre);
+                INSERT INTO tracks_fts (rowid, title, artist, album, genre)
+                VALUES (NEW.rowid, NEW.title, NEW.artist, NEW.album, NEW.genre);
+            END
+        """)
+        
+        # Index tracks that were added before the search index existed
+        if needs_rebuild:
+            cursor.execute("INSERT INTO tracks_fts (tracks_fts) VALUES ('rebuild')")
+    
+    def rebuild_search_index(self):
+        """Rebuild the full-text search index from the tracks table"""
+        with self._writer() as cursor:
+            cursor.execute("INSERT INTO tracks_fts (tracks_fts) VALUES ('rebuild')")
+    
+    def _add_column_if_missing(self, cursor, table: str, column: str, definition: str):
+        """Add a column to an existing table (for databases created by older versions)"""
+        cursor.execute(f"PRAGMA table_info({table})")
+        if column not in {row[1] for row in cursor.fetchall()}:
+            cursor.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+    
+    def _create_count_triggers(self, cursor):
+        """
+        Keep albums.total_tracks, artists.total_tracks and artists.total_albums
+        up to date as tracks are inserted, deleted or re-tagged. Album and artist
+        rows must exist before their tracks are written.
+        """
+        cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'trigger' AND name = 'trg_tracks_counts_insert'")
+        needs_reconcile = cursor.fetchone() is None
+        
+        cursor.execute("""
+            CREATE TRIGGER IF NOT EXISTS trg_tracks_counts_insert AFTER INSERT ON tracks
+            BEGIN
+                UPDATE albums SET total_tracks = total_tracks + 1 WHERE id = NEW.album_id;
+                UPDATE artists SET
+                    total_tracks = total_tracks + 1,
+                    total_albums = total_albums + NOT EXISTS (
+                        SELECT 1 FROM tracks
+                        WHERE artist_id = NEW.artist_id AND album_id = NEW.album_id AND id != NEW.id
+                    )
+                WHERE id = NEW.artist_id;
+            END
+        """)
+        
+        cursor.execute("""
+            CREATE TRIGGER IF NOT EXISTS trg_tracks_counts_delete AFTER DELETE ON tracks
+            BEGIN
+                UPDATE albums SET total_tracks = total_tracks - 1 WHERE id = OLD.album_id;
+                UPDATE artists SET
+                    total_tracks = total_tracks - 1,
+                    total_albums = total_albums - NOT EXISTS (
+                        SELECT 1 FROM tracks WHERE artist_id = OLD.artist_id AND album_id = OLD.album_id
+                    )
+                WHERE id = OLD.artist_id;
+            END
+        """)
+        
+        cursor.execute("""
+            CREATE TRIGGER IF NOT EXISTS trg_tracks_counts_update AFTER UPDATE OF album_id, artist_id ON tracks
+            WHEN OLD.album_id IS NOT NEW.album_id OR OLD.artist_id IS NOT NEW.artist_id
+            BEGIN
+                UPDATE albums SET total_tracks = total_tracks - 1 WHERE id = OLD.album_id;
+                UPDATE artists SET
+                    total_tracks = total_tracks - 1,
+                    total_albums = total_albums - NOT EXISTS (
+                        SELECT 1 FROM tracks WHERE artist_id = OLD.artist_id AND album_id = OLD.album_id
+                    )
+                WHERE id = OLD.artist_id;
+                UPDATE albums SET total_tracks = total_tracks + 1 WHERE id = NEW.album_id;
+                UPDATE artists SET
+                    total_tracks = total_tracks + 1,
+                    total_albums = total_albums + NOT EXISTS (
+                        SELECT 1 FROM tracks
+                        WHERE artist_id = NEW.artist_id AND album_id = NEW.album_id AND id != NEW.id
+                    )
+                WHERE id = NEW.artist_id;
+            END
+        """)
+        
+        # Databases created before the triggers existed may have drifted counts
+        if needs_reconcile:
+            self._reconcile_counts(cursor, repair=True)
+    
+    def check_duplicate_track(self, title: str, artist: str, duration_ms: int = None,
+                              tolerance_ms: int = 5000) -> Optional[Dict]:
+        """
+        Find a track with the same normalized title and artist (see match_keys)
+        
+        With duration_ms, only tracks within tolerance_ms of it - or of unknown
+        length - match, closest first and those of unknown length last. Returns
+        the match's id, title, artist and duration_ms.
+        """
+        cursor = self._reader().cursor()
+        title_key, artist_key = self.match_keys(title, artist)
         
         try:
-            # Check by exact title and artist
-            cursor.execute("""
-                SELECT * FROM tracks 
-                WHERE LOWER(title) = LOWER(?) AND LOWER(artist) = LOWER(?)
-            """, (title.strip(), artist.strip()))
-            
-            row = cursor.fetchone()
-            if row:
-                return self._row_to_dict(row)
-            
-            # If duration provided, check with similar duration (within 5 seconds)
             if duration_ms:
                 cursor.execute("""
-                    SELECT * FROM tracks 
-                    WHERE LOWER(title) = LOWER(?) 
-                    AND LOWER(artist) = LOWER(?)
-                    AND ABS(duration_ms - ?) < 5000
-                """, (title.strip(), artist.strip(), duration_ms))
-                
-                row = cursor.fetchone()
-                if row:
-                    return self._row_to_dict(row)
+                    SELECT id, title, artist, duration_ms FROM tracks
+                    WHERE artist_key = ? AND title_key = ?
+                      AND (duration_ms BETWEEN ? AND ? OR duration_ms IS NULL OR duration_ms = 0)
+                    ORDER BY duration_ms IS NULL OR duration_ms = 0, ABS(duration_ms - ?)
+                    LIMIT 1
+                """, (artist_key, title_key, duration_ms - tolerance_ms, duration_ms + tolerance_ms, duration_ms))
+            else:
+                cursor.execute("""
+                    SELECT id, title, artist, duration_ms FROM tracks
+                    WHERE artist_key = ? AND title_key = ? LIMIT 1
+                """, (artist_key, title_key))
             
-            return None
+            row = cursor.fetchone()
+            return self._row_to_dict(row) if row else None
             
         except Exception as e:
             print(f"Error checking duplicate: {e}")
@@ -141,51 +523,392 @@ class Database:
     def add_track(self, track_id: str, title: str, artist: str, artist_id: str,
                   album: str, album_id: str, duration_ms: int, track_number: Optional[int],
                   year: Optional[int], genre: Optional[str], file_path: str,
-                  image_path: Optional[str], lyrics: Optional[str] = None):
+                  image_path: Optional[str], lyrics: Optional[str] = None, cover_hash: Optional[str] = None):
         """Add or update a track in the database"""
-        cursor = self.conn.cursor()
+        self.add_tracks([{
+            "track_id": track_id,
+            "title": title,
+            "artist": artist,
+            "artist_id": artist_id,
+            "album": album,
+            "album_id": album_id,
+            "duration_ms": duration_ms,
+            "track_number": track_number,
+            "year": year,
+            "genre": genre,
+            "file_path": file_path,
+            "image_path": image_path,
+            "cover_hash": cover_hash,
+            "lyrics": lyrics
+        }])
+    
+    def add_tracks(self, tracks: List[Dict]) -> List[str]:
+        """
+        Add or update a batch of tracks in a single transaction
         
-        try:
-            # Insert or update track
-            cursor.execute("""
-                INSERT OR REPLACE INTO tracks 
-                (id, title, artist, artist_id, album, album_id, duration_ms, 
-                 track_number, year, genre, file_path, image_path, lyrics)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            """, (track_id, title, artist, artist_id, album, album_id, duration_ms,
-                  track_number, year, genre, file_path, image_path, lyrics))
+        Each dict holds add_track's keyword arguments, plus an optional
+        enhanced_file_path. Existing rows keep their saved state, play count
+        and enhancement info. A file already indexed under another id (its
+        path keyed differently before) replaces that track. Album and artist
+        counts are maintained by the tracks triggers.
+        
+        Returns the ids of the tracks written. A track that can't be
+        written is logged and left out rather than failing the whole batch;
+        errors that stop the batch itself are raised.
+        """
+        if not tracks:
+            return []
+        
+        with self._writer() as cursor:
+            cursor.executemany("INSERT OR IGNORE INTO covers (hash) VALUES (?)",
+                               [(t["cover_hash"],) for t in tracks if t.get("cover_hash")])
             
-            # Update or insert artist
-            cursor.execute("""
+            # Update or insert artists and albums first, so the count triggers find their rows
+            cursor.executemany("""
                 INSERT OR IGNORE INTO artists (id, name, image_path)
                 VALUES (?, ?, ?)
-            """, (artist_id, artist, image_path))
+            """, [(t["artist_id"], t["artist"], t.get("image_path")) for t in tracks])
+        
+            cursor.executemany("""
+                INSERT OR IGNORE INTO albums (id, name, artist, artist_id, year, image_path, cover_hash)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+            """, [(t["album_id"], t["album"], t["artist"], t["artist_id"], t.get("year"), t.get("image_path"),
+                   t.get("cover_hash")) for t in tracks])
             
-            # Update or insert album
-            cursor.execute("""
-                INSERT OR IGNORE INTO albums (id, name, artist, artist_id, year, image_path)
-                VALUES (?, ?, ?, ?, ?, ?)
-            """, (album_id, album, artist, artist_id, year, image_path))
+            # Albums created before their art was found pick it up from the first track that has it
+            cursor.executemany("""
+                UPDATE albums SET cover_hash = ?, image_path = ?
+                WHERE id = ? AND cover_hash IS NULL
+            """, [(t["cover_hash"], t.get("image_path"), t["album_id"]) for t in tracks if t.get("cover_hash")])
             
-            # Update album track count
-            cursor.execute("""
-                UPDATE albums SET total_tracks = (
-                    SELECT COUNT(*) FROM tracks WHERE album_id = ?
-                ) WHERE id = ?
-            """, (album_id, album_id))
+            # file_path is unique too - drop rows holding a batch file under another id
+            cursor.executemany("DELETE FROM tracks WHERE file_path = ? AND id != ?",
+                               [(t["file_path"], t["track_id"]) for t in tracks])
             
-            # Update artist counts
-            cursor.execute("""
-                UPDATE artists SET 
-                    total_tracks = (SELECT COUNT(*) FROM tracks WHERE artist_id = ?),
-                    total_albums = (SELECT COUNT(DISTINCT album_id) FROM tracks WHERE artist_id = ?)
-                WHERE id = ?
-            """, (artist_id, artist_id, artist_id))
+            rows = [self._track_row(t) for t in tracks]
+            cursor.execute("SAVEPOINT add_tracks")
+            try:
+                cursor.executemany(self.UPSERT_TRACK, rows)
+                cursor.execute("RELEASE add_tracks")
+                return [t["track_id"] for t in tracks]
+            except sqlite3.DatabaseError as e:
+                cursor.execute("ROLLBACK TO add_tracks")
+                cursor.execute("RELEASE add_tracks")
+                print(f"Error adding {len(tracks)} tracks ({e}) - retrying one at a time")
             
-            self.conn.commit()
+            # Some row is bad (e.g. two batch tracks for one file) - write the others around it
+            written = []
+            for t, row in zip(tracks, rows):
+                cursor.execute("SAVEPOINT add_track")
+                try:
+                    cursor.execute(self.UPSERT_TRACK, row)
+                    written.append(t["track_id"])
+                except sqlite3.DatabaseError as e:
+                    cursor.execute("ROLLBACK TO add_track")
+                    print(f"Error adding track {t['file_path']}: {e}")
+                cursor.execute("RELEASE add_track")
+            return written
+    
+    def _track_row(self, t: Dict) -> tuple:
+        """UPSERT_TRACK parameters for an add_tracks dict"""
+        return (t["track_id"], t["title"], t["artist"], t["artist_id"], t["album"], t["album_id"],
+                t["duration_ms"], t.get("track_number"), t.get("year"), t.get("genre"),
+                t["file_path"], os.path.dirname(t["file_path"]), t.get("image_path"), t.get("cover_hash"),
+                t.get("lyrics") or None, 1 if t.get("lyrics") else 0,
+                1 if t.get("enhanced_file_path") else 0, t.get("enhanced_file_path"),
+                *self.match_keys(t["title"], t["artist"]))
+    
+    def reconcile_counts(self, repair: bool = False) -> Dict:
+        """Verify album/artist counters against the tracks table, optionally repairing drift"""
+        try:
+            with self._writer() as cursor:
+                return self._reconcile_counts(cursor, repair)
+        except Exception as e:
+            print(f"Error reconciling counts: {e}")
+            raise
+    
+    def _reconcile_counts(self, cursor, repair: bool) -> Dict:
+        """Find (and optionally fix) albums and artists whose stored counts have drifted"""
+        cursor.execute("""
+            SELECT a.id, a.name, a.total_tracks,
+                   (SELECT COUNT(*) FROM tracks t WHERE t.album_id = a.id) AS actual_tracks
+            FROM albums a
+            WHERE a.total_tracks IS NOT actual_tracks
+        """)
+        albums = [self._row_to_dict(row) for row in cursor.fetchall()]
+        
+        cursor.execute("""
+            SELECT a.id, a.name, a.total_tracks, a.total_albums,
+                   (SELECT COUNT(*) FROM tracks t WHERE t.artist_id = a.id) AS actual_tracks,
+                   (SELECT COUNT(DISTINCT album_id) FROM tracks t WHERE t.artist_id = a.id) AS actual_albums
+            FROM artists a
+            WHERE a.total_tracks IS NOT actual_tracks OR a.total_albums IS NOT actual_albums
+        """)
+        artists = [self._row_to_dict(row) for row in cursor.fetchall()]
+        
+        if repair:
+            cursor.executemany("UPDATE albums SET total_tracks = ? WHERE id = ?",
+                               [(a["actual_tracks"], a["id"]) for a in albums])
+            cursor.executemany("UPDATE artists SET total_tracks = ?, total_albums = ? WHERE id = ?",
+                               [(a["actual_tracks"], a["actual_albums"], a["id"]) for a in artists])
+        
+        return {
+            "albums": albums,
+            "artists": artists,
+            "drifted": len(albums) + len(artists),
+            "repaired": repair
+        }
+    
+    # File manifest operations
+    def get_file_manifest(self, prefix: Optional[str] = None) -> Dict[str, tuple]:
+        """Get the recorded (size, mtime_ns, inode) state of every scanned file, or of those under prefix"""
+        cursor = self._reader().cursor()
+        if prefix:
+            # A range on the primary key rather than LIKE, so only the matching entries are read
+            cursor.execute("""
+                SELECT path, size, mtime_ns, inode FROM file_manifest WHERE path >= ? AND path < ?
+            """, (prefix, prefix[:-1] + chr(ord(prefix[-1]) + 1)))
+        else:
+            cursor.execute("SELECT path, size, mtime_ns, inode FROM file_manifest")
+        return {row[0]: (row[1], row[2], row[3]) for row in cursor.fetchall()}
+    
+    def update_file_manifest(self, entries: List[tuple]):
+        """Record (path, size, mtime_ns, inode) state for scanned files"""
+        if not entries:
+            return
+        
+        with self._writer() as cursor:
+            cursor.executemany("""
+                INSERT OR REPLACE INTO file_manifest (path, size, mtime_ns, inode, scanned_at)
+                VALUES (?, ?, ?, ?, CURRENT_TIMESTAMP)
+            """, entries)
+    
+    def remove_files(self, paths: List[str]) -> int:
+        """
+        Remove manifest entries and tracks for files that no longer exist on disk
+        
+        Tracks whose enhanced version is among the files lose it, so a
+        deleted enhanced twin is never streamed. Returns the tracks removed.
+        """
+        if not paths:
+            return 0
+        
+        removed = 0
+        
+        try:
+            with self._writer() as cursor:
+                # Chunk the IN lists to stay below SQLite's bound parameter limit
+                for start in range(0, len(paths), 500):
+                    chunk = paths[start:start + 500]
+                    placeholders = ",".join("?" * len(chunk))
+                    
+                    cursor.execute(f"DELETE FROM tracks WHERE file_path IN ({placeholders})", chunk)
+                    removed += cursor.rowcount
+                    cursor.execute(f"""
+                        UPDATE tracks
+                        SET has_enhanced_version = 0,
+                            enhanced_file_path = NULL,
+                            enhanced_at = NULL,
+                            enhancement_preset = NULL
+                        WHERE enhanced_file_path IN ({placeholders})
+                    """, chunk)
+                    cursor.execute(f"DELETE FROM file_manifest WHERE path IN ({placeholders})", chunk)
+        except Exception as e:
+            print(f"Error removing vanished files: {e}")
+            return 0
+        
+        return removed
+    
+    # Folder asset operations
+    def set_folder_assets(self, assets: Dict[str, Dict[str, tuple]], folders: Iterable[str] = (),
+                          trees: Iterable[str] = ()):
+        """
+        Replace the recorded sidecar assets of listed folders
+        
+        assets maps folder -> {asset name: (size, mtime_ns)}. Existing rows of
+        every folder in folders, and of every folder in or under trees, are
+        dropped first, so assets that disappeared from them are forgotten.
+        Folder cover hashes are kept for covers whose size and mtime are
+        unchanged.
+        """
+        try:
+            with self._writer() as cursor:
+                cursor.execute("SELECT folder, size, mtime_ns, hash FROM folder_assets WHERE hash IS NOT NULL")
+                hashes = {(row[0], row[1], row[2]): row[3] for row in cursor.fetchall()}
+                
+                cursor.executemany("DELETE FROM folder_assets WHERE folder = ?", [(folder,) for folder in folders])
+                for tree in trees:
+                    prefix = os.path.join(tree, "")
+                    cursor.execute("""
+                        DELETE FROM folder_assets WHERE folder = ? OR (folder >= ? AND folder < ?)
+                    """, (tree, prefix, prefix[:-1] + chr(ord(prefix[-1]) + 1)))
+                cursor.executemany("""
+                    INSERT OR REPLACE INTO folder_assets (folder, asset, size, mtime_ns, hash) VALUES (?, ?, ?, ?, ?)
+                """, [(folder, name, *state, hashes.get((folder, *state)) if name == "cover.jpg" else None)
+                      for folder, names in assets.items() for name, state in names.items()])
         except Exception as e:
-            print(f"Error adding track {title}: {e}")
-            self.conn.rollback()
+            print(f"Error saving folder assets: {e}")
+    
+    def get_folder_asset_states(self, asset: str) -> Dict[str, tuple]:
+        """Get the recorded (size, mtime_ns) of one sidecar file in every folder that has it"""
+        cursor = self._reader().cursor()
+        cursor.execute("SELECT folder, size, mtime_ns FROM folder_assets WHERE asset = ?", (asset,))
+        return {row[0]: (row[1], row[2]) for row in cursor.fetchall()}
+    
+    def get_folder_covers_without_hash(self) -> List[str]:
+        """Get the folders whose cover.jpg hasn't been hashed since it last changed"""
+        cursor = self._reader().cursor()
+        cursor.execute("SELECT folder FROM folder_assets WHERE asset = 'cover.jpg' AND hash IS NULL")
+        return [row[0] for row in cursor.fetchall()]
+    
+    def set_folder_cover_hashes(self, hashes: Dict[str, str]):
+        """Record the content hash of folders' cover.jpg, adding each to covers for its palette"""
+        if not hashes:
+            return
+        
+        with self._writer() as cursor:
+            cursor.executemany("INSERT OR IGNORE INTO covers (hash) VALUES (?)", [(digest,) for digest in hashes.values()])
+            cursor.executemany("UPDATE folder_assets SET hash = ? WHERE folder = ? AND asset = 'cover.jpg'",
+                               [(digest, folder) for folder, digest in hashes.items()])
+    
+    def get_track_assets(self, track_id: str) -> Optional[Dict[str, Dict]]:
+        """
+        Get the sidecar assets next to a track's file, or None if the track doesn't exist
+        
+        Returns {asset name: {"path", "size", "mtime_ns"}}.
+        """
+        cursor = self._reader().cursor()
+        cursor.execute("""
+            SELECT t.folder, fa.asset, fa.size, fa.mtime_ns
+            FROM tracks t LEFT JOIN folder_assets fa ON fa.folder = t.folder
+            WHERE t.id = ?
+        """, (track_id,))
+        rows = cursor.fetchall()
+        if not rows:
+            return None
+        return {row[1]: {"path": os.path.join(row[0], row[1]), "size": row[2], "mtime_ns": row[3]}
+                for row in rows if row[1]}
+    
+    def get_track_availability(self) -> Dict[str, bool]:
+        """Get the stored availability flag of every track, keyed by file path"""
+        cursor = self._reader().cursor()
+        cursor.execute("SELECT file_path, is_available FROM tracks")
+        return {row[0]: bool(row[1]) for row in cursor.fetchall()}
+    
+    def set_tracks_available(self, paths: List[str], available: bool) -> int:
+        """Set the availability flag for tracks by file path"""
+        if not paths:
+            return 0
+        
+        with self._writer() as cursor:
+            cursor.executemany("UPDATE tracks SET is_available = ? WHERE file_path = ?",
+                               [(int(available), path) for path in paths])
+            return cursor.rowcount
+    
+    # Waveform operations
+    def _get_tracks_without(self, table: str) -> List[Dict[str, str]]:
+        """
+        Get available tracks with no row in a per-track derived table (waveforms,
+        fingerprints), or one computed from an older version of the file
+        """
+        cursor = self._reader().cursor()
+        cursor.execute(f"""
+            SELECT t.id, t.file_path FROM tracks t
+            LEFT JOIN {table} d ON d.track_id = t.id
+            LEFT JOIN file_manifest m ON m.path = t.file_path
+            WHERE t.is_available = 1
+              AND (d.track_id IS NULL OR d.file_size != m.size OR d.file_mtime_ns != m.mtime_ns)
+        """)
+        return [{"id": row[0], "file_path": row[1]} for row in cursor.fetchall()]
+    
+    def get_tracks_without_waveform(self) -> List[Dict[str, str]]:
+        """Get available tracks with no waveform, or one computed from an older version of the file"""
+        return self._get_tracks_without("waveforms")
+    
+    def save_waveform(self, track_id: str, resolution: int, peaks: bytes, file_size: int, file_mtime_ns: int):
+        """Store a track's waveform peaks, replacing any older ones"""
+        with self._writer() as cursor:
+            cursor.execute("""
+                INSERT OR REPLACE INTO waveforms (track_id, resolution, peaks, file_size, file_mtime_ns, created_at)
+                VALUES (?, ?, ?, ?, ?, CURRENT_TIMESTAMP)
+            """, (track_id, resolution, peaks, file_size, file_mtime_ns))
+    
+    def get_waveform(self, track_id: str) -> Optional[Dict[str, Any]]:
+        """Get a track's stored waveform (resolution, peaks, file_size, file_mtime_ns)"""
+        cursor = self._reader().cursor()
+        cursor.execute("""
+            SELECT resolution, peaks, file_size, file_mtime_ns FROM waveforms WHERE track_id = ?
+        """, (track_id,))
+        row = cursor.fetchone()
+        return dict(row) if row else None
+    
+    # Fingerprint operations
+    def get_tracks_without_fingerprint(self) -> List[Dict[str, str]]:
+        """Get available tracks with no fingerprint, or one computed from an older version of the file"""
+        return self._get_tracks_without("fingerprints")
+    
+    def save_fingerprint(self, track_id: str, fingerprint: bytes, keys: List[int], file_size: int, file_mtime_ns: int):
+        """Store a track's fingerprint and its lookup keys, replacing any older ones"""
+        with self._writer() as cursor:
+            cursor.execute("""
+                INSERT OR REPLACE INTO fingerprints (track_id, fingerprint, file_size, file_mtime_ns, created_at)
+                VALUES (?, ?, ?, ?, CURRENT_TIMESTAMP)
+            """, (track_id, fingerprint, file_size, file_mtime_ns))
+            cursor.execute("DELETE FROM fingerprint_keys WHERE track_id = ?", (track_id,))
+            cursor.executemany("INSERT OR IGNORE INTO fingerprint_keys (hash, track_id) VALUES (?, ?)",
+                               [(key, track_id) for key in keys])
+    
+    def find_fingerprint_candidates(self, keys: List[int], exclude: Optional[str] = None,
+                                    min_hits: int = 2, limit: int = 20) -> List[str]:
+        """Get tracks sharing at least min_hits fingerprint keys, most shared first"""
+        cursor = self._reader().cursor()
+        hits: Dict[str, int] = {}
+        # Chunk the IN lists to stay below SQLite's bound parameter limit
+        for start in range(0, len(keys), 500):
+            chunk = keys[start:start + 500]
+            cursor.execute(f"""
+                SELECT track_id, COUNT(*) FROM fingerprint_keys
+                WHERE hash IN ({','.join('?' * len(chunk))})
+                GROUP BY track_id
+            """, chunk)
+            for track_id, count in cursor.fetchall():
+                hits[track_id] = hits.get(track_id, 0) + count
+        
+        hits.pop(exclude, None)
+        ranked = sorted((track_id for track_id, count in hits.items() if count >= min_hits), key=hits.get, reverse=True)
+        return ranked[:limit]
+    
+    def get_fingerprint_candidate_pairs(self, min_hits: int = 2, max_tracks_per_key: int = 50) -> List[Tuple[str, str]]:
+        """
+        Get pairs of tracks sharing at least min_hits fingerprint keys
+        
+        Keys shared by more than max_tracks_per_key tracks say little about
+        any of them and are skipped, which keeps the self-join small.
+        """
+        cursor = self._reader().cursor()
+        cursor.execute("""
+            WITH shared AS (
+                SELECT hash FROM fingerprint_keys GROUP BY hash HAVING COUNT(*) BETWEEN 2 AND ?
+            )
+            SELECT a.track_id, b.track_id FROM shared s
+            JOIN fingerprint_keys a ON a.hash = s.hash
+            JOIN fingerprint_keys b ON b.hash = s.hash AND a.track_id < b.track_id
+            GROUP BY a.track_id, b.track_id
+            HAVING COUNT(*) >= ?
+        """, (max_tracks_per_key, min_hits))
+        return [(row[0], row[1]) for row in cursor.fetchall()]
+    
+    def get_fingerprints(self, track_ids: List[str]) -> Dict[str, bytes]:
+        """Get the stored fingerprints of tracks, keyed by track id"""
+        cursor = self._reader().cursor()
+        fingerprints = {}
+        for start in range(0, len(track_ids), 500):
+            chunk = track_ids[start:start + 500]
+            cursor.execute(f"""
+                SELECT track_id, fingerprint FROM fingerprints WHERE track_id IN ({','.join('?' * len(chunk))})
+            """, chunk)
+            fingerprints.update((row[0], row[1]) for row in cursor.fetchall())
+        return fingerprints
     
     def _row_to_dict(self, row) -> Dict[str, Any]:
         """Convert sqlite3.Row to dict"""
@@ -195,46 +918,279 @@ class Database:
     
     def get_tracks(self, limit: int = 50, offset: int = 0, search: Optional[str] = None, 
                    only_available: bool = True) -> List[Dict]:
-        """Get tracks with pagination and search"""
-        cursor = self.conn.cursor()
+        """Get tracks with pagination and search (ranked by relevance when searching)"""
+        cursor = self._reader().cursor()
         
-        # Base query - only show tracks that exist on disk
-        base_conditions = []
-        params = []
+        # Only show tracks whose files the scanner found on disk
+        available_clause = "AND t.is_available = 1" if only_available else ""
         
         if search:
-            base_conditions.append("(title LIKE ? OR artist LIKE ? OR album LIKE ?)")
-            params.extend([f"%{search}%", f"%{search}%", f"%{search}%"])
+            fts_query = self._fts_query(search)
+            if not fts_query:
+                return []
+            
+            cursor.execute(f"""
+                SELECT {self.TRACK_LIST_COLUMNS} FROM tracks_fts
+                JOIN tracks t ON t.rowid = tracks_fts.rowid
+                WHERE tracks_fts MATCH ? {available_clause}
+                ORDER BY bm25(tracks_fts, {", ".join(map(str, self.SEARCH_RANK_WEIGHTS))})
+                LIMIT ? OFFSET ?
+            """, (fts_query, limit, offset))
+        else:
+            cursor.execute(f"""
+                SELECT {self.TRACK_LIST_COLUMNS} FROM tracks t
+                WHERE 1=1 {available_clause}
+                ORDER BY title, id
+                LIMIT ? OFFSET ?
+            """, (limit, offset))
         
-        # Build WHERE clause
-        where_clause = " AND ".join(base_conditions) if base_conditions else "1=1"
+        rows = cursor.fetchall()
+        return [self._format_track_response(self._row_to_dict(row)) for row in rows]
+    
+    def get_tracks_page(self, limit: int = 50, cursor: Optional[str] = None, search: Optional[str] = None,
+                        only_available: bool = True) -> Tuple[List[Dict], Optional[str]]:
+        """
+        Get a page of tracks ordered by title using keyset pagination
         
-        query = f"""
-            SELECT * FROM tracks 
-            WHERE {where_clause}
-            ORDER BY title
-            LIMIT ? OFFSET ?
+        Returns (tracks, next_cursor); pass next_cursor back to get the following
+        page. Search results are filtered through the FTS index but keep title order.
         """
-        params.extend([limit, offset])
+        after = self._decode_cursor(cursor)
+        conditions, params = [], []
         
-        cursor.execute(query, params)
-        rows = cursor.fetchall()
+        if only_available:
+            conditions.append("is_available = 1")
+        if search:
+            fts_query = self._fts_query(search)
+            if not fts_query:
+                return [], None
+            conditions.append("rowid IN (SELECT rowid FROM tracks_fts WHERE tracks_fts MATCH ?)")
+            params.append(fts_query)
+        if after:
+            conditions.append("(title, id) > (?, ?)")
+            params.extend(after)
         
-        # Filter out unavailable tracks if requested
-        tracks = [self._format_track_response(self._row_to_dict(row)) for row in rows]
+        db_cursor = self._reader().cursor()
+        db_cursor.execute(f"""
+            SELECT {self.TRACK_LIST_COLUMNS} FROM tracks t
+            WHERE {" AND ".join(conditions) or "1=1"}
+            ORDER BY title, id
+            LIMIT ?
+        """, (*params, limit + 1))
         
-        if only_available:
-            from pathlib import Path
-            tracks = [t for t in tracks if t and Path(t.get('file_path', '')).exists()]
+        rows, next_cursor = self._split_page(db_cursor.fetchall(), limit, ("title", "id"))
+        return [self._format_track_response(row) for row in rows], next_cursor
+    
+    def search_all(self, query: str, limit: int = 20) -> Dict[str, List[Dict]]:
+        """
+        Search tracks, albums and artists with a single ranked full-text query
+        
+        Every word in the query must prefix-match a word in the track's title,
+        artist, album or genre. Albums and artists are taken, in rank order,
+        from matching tracks whose album or artist name itself matches.
+        """
+        terms = self._search_terms(query)
+        if not terms:
+            return {"tracks": [], "albums": [], "artists": []}
+        
+        cursor = self._reader().cursor()
+        
+        # Over-fetch so albums and artists still fill up when tracks crowd the top ranks
+        cursor.execute(f"""
+            SELECT {self.TRACK_LIST_COLUMNS} FROM tracks_fts
+            JOIN tracks t ON t.rowid = tracks_fts.rowid
+            WHERE tracks_fts MATCH ?
+            ORDER BY bm25(tracks_fts, {", ".join(map(str, self.SEARCH_RANK_WEIGHTS))})
+            LIMIT ?
+        """, (self._fts_query(query), limit * 5))
+        rows = [self._row_to_dict(row) for row in cursor.fetchall()]
+        
+        tracks = [self._format_track_response(row) for row in rows if row["is_available"]][:limit]
+        
+        album_ids, artist_ids = [], []
+        for row in rows:
+            if row["album_id"] not in album_ids and self._matches_terms(row["album"], terms):
+                album_ids.append(row["album_id"])
+            if row["artist_id"] not in artist_ids and self._matches_terms(row["artist"], terms):
+                artist_ids.append(row["artist_id"])
+        
+        return {
+            "tracks": tracks,
+            "albums": self._get_rows_by_ids("albums", album_ids[:limit], self._format_album_response,
+                                            self.ALBUM_COLUMNS),
+            "artists": self._get_rows_by_ids("artists", artist_ids[:limit], self._format_artist_response)
+        }
+    
+    def get_tracks_by_ids(self, track_ids: List[str]) -> List[Dict]:
+        """Get tracks by id, in the order given"""
+        return self._get_rows_by_ids("tracks t", track_ids, self._format_track_response, columns=self.TRACK_LIST_COLUMNS)
+    
+    def _get_rows_by_ids(self, table: str, ids: List[str], formatter, columns: str = "*") -> List[Dict]:
+        """Fetch and format rows from table by primary key, keeping the order of ids"""
+        if not ids:
+            return []
+        
+        cursor = self._reader().cursor()
+        cursor.execute(f"SELECT {columns} FROM {table} WHERE id IN ({','.join('?' * len(ids))})", ids)
+        rows = {row["id"]: self._row_to_dict(row) for row in cursor.fetchall()}
+        return [formatter(rows[row_id]) for row_id in ids if row_id in rows]
+    
+    def _search_terms(self, search: str) -> List[str]:
+        """Split free text into casefolded, accent-stripped search words"""
+        return re.findall(r"[^\W_]+", self._fold_text(search))
+    
+    def _fts_query(self, search: str) -> Optional[str]:
+        """Build an FTS5 query where every search word must prefix-match a token"""
+        terms = self._search_terms(search)
+        return " ".join(f'"{term}"*' for term in terms) if terms else None
+    
+    def _matches_terms(self, text: Optional[str], terms: List[str]) -> bool:
+        """Check that every search word prefix-matches a word of text, as the FTS query does"""
+        words = re.findall(r"[^\W_]+", self._fold_text(text or ""))
+        return all(any(word.startswith(term) for word in words) for term in terms)
+    
+    def match_keys(self, title: str, artist: str) -> Tuple[str, str]:
+        """
+        Normalized (title, artist) for duplicate matching
         
-        return tracks
+        Casefolded and accent-stripped, with featured artists, release noise
+        ("(Official Video)", "[Lyrics]") and channel suffixes ("- Topic",
+        "VEVO") removed and punctuation reduced to single spaces.
+        """
+        title = TITLE_NOISE_SUFFIX.sub("", TITLE_NOISE.sub("", self._fold_text(title or "")).strip())
+        title = FEATURING.sub("", title)
+        artist = CHANNEL_SUFFIX.sub("", FEATURING.sub("", self._fold_text(artist or "").strip()))
+        return " ".join(re.findall(r"[^\W_]+", title)), " ".join(re.findall(r"[^\W_]+", artist))
+    
+    def _fold_text(self, text: str) -> str:
+        """Casefold and strip diacritics, matching the index's unicode61 tokenizer"""
+        decomposed = unicodedata.normalize("NFKD", text.casefold())
+        return "".join(ch for ch in decomposed if not unicodedata.combining(ch))
     
     def get_track(self, track_id: str) -> Optional[Dict]:
         """Get single track by ID"""
-        cursor = self.conn.cursor()
-        cursor.execute("SELECT * FROM tracks WHERE id = ?", (track_id,))
+        cursor = self._reader().cursor()
+        cursor.execute(f"""
+            SELECT t.*, {self.TRACK_PALETTE} AS cover_palette,
+                   (SELECT group_concat(asset, '/') FROM folder_assets WHERE folder = t.folder) AS folder_assets
+            FROM tracks t WHERE t.id = ?
+        """, (track_id,))
+        row = cursor.fetchone()
+        if not row:
+            return None
+        track = self._format_track_response(self._row_to_dict(row))
+        # Sidecar files in the track's folder, as recorded by the last scan
+        track["assets"] = row["folder_assets"].split("/") if row["folder_assets"] else []
+        return track
+    
+    def get_track_stream_info(self, track_id: str) -> Optional[Dict]:
+        """Get just the file paths needed to stream a track, skipping response formatting"""
+        cursor = self._reader().cursor()
+        cursor.execute("""
+            SELECT file_path, has_enhanced_version, enhanced_file_path, duration_ms
+            FROM tracks WHERE id = ?
+        """, (track_id,))
+        row = cursor.fetchone()
+        return self._row_to_dict(row) if row else None
+    
+    def get_track_cover_info(self, track_id: str) -> Optional[Dict]:
+        """
+        Get a track's file path, album id, the cover hashes of the track and its
+        album, and the size and mtime_ns of its folder's cover.jpg (None if it has none)
+        """
+        cursor = self._reader().cursor()
+        cursor.execute("""
+            SELECT t.file_path, t.album_id, t.cover_hash, a.cover_hash AS album_cover_hash,
+                   fa.size AS folder_cover_size, fa.mtime_ns AS folder_cover_mtime_ns
+            FROM tracks t LEFT JOIN albums a ON a.id = t.album_id
+            LEFT JOIN folder_assets fa ON fa.folder = t.folder AND fa.asset = 'cover.jpg'
+            WHERE t.id = ?
+        """, (track_id,))
         row = cursor.fetchone()
-        return self._format_track_response(self._row_to_dict(row)) if row else None
+        return self._row_to_dict(row) if row else None
+    
+    def get_album_cover_hash(self, album_id: str) -> Optional[str]:
+        """Get the cover hash of an album, or None"""
+        cursor = self._reader().cursor()
+        cursor.execute("SELECT cover_hash FROM albums WHERE id = ?", (album_id,))
+        row = cursor.fetchone()
+        return row[0] if row else None
+    
+    def get_covers_without_palette(self) -> List[str]:
+        """Get the hashes of covers whose palette hasn't been computed"""
+        cursor = self._reader().cursor()
+        cursor.execute("SELECT hash FROM covers WHERE palette IS NULL")
+        return [row[0] for row in cursor.fetchall()]
+    
+    def set_cover_palettes(self, palettes: Dict[str, List[str]]):
+        """Store cover palettes (hex colours, dominant first) by cover hash"""
+        if not palettes:
+            return
+        
+        with self._writer() as cursor:
+            cursor.executemany("UPDATE covers SET palette = ? WHERE hash = ?",
+                               [(json.dumps(palette), digest) for digest, palette in palettes.items()])
+    
+    def update_track_lyrics(self, track_id: str, lyrics: str) -> bool:
+        """Replace the stored lyrics of a track"""
+        with self._writer() as cursor:
+            cursor.execute("UPDATE tracks SET lyrics = ?, has_lyrics = ? WHERE id = ?",
+                           (lyrics or None, 1 if lyrics else 0, track_id))
+            return cursor.rowcount > 0
+    
+    def get_enhanced_version(self, track_id: str) -> Optional[Dict]:
+        """Get the enhancement columns of a track"""
+        cursor = self._reader().cursor()
+        cursor.execute("""
+            SELECT has_enhanced_version, enhanced_file_path, enhanced_at, enhancement_preset
+            FROM tracks WHERE id = ?
+        """, (track_id,))
+        row = cursor.fetchone()
+        return self._row_to_dict(row) if row else None
+    
+    def set_enhanced_version(self, track_id: str, enhanced_file_path: str, preset: str) -> bool:
+        """Record a generated enhanced version of a track"""
+        with self._writer() as cursor:
+            cursor.execute("""
+                UPDATE tracks
+                SET has_enhanced_version = 1,
+                    enhanced_file_path = ?,
+                    enhanced_at = ?,
+                    enhancement_preset = ?
+                WHERE id = ?
+            """, (enhanced_file_path, datetime.now(), preset, track_id))
+            return cursor.rowcount > 0
+    
+    def clear_enhanced_version(self, track_id: str) -> bool:
+        """Forget the enhanced version of a track"""
+        with self._writer() as cursor:
+            cursor.execute("""
+                UPDATE tracks
+                SET has_enhanced_version = 0,
+                    enhanced_file_path = NULL,
+                    enhanced_at = NULL,
+                    enhancement_preset = NULL
+                WHERE id = ?
+            """, (track_id,))
+            return cursor.rowcount > 0
+    
+    def _cover_colors(self, row: Dict) -> Dict:
+        """dominant_color and palette fields from a row's cover_palette column"""
+        palette = json.loads(row["cover_palette"]) if row.get("cover_palette") else None
+        return {"dominant_color": palette[0] if palette else None, "palette": palette}
+    
+    def _album_images(self, album_id: str, image_url: str, has_cover: bool,
+                      cover_hash: Optional[str] = None) -> List[Dict]:
+        """Spotify-style image list, largest first - the full cover plus its smaller rendered sizes"""
+        if cover_hash:
+            return [{"url": f"http://localhost:8000/artwork/{cover_hash}?size={size}", "height": size, "width": size}
+                    for size in reversed(COVER_SIZES)]
+        
+        images = [{"url": image_url, "height": 640, "width": 640}]
+        if has_cover:
+            images += [{"url": f"http://localhost:8000/albums/{album_id}/cover?size={size}", "height": size, "width": size}
+                       for size in reversed(COVER_SIZES[:-1])]
+        return images
     
     def _format_track_response(self, track: Dict) -> Dict:
         """Format track to match Spotify API structure"""
@@ -244,8 +1200,8 @@ class Database:
         # Use placeholder image if no album art exists
         image_url = f"http://localhost:8000{track['image_path']}" if track.get("image_path") else "http://localhost:8000/images/playlist.png"
         
-        # Check if lyrics exist (from DB or would be loaded from file)
-        has_lyrics = bool(track.get("lyrics"))
+        # Check if lyrics exist - list queries select a has_lyrics flag instead of the text
+        has_lyrics = bool(track["has_lyrics"]) if "has_lyrics" in track else bool(track.get("lyrics"))
         
         return {
             "id": track["id"],
@@ -256,12 +1212,15 @@ class Database:
             "album": {
                 "id": track["album_id"],
                 "name": track["album"],
-                "images": [{"url": image_url, "height": 640, "width": 640}],
+                "images": self._album_images(track["album_id"], image_url, bool(track.get("image_path")),
+                                             track.get("cover_hash")),
+                **self._cover_colors(track),
                 "uri": f"local:album:{track['album_id']}"
             },
             "is_saved": bool(track["is_saved"]),
             "uri": f"local:track:{track['id']}",
             "file_path": track["file_path"],
+            "cover_hash": track.get("cover_hash"),
             "lyrics": track.get("lyrics"),
             "has_lyrics": has_lyrics,
             "has_enhanced_version": bool(track.get("has_enhanced_version", 0)),
@@ -271,29 +1230,53 @@ class Database:
     
     def get_albums(self, limit: int = 50, offset: int = 0, search: Optional[str] = None) -> List[Dict]:
         """Get albums with pagination"""
-        cursor = self.conn.cursor()
+        cursor = self._reader().cursor()
         
         if search:
-            cursor.execute("""
-                SELECT * FROM albums 
+            cursor.execute(f"""
+                SELECT {self.ALBUM_COLUMNS} FROM albums
                 WHERE name LIKE ? OR artist LIKE ?
-                ORDER BY name
+                ORDER BY name, id
                 LIMIT ? OFFSET ?
             """, (f"%{search}%", f"%{search}%", limit, offset))
         else:
-            cursor.execute("""
-                SELECT * FROM albums 
-                ORDER BY name
+            cursor.execute(f"""
+                SELECT {self.ALBUM_COLUMNS} FROM albums
+                ORDER BY name, id
                 LIMIT ? OFFSET ?
             """, (limit, offset))
         
         rows = cursor.fetchall()
         return [self._format_album_response(self._row_to_dict(row)) for row in rows]
     
+    def get_albums_page(self, limit: int = 50, cursor: Optional[str] = None,
+                        search: Optional[str] = None) -> Tuple[List[Dict], Optional[str]]:
+        """Get a page of albums ordered by name using keyset pagination"""
+        after = self._decode_cursor(cursor)
+        conditions, params = [], []
+        
+        if search:
+            conditions.append("(name LIKE ? OR artist LIKE ?)")
+            params.extend([f"%{search}%", f"%{search}%"])
+        if after:
+            conditions.append("(name, id) > (?, ?)")
+            params.extend(after)
+        
+        db_cursor = self._reader().cursor()
+        db_cursor.execute(f"""
+            SELECT {self.ALBUM_COLUMNS} FROM albums
+            WHERE {" AND ".join(conditions) or "1=1"}
+            ORDER BY name, id
+            LIMIT ?
+        """, (*params, limit + 1))
+        
+        rows, next_cursor = self._split_page(db_cursor.fetchall(), limit, ("name", "id"))
+        return [self._format_album_response(row) for row in rows], next_cursor
+    
     def get_album(self, album_id: str) -> Optional[Dict]:
         """Get album with tracks"""
-        cursor = self.conn.cursor()
-        cursor.execute("SELECT * FROM albums WHERE id = ?", (album_id,))
+        cursor = self._reader().cursor()
+        cursor.execute(f"SELECT {self.ALBUM_COLUMNS} FROM albums WHERE id = ?", (album_id,))
         row = cursor.fetchone()
         
         if not row:
@@ -317,16 +1300,18 @@ class Database:
             "artists": [{"id": album["artist_id"], "name": album["artist"], "uri": f"local:artist:{album['artist_id']}"}],
             "release_date": str(album["year"]) if album.get("year") else None,
             "total_tracks": album["total_tracks"],
-            "images": [{"url": image_url, "height": 640, "width": 640}],
+            "images": self._album_images(album["id"], image_url, bool(album.get("image_path")),
+                                         album.get("cover_hash")),
+            **self._cover_colors(album),
             "is_saved": bool(album["is_saved"]),
             "uri": f"local:album:{album['id']}"
         }
     
     def get_album_tracks(self, album_id: str) -> List[Dict]:
         """Get all tracks from an album"""
-        cursor = self.conn.cursor()
-        cursor.execute("""
-            SELECT * FROM tracks 
+        cursor = self._reader().cursor()
+        cursor.execute(f"""
+            SELECT {self.TRACK_LIST_COLUMNS} FROM tracks t
             WHERE album_id = ? 
             ORDER BY track_number, title
         """, (album_id,))
@@ -335,28 +1320,52 @@ class Database:
     
     def get_artists(self, limit: int = 50, offset: int = 0, search: Optional[str] = None) -> List[Dict]:
         """Get artists with pagination"""
-        cursor = self.conn.cursor()
+        cursor = self._reader().cursor()
         
         if search:
             cursor.execute("""
                 SELECT * FROM artists 
                 WHERE name LIKE ?
-                ORDER BY name
+                ORDER BY name, id
                 LIMIT ? OFFSET ?
             """, (f"%{search}%", limit, offset))
         else:
             cursor.execute("""
                 SELECT * FROM artists 
-                ORDER BY name
+                ORDER BY name, id
                 LIMIT ? OFFSET ?
             """, (limit, offset))
         
         rows = cursor.fetchall()
         return [self._format_artist_response(self._row_to_dict(row)) for row in rows]
     
+    def get_artists_page(self, limit: int = 50, cursor: Optional[str] = None,
+                         search: Optional[str] = None) -> Tuple[List[Dict], Optional[str]]:
+        """Get a page of artists ordered by name using keyset pagination"""
+        after = self._decode_cursor(cursor)
+        conditions, params = [], []
+        
+        if search:
+            conditions.append("name LIKE ?")
+            params.append(f"%{search}%")
+        if after:
+            conditions.append("(name, id) > (?, ?)")
+            params.extend(after)
+        
+        db_cursor = self._reader().cursor()
+        db_cursor.execute(f"""
+            SELECT * FROM artists
+            WHERE {" AND ".join(conditions) or "1=1"}
+            ORDER BY name, id
+            LIMIT ?
+        """, (*params, limit + 1))
+        
+        rows, next_cursor = self._split_page(db_cursor.fetchall(), limit, ("name", "id"))
+        return [self._format_artist_response(row) for row in rows], next_cursor
+    
     def get_artist(self, artist_id: str) -> Optional[Dict]:
         """Get artist details"""
-        cursor = self.conn.cursor()
+        cursor = self._reader().cursor()
         cursor.execute("SELECT * FROM artists WHERE id = ?", (artist_id,))
         row = cursor.fetchone()
         return self._format_artist_response(self._row_to_dict(row)) if row else None
@@ -380,9 +1389,9 @@ class Database:
     
     def get_artist_albums(self, artist_id: str) -> List[Dict]:
         """Get all albums by an artist"""
-        cursor = self.conn.cursor()
-        cursor.execute("""
-            SELECT * FROM albums 
+        cursor = self._reader().cursor()
+        cursor.execute(f"""
+            SELECT {self.ALBUM_COLUMNS} FROM albums
             WHERE artist_id = ? 
             ORDER BY year DESC, name
         """, (artist_id,))
@@ -391,9 +1400,9 @@ class Database:
     
     def get_artist_tracks(self, artist_id: str, limit: int = 10) -> List[Dict]:
         """Get top tracks by an artist"""
-        cursor = self.conn.cursor()
-        cursor.execute("""
-            SELECT * FROM tracks 
+        cursor = self._reader().cursor()
+        cursor.execute(f"""
+            SELECT {self.TRACK_LIST_COLUMNS} FROM tracks t
             WHERE artist_id = ? 
             ORDER BY play_count DESC, title
             LIMIT ?
@@ -404,14 +1413,76 @@ class Database:
     # Playlist operations
     def get_playlists(self) -> List[Dict]:
         """Get all playlists"""
-        cursor = self.conn.cursor()
-        cursor.execute("SELECT * FROM playlists ORDER BY created_at DESC")
+        cursor = self._reader().cursor()
+        cursor.execute("SELECT * FROM playlists ORDER BY created_at DESC, id DESC")
         rows = cursor.fetchall()
         return [self._format_playlist_response(self._row_to_dict(row)) for row in rows]
     
+    def get_playlists_page(self, limit: int = 50,
+                           cursor: Optional[str] = None) -> Tuple[List[Dict], Optional[str]]:
+        """Get a page of playlists, newest first, using keyset pagination"""
+        after = self._decode_cursor(cursor)
+        
+        db_cursor = self._reader().cursor()
+        db_cursor.execute(f"""
+            SELECT * FROM playlists
+            WHERE {"(created_at, id) < (?, ?)" if after else "1=1"}
+            ORDER BY created_at DESC, id DESC
+            LIMIT ?
+        """, (*(after or ()), limit + 1))
+        
+        rows, next_cursor = self._split_page(db_cursor.fetchall(), limit, ("created_at", "id"))
+        return [self._format_playlist_response(row) for row in rows], next_cursor
+    
+    def get_playlist_tracks_page(self, playlist_id: str, limit: int = 50,
+                                 cursor: Optional[str] = None) -> Tuple[List[Dict], Optional[str]]:
+        """Get a page of a playlist's tracks in playlist order using keyset pagination"""
+        after = self._decode_cursor(cursor)
+        
+        db_cursor = self._reader().cursor()
+        db_cursor.execute(f"""
+            SELECT {self.TRACK_LIST_COLUMNS}, pt.position AS playlist_position FROM playlist_tracks pt
+            JOIN tracks t ON t.id = pt.track_id
+            WHERE pt.playlist_id = ? {"AND (pt.position, pt.track_id) > (?, ?)" if after else ""}
+            ORDER BY pt.position, pt.track_id
+            LIMIT ?
+        """, (playlist_id, *(after or ()), limit + 1))
+        
+        rows, next_cursor = self._split_page(db_cursor.fetchall(), limit, ("playlist_position", "id"))
+        return [{"track": self._format_track_response(row)} for row in rows], next_cursor
+    
+    # Pagination helpers
+    def _encode_cursor(self, values: list) -> str:
+        """Encode a row's sort key and id as an opaque pagination cursor"""
+        raw = json.dumps(values, separators=(",", ":")).encode("utf-8")
+        return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+    
+    def _decode_cursor(self, cursor: Optional[str]) -> Optional[list]:
+        """Decode a pagination cursor; an empty cursor means the first page"""
+        if not cursor:
+            return None
+        
+        try:
+            values = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        except Exception:
+            raise ValueError("Invalid pagination cursor")
+        
+        if not isinstance(values, list) or len(values) != 2:
+            raise ValueError("Invalid pagination cursor")
+        return values
+    
+    def _split_page(self, rows: list, limit: int, key_columns: tuple) -> Tuple[List[Dict], Optional[str]]:
+        """Trim a limit + 1 row fetch to one page and build the cursor for the next"""
+        rows = [self._row_to_dict(row) for row in rows]
+        if len(rows) <= limit:
+            return rows, None
+        
+        rows = rows[:limit]
+        return rows, self._encode_cursor([rows[-1][column] for column in key_columns])
+    
     def get_playlist(self, playlist_id: str) -> Optional[Dict]:
         """Get playlist with tracks"""
-        cursor = self.conn.cursor()
+        cursor = self._reader().cursor()
         try:
             cursor.execute("SELECT * FROM playlists WHERE id = ?", (playlist_id,))
             row = cursor.fetchone()
@@ -422,8 +1493,8 @@ class Database:
             playlist = self._format_playlist_response(self._row_to_dict(row))
             
             # Get tracks
-            cursor.execute("""
-                SELECT t.* FROM tracks t
+            cursor.execute(f"""
+                SELECT {self.TRACK_LIST_COLUMNS} FROM tracks t
                 JOIN playlist_tracks pt ON t.id = pt.track_id
                 WHERE pt.playlist_id = ?
                 ORDER BY pt.position
@@ -445,67 +1516,60 @@ class Database:
         import uuid
         playlist_id = str(uuid.uuid4())[:16]
         
-        cursor = self.conn.cursor()
-        cursor.execute("""
-            INSERT INTO playlists (id, name, description)
-            VALUES (?, ?, ?)
-        """, (playlist_id, name, description))
-        self.conn.commit()
+        with self._writer() as cursor:
+            cursor.execute("""
+                INSERT INTO playlists (id, name, description)
+                VALUES (?, ?, ?)
+            """, (playlist_id, name, description))
         
         return self.get_playlist(playlist_id)
     
     def update_playlist(self, playlist_id: str, name: Optional[str], description: Optional[str]) -> bool:
         """Update playlist details"""
-        cursor = self.conn.cursor()
-        
-        if name:
-            cursor.execute("UPDATE playlists SET name = ?, updated_at = CURRENT_TIMESTAMP WHERE id = ?", 
-                         (name, playlist_id))
-        if description is not None:
-            cursor.execute("UPDATE playlists SET description = ?, updated_at = CURRENT_TIMESTAMP WHERE id = ?", 
-                         (description, playlist_id))
-        
-        self.conn.commit()
-        return cursor.rowcount > 0
+        with self._writer() as cursor:
+            if name:
+                cursor.execute("UPDATE playlists SET name = ?, updated_at = CURRENT_TIMESTAMP WHERE id = ?", 
+                             (name, playlist_id))
+            if description is not None:
+                cursor.execute("UPDATE playlists SET description = ?, updated_at = CURRENT_TIMESTAMP WHERE id = ?", 
+                             (description, playlist_id))
+            
+            return cursor.rowcount > 0
     
     def delete_playlist(self, playlist_id: str) -> bool:
         """Delete a playlist"""
-        cursor = self.conn.cursor()
-        cursor.execute("DELETE FROM playlists WHERE id = ?", (playlist_id,))
-        self.conn.commit()
-        return cursor.rowcount > 0
+        with self._writer() as cursor:
+            cursor.execute("DELETE FROM playlists WHERE id = ?", (playlist_id,))
+            return cursor.rowcount > 0
     
     def add_track_to_playlist(self, playlist_id: str, track_id: str) -> bool:
         """Add track to playlist"""
-        cursor = self.conn.cursor()
-        
-        # Get current max position
-        cursor.execute("SELECT MAX(position) FROM playlist_tracks WHERE playlist_id = ?", (playlist_id,))
-        max_pos = cursor.fetchone()[0] or 0
-        
         try:
-            cursor.execute("""
-                INSERT INTO playlist_tracks (playlist_id, track_id, position)
-                VALUES (?, ?, ?)
-            """, (playlist_id, track_id, max_pos + 1))
-            
-            cursor.execute("UPDATE playlists SET updated_at = CURRENT_TIMESTAMP WHERE id = ?", (playlist_id,))
-            self.conn.commit()
+            with self._writer() as cursor:
+                # Get current max position - read on the writer so concurrent adds can't share a position
+                cursor.execute("SELECT MAX(position) FROM playlist_tracks WHERE playlist_id = ?", (playlist_id,))
+                max_pos = cursor.fetchone()[0] or 0
+                
+                cursor.execute("""
+                    INSERT INTO playlist_tracks (playlist_id, track_id, position)
+                    VALUES (?, ?, ?)
+                """, (playlist_id, track_id, max_pos + 1))
+                
+                cursor.execute("UPDATE playlists SET updated_at = CURRENT_TIMESTAMP WHERE id = ?", (playlist_id,))
             return True
         except:
             return False
     
     def remove_track_from_playlist(self, playlist_id: str, track_id: str) -> bool:
         """Remove track from playlist"""
-        cursor = self.conn.cursor()
-        cursor.execute("""
-            DELETE FROM playlist_tracks 
-            WHERE playlist_id = ? AND track_id = ?
-        """, (playlist_id, track_id))
-        
-        cursor.execute("UPDATE playlists SET updated_at = CURRENT_TIMESTAMP WHERE id = ?", (playlist_id,))
-        self.conn.commit()
-        return cursor.rowcount > 0
+        with self._writer() as cursor:
+            cursor.execute("""
+                DELETE FROM playlist_tracks 
+                WHERE playlist_id = ? AND track_id = ?
+            """, (playlist_id, track_id))
+            
+            cursor.execute("UPDATE playlists SET updated_at = CURRENT_TIMESTAMP WHERE id = ?", (playlist_id,))
+            return cursor.rowcount > 0
     
     def _format_playlist_response(self, playlist: Dict) -> Dict:
         """Format playlist to match Spotify API structure"""
@@ -525,49 +1589,45 @@ class Database:
     # Library operations
     def save_track(self, track_id: str) -> bool:
         """Save/like a track"""
-        cursor = self.conn.cursor()
-        cursor.execute("UPDATE tracks SET is_saved = 1 WHERE id = ?", (track_id,))
-        self.conn.commit()
-        return cursor.rowcount > 0
+        with self._writer() as cursor:
+            cursor.execute("UPDATE tracks SET is_saved = 1 WHERE id = ?", (track_id,))
+            return cursor.rowcount > 0
     
     def unsave_track(self, track_id: str) -> bool:
         """Remove track from saved"""
-        cursor = self.conn.cursor()
-        cursor.execute("UPDATE tracks SET is_saved = 0 WHERE id = ?", (track_id,))
-        self.conn.commit()
-        return cursor.rowcount > 0
+        with self._writer() as cursor:
+            cursor.execute("UPDATE tracks SET is_saved = 0 WHERE id = ?", (track_id,))
+            return cursor.rowcount > 0
     
     def get_saved_tracks(self) -> List[Dict]:
         """Get all saved tracks"""
-        cursor = self.conn.cursor()
-        cursor.execute("SELECT * FROM tracks WHERE is_saved = 1 ORDER BY title")
+        cursor = self._reader().cursor()
+        cursor.execute(f"SELECT {self.TRACK_LIST_COLUMNS} FROM tracks t WHERE is_saved = 1 ORDER BY title")
         rows = cursor.fetchall()
         return [self._format_track_response(self._row_to_dict(row)) for row in rows]
     
     def save_album(self, album_id: str) -> bool:
         """Save an album"""
-        cursor = self.conn.cursor()
-        cursor.execute("UPDATE albums SET is_saved = 1 WHERE id = ?", (album_id,))
-        self.conn.commit()
-        return cursor.rowcount > 0
+        with self._writer() as cursor:
+            cursor.execute("UPDATE albums SET is_saved = 1 WHERE id = ?", (album_id,))
+            return cursor.rowcount > 0
     
     def unsave_album(self, album_id: str) -> bool:
         """Remove album from saved"""
-        cursor = self.conn.cursor()
-        cursor.execute("UPDATE albums SET is_saved = 0 WHERE id = ?", (album_id,))
-        self.conn.commit()
-        return cursor.rowcount > 0
+        with self._writer() as cursor:
+            cursor.execute("UPDATE albums SET is_saved = 0 WHERE id = ?", (album_id,))
+            return cursor.rowcount > 0
     
     def get_saved_albums(self) -> List[Dict]:
         """Get all saved albums"""
-        cursor = self.conn.cursor()
-        cursor.execute("SELECT * FROM albums WHERE is_saved = 1 ORDER BY name")
+        cursor = self._reader().cursor()
+        cursor.execute(f"SELECT {self.ALBUM_COLUMNS} FROM albums WHERE is_saved = 1 ORDER BY name")
         rows = cursor.fetchall()
         return [self._format_album_response(self._row_to_dict(row)) for row in rows]
     
     def get_stats(self) -> Dict:
         """Get library statistics"""
-        cursor = self.conn.cursor()
+        cursor = self._reader().cursor()
         
         cursor.execute("SELECT COUNT(*) FROM tracks")
         total_tracks = cursor.fetchone()[0]
@@ -595,7 +1655,7 @@ class Database:
     def get_recommendations(self, track_id: Optional[str] = None, artist_id: Optional[str] = None, 
                           limit: int = 20) -> List[Dict]:
         """Get song recommendations based on track or artist"""
-        cursor = self.conn.cursor()
+        cursor = self._reader().cursor()
         
         try:
             if track_id:
@@ -610,8 +1670,8 @@ class Database:
                 seed_album_id = track['album']['id'] if track.get('album') else None
                 
                 # Recommend similar tracks: same artist, genre, or album
-                cursor.execute("""
-                    SELECT DISTINCT t.* FROM tracks t
+                cursor.execute(f"""
+                    SELECT DISTINCT {self.TRACK_LIST_COLUMNS} FROM tracks t
                     WHERE t.id != ? 
                     AND (
                         t.artist_id = ? 
@@ -624,8 +1684,8 @@ class Database:
                 
             elif artist_id:
                 # Recommend tracks from the artist and similar artists
-                cursor.execute("""
-                    SELECT * FROM tracks
+                cursor.execute(f"""
+                    SELECT {self.TRACK_LIST_COLUMNS} FROM tracks t
                     WHERE artist_id = ?
                     ORDER BY play_count DESC, RANDOM()
                     LIMIT ?
@@ -633,8 +1693,8 @@ class Database:
             
             else:
                 # Random popular tracks if no seed provided
-                cursor.execute("""
-                    SELECT * FROM tracks
+                cursor.execute(f"""
+                    SELECT {self.TRACK_LIST_COLUMNS} FROM tracks t
                     ORDER BY play_count DESC, RANDOM()
                     LIMIT ?
                 """, (limit,))
@@ -645,3 +1705,26 @@ class Database:
         except Exception as e:
             print(f"Error getting recommendations: {e}")
             return []
+
+
+class AsyncDatabase:
+    """
+    Awaitable view of a Database - ``await db.aio.get_tracks(...)`` runs the
+    call on the database thread pool so queries never block the event loop.
+    Reads use that worker's own connection; writes queue on the writer lock.
+    """
+    
+    def __init__(self, database: Database):
+        self._db = database
+    
+    def __getattr__(self, name: str):
+        method = getattr(self._db, name)
+        if not callable(method):
+            raise AttributeError(name)
+        
+        @functools.wraps(method)
+        async def call(*args, **kwargs):
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._db.executor, functools.partial(method, *args, **kwargs))
+        
+        return call
@@ -0,0 +1,184 @@
+"""
+Acoustic Fingerprints
+Reduces the opening seconds of each track to a sequence of 32-bit
+sub-fingerprints (signs of band energy differences across time and
+frequency), so the same recording is recognised however it was encoded,
+tagged or named
+"""
+
+import asyncio
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from track_jobs import TrackJob
+from waveform import DECODE_SAMPLE_RATE, decode_samples
+
+# Seconds of audio fingerprinted, after any leading silence
+FINGERPRINT_SECONDS = 20
+# Leading silence longer than this is not skipped
+MAX_LEADING_SILENCE = 10
+
+FRAME_SIZE = 2048
+HOP_SIZE = 256
+# 33 log-spaced bands between these frequencies give 32 bits per frame
+BAND_EDGES_HZ = np.geomspace(300, 2000, 34)
+
+# Every KEY_STRIDE-th sub-fingerprint is indexed for candidate lookup
+KEY_STRIDE = 4
+# Matching recordings differ in fewer than this share of bits
+MATCH_BIT_ERROR_RATE = 0.35
+# Frames two fingerprints may be shifted by when compared
+MAX_SHIFT = 8
+
+_BAND_BINS = np.round(BAND_EDGES_HZ * FRAME_SIZE / DECODE_SAMPLE_RATE).astype(np.int64)
+_WINDOW = np.hanning(FRAME_SIZE).astype(np.float32)
+_BIT_WEIGHTS = (1 << np.arange(32, dtype=np.uint64)).astype(np.uint64)
+# Sub-fingerprints of silence or flat noise - too common to look anything up by
+_UNINFORMATIVE = (0, 0xFFFFFFFF)
+
+
+def trim_silence(samples: np.ndarray, threshold: float = 0.05) -> np.ndarray:
+    """Drop samples before the first one louder than threshold times the peak"""
+    if samples.size == 0:
+        return samples
+    loud = np.flatnonzero(np.abs(samples) >= threshold * np.abs(samples).max())
+    return samples[loud[0]:] if loud.size else samples
+
+
+def compute_fingerprint(samples: np.ndarray) -> np.ndarray:
+    """
+    Sub-fingerprints (uint32, one per hop) of mono samples at DECODE_SAMPLE_RATE
+    
+    Bit m of frame n is set when the energy difference between bands m and
+    m+1 grew since frame n-1, which survives re-encoding, resampling and
+    loudness changes. Raises ValueError for excerpts too short to fingerprint.
+    """
+    if samples.size < FRAME_SIZE + 2 * HOP_SIZE:
+        raise ValueError("Audio is too short to fingerprint")
+    
+    frames = np.lib.stride_tricks.sliding_window_view(samples, FRAME_SIZE)[::HOP_SIZE] * _WINDOW
+    power = np.abs(np.fft.rfft(frames, axis=1)) ** 2
+    energies = np.add.reduceat(power, _BAND_BINS[:-1], axis=1)
+    
+    differences = energies[:, :-1] - energies[:, 1:]
+    bits = (differences[1:] - differences[:-1]) > 0
+    return (bits.astype(np.uint64) @ _BIT_WEIGHTS).astype(np.uint32)
+
+
+def fingerprint_from_blob(blob: bytes) -> np.ndarray:
+    return np.frombuffer(blob, dtype="<u4")
+
+
+def fingerprint_keys(fingerprint: np.ndarray, stride: int = KEY_STRIDE) -> List[int]:
+    """
+    Distinct sub-fingerprints to index (stride > 1) or look up by (stride 1)
+    
+    Lookups use every frame, so a match is found whichever frames the
+    stored side sampled.
+    """
+    return sorted({value for value in fingerprint[::stride].tolist() if value not in _UNINFORMATIVE})
+
+
+def bit_error_rate(a: np.ndarray, b: np.ndarray, max_shift: int = MAX_SHIFT) -> float:
+    """Share of differing bits between two fingerprints at their best alignment"""
+    best = 1.0
+    for shift in range(-max_shift, max_shift + 1):
+        x, y = (a[shift:], b) if shift >= 0 else (a, b[-shift:])
+        length = min(len(x), len(y))
+        # Require most of the shorter fingerprint to overlap
+        if length < min(len(a), len(b)) // 2 or length == 0:
+            continue
+        differing = np.unpackbits((x[:length] ^ y[:length]).view(np.uint8)).sum()
+        best = min(best, differing / (length * 32))
+    return float(best)
+
+
+def build_fingerprint(path: Path) -> Dict:
+    """Decode the start of a file and compute its stored fingerprint record"""
+    stat_result = path.stat()
+    samples = trim_silence(decode_samples(path, duration=FINGERPRINT_SECONDS + MAX_LEADING_SILENCE))
+    fingerprint = compute_fingerprint(samples[:FINGERPRINT_SECONDS * DECODE_SAMPLE_RATE])
+    return {
+        "fingerprint": fingerprint.astype("<u4").tobytes(),
+        "keys": fingerprint_keys(fingerprint),
+        "file_size": stat_result.st_size,
+        "file_mtime_ns": stat_result.st_mtime_ns
+    }
+
+
+class FingerprintIndex(TrackJob):
+    """
+    Fingerprints the library and finds recordings that are already in it
+    
+    A background job fingerprints tracks that lack one after each scan.
+    Lookups fetch candidates sharing sampled sub-fingerprints through the
+    indexed fingerprint_keys table, then confirm them by bit error rate.
+    """
+    
+    name = "Fingerprint"
+    workers_env = "FINGERPRINT_WORKERS"
+    
+    async def pending_tracks(self) -> List[Dict[str, str]]:
+        return await self.db.aio.get_tracks_without_fingerprint()
+    
+    async def process(self, track_id: str, file_path: str) -> bool:
+        return await self.index_track(track_id, file_path)
+    
+    async def index_track(self, track_id: str, file_path: str) -> bool:
+        """Fingerprint one track and store the result"""
+        try:
+            loop = asyncio.get_running_loop()
+            record = await loop.run_in_executor(None, build_fingerprint, Path(file_path))
+            await self.db.aio.save_fingerprint(track_id, **record)
+            return True
+        except Exception as e:
+            print(f"Could not fingerprint {file_path}: {e}")
+            return False
+    
+    async def find_matches(self, file_path: str, exclude: Optional[str] = None) -> List[Dict]:
+        """
+        Tracks whose recording matches an audio file, best match first
+        
+        Returns [{"track_id", "bit_error_rate"}]; exclude skips the file's
+        own track. Raises like build_fingerprint if the file can't be decoded.
+        """
+        loop = asyncio.get_running_loop()
+        record = await loop.run_in_executor(None, build_fingerprint, Path(file_path))
+        fingerprint = fingerprint_from_blob(record["fingerprint"])
+        
+        candidates = await self.db.aio.find_fingerprint_candidates(fingerprint_keys(fingerprint, stride=1), exclude=exclude)
+        stored = await self.db.aio.get_fingerprints(candidates)
+        matches = []
+        for track_id, blob in stored.items():
+            rate = bit_error_rate(fingerprint, fingerprint_from_blob(blob))
+            if rate < MATCH_BIT_ERROR_RATE:
+                matches.append({"track_id": track_id, "bit_error_rate": round(rate, 3)})
+        return sorted(matches, key=lambda match: match["bit_error_rate"])
+    
+    async def duplicate_groups(self) -> List[List[str]]:
+        """Groups of track ids (two or more) holding the same recording, across the whole library"""
+        pairs = await self.db.aio.get_fingerprint_candidate_pairs()
+        stored = await self.db.aio.get_fingerprints(sorted({track_id for pair in pairs for track_id in pair}))
+        
+        def confirm() -> List[Tuple[str, str]]:
+            return [(a, b) for a, b in pairs if a in stored and b in stored
+                    and bit_error_rate(fingerprint_from_blob(stored[a]), fingerprint_from_blob(stored[b])) < MATCH_BIT_ERROR_RATE]
+        
+        # Union-find over confirmed pairs, so A~B and B~C land in one group
+        parent: Dict[str, str] = {}
+        
+        def root(track_id: str) -> str:
+            while parent.setdefault(track_id, track_id) != track_id:
+                parent[track_id] = parent[parent[track_id]]
+                track_id = parent[track_id]
+            return track_id
+        
+        for a, b in await asyncio.get_running_loop().run_in_executor(None, confirm):
+            parent[root(a)] = root(b)
+        
+        groups: Dict[str, List[str]] = {}
+        for track_id in parent:
+            groups.setdefault(root(track_id), []).append(track_id)
+        return [sorted(group) for group in groups.values() if len(group) > 1]
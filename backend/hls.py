@@ -0,0 +1,307 @@
+"""
+HLS Segmented Streaming
+Builds master and media playlists for a track and encodes each variant once,
+continuously, into fixed-length MPEG-TS segments with FFmpeg on first
+request, caching them alongside the transcodes
+"""
+
+import asyncio
+import math
+import os
+import re
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from transcoder import TranscodeCache, require_ffmpeg
+
+# AAC bitrates (kbps) offered for every source, highest first
+LADDER = (256, 128, 64)
+
+SEGMENT_SECONDS = int(os.getenv("HLS_SEGMENT_SECONDS", "4"))
+
+PLAYLIST_MEDIA_TYPE = "application/vnd.apple.mpegurl"
+SEGMENT_MEDIA_TYPE = "video/mp2t"
+
+_VARIANT = re.compile(r"^(original|enhanced)-(\d+)$")
+
+# Segment lengths of a finished encode, one per line, kept with its segments
+TIMINGS_FILE = "segments.txt"
+
+
+class SegmentNotFound(LookupError):
+    """The encode finished without producing the requested segment"""
+
+
+def variant_name(source: str, bitrate: int) -> str:
+    return f"{source}-{bitrate}"
+
+
+def parse_variant(variant: str) -> Optional[Tuple[str, int]]:
+    """Split a variant name like "original-128" into (source, bitrate), or None if unknown"""
+    match = _VARIANT.match(variant)
+    if not match or int(match.group(2)) not in LADDER:
+        return None
+    return match.group(1), int(match.group(2))
+
+
+def segment_count(duration_ms: int, segment_seconds: int = SEGMENT_SECONDS) -> int:
+    return max(1, math.ceil(duration_ms / (segment_seconds * 1000)))
+
+
+def master_playlist(source: str) -> str:
+    """
+    Master playlist listing the bitrate ladder for one source
+    
+    Every variant shares the same segment grid, so players can switch
+    bitrate - or between the original and enhanced masters - at any
+    segment boundary.
+    """
+    lines = ["#EXTM3U", "#EXT-X-VERSION:3", "#EXT-X-INDEPENDENT-SEGMENTS"]
+    for bitrate in LADDER:
+        # Allow ~10% for MPEG-TS overhead
+        lines.append(f'#EXT-X-STREAM-INF:BANDWIDTH={bitrate * 1100},CODECS="mp4a.40.2"')
+        lines.append(f"{variant_name(source, bitrate)}/index.m3u8")
+    return "\n".join(lines) + "\n"
+
+
+def media_playlist(duration_ms: int, version: str, segment_seconds: int = SEGMENT_SECONDS,
+                   timings: Optional[List[float]] = None) -> str:
+    """
+    VOD media playlist for a track
+    
+    Segment lengths are the timings of a finished encode when known, and
+    otherwise derived from duration_ms. version is appended to segment URLs
+    so they can be cached immutably and change whenever the source file does.
+    """
+    if not timings:
+        timings = [min(segment_seconds, duration_ms / 1000 - index * segment_seconds)
+                   for index in range(segment_count(duration_ms, segment_seconds))]
+    lines = [
+        "#EXTM3U",
+        "#EXT-X-VERSION:3",
+        # Segments are cut on frame boundaries, so they can run slightly long
+        f"#EXT-X-TARGETDURATION:{max(segment_seconds, math.ceil(max(timings)))}",
+        "#EXT-X-MEDIA-SEQUENCE:0",
+        "#EXT-X-PLAYLIST-TYPE:VOD",
+    ]
+    for index, length in enumerate(timings):
+        lines.append(f"#EXTINF:{max(length, 0.001):.3f},")
+        lines.append(f"{index}.ts?v={version}")
+    lines.append("#EXT-X-ENDLIST")
+    return "\n".join(lines) + "\n"
+
+
+class VariantEncode:
+    """Progress of one continuous ffmpeg encode of a variant into segments"""
+    
+    def __init__(self):
+        self.completed = set()
+        self.done = False
+        self.error: Optional[str] = None
+        self.changed = asyncio.Condition()
+    
+    async def mark(self, index: Optional[int] = None, error: Optional[str] = None):
+        """Record a finished segment, or (with index None) the end of the encode"""
+        if index is None:
+            self.done = True
+            self.error = error
+        else:
+            self.completed.add(index)
+        async with self.changed:
+            self.changed.notify_all()
+    
+    async def wait_for(self, index: int):
+        """
+        Wait until segment index is written
+        
+        Raises RuntimeError if the encode fails first, or SegmentNotFound if it
+        succeeds without the segment (the source is shorter than expected).
+        """
+        async with self.changed:
+            await self.changed.wait_for(lambda: index in self.completed or self.done)
+        if index not in self.completed:
+            if self.error:
+                raise RuntimeError(self.error)
+            raise SegmentNotFound(f"Segment {index} was not produced")
+    
+    async def wait_done(self):
+        async with self.changed:
+            await self.changed.wait_for(lambda: self.done)
+
+
+class HlsSegmenter:
+    """
+    Encodes HLS variants on demand
+    
+    The first request for any segment of a variant starts one continuous
+    ffmpeg encode of the whole source, split by the segment muxer. A single
+    encoder run keeps AAC priming and encoder state continuous across
+    segment boundaries, so segments join without gaps or clicks. Requests
+    wait only for their own segment; concurrent requests share the encode.
+    Segments live in the transcode cache and count against its size limit.
+    """
+    
+    def __init__(self, cache: TranscodeCache, segment_seconds: int = SEGMENT_SECONDS,
+                 max_concurrent: Optional[int] = None):
+        self.cache = cache
+        self.segment_seconds = segment_seconds
+        self._slots = asyncio.Semaphore(max_concurrent or os.cpu_count() or 2)
+        self._encodes: Dict[str, VariantEncode] = {}
+        self._tasks: Dict[str, asyncio.Task] = {}
+        # Segment lengths by variant directory, as read from (or written to) TIMINGS_FILE
+        self._timings: Dict[str, List[float]] = {}
+    
+    def version(self, source: Path, stat_result: os.stat_result) -> str:
+        """Short token identifying the current contents of a source file"""
+        return self.cache.cache_key(source, stat_result, "hls", self.segment_seconds)[:12]
+    
+    async def segment(self, source: Path, stat_result: os.stat_result, bitrate: int, index: int) -> Path:
+        """Get the path of an encoded segment, encoding its variant first if needed"""
+        directory = self._directory(source, stat_result, bitrate)
+        path = directory / f"{index}.ts"
+        if await self.cache.hit(path):
+            return path
+        
+        encode = await self._start(source, bitrate, directory)
+        # Shield the shared wait so one client disconnecting doesn't affect the others
+        await asyncio.shield(encode.wait_for(index))
+        return path
+    
+    async def timings(self, source: Path, stat_result: os.stat_result, bitrate: int,
+                      wait: bool = False) -> Optional[List[float]]:
+        """
+        Segment lengths of a variant from a finished encode, or None if it hasn't been encoded
+        
+        With wait set, a variant that has no timings is encoded in full first.
+        """
+        directory = self._directory(source, stat_result, bitrate)
+        timings = self._timings.get(directory.name)
+        if timings is not None:
+            return timings
+        
+        path = directory / TIMINGS_FILE
+        if not await self.cache.hit(path):
+            if not wait:
+                return None
+            encode = await self._start(source, bitrate, directory)
+            await asyncio.shield(encode.wait_done())
+        
+        timings = await asyncio.get_running_loop().run_in_executor(None, self._read_timings, path)
+        if timings:
+            self._timings[directory.name] = timings
+        return timings
+    
+    @staticmethod
+    def _read_timings(path: Path) -> Optional[List[float]]:
+        try:
+            return [float(line) for line in path.read_text(encoding="utf-8").split()]
+        except (OSError, ValueError):
+            return None
+    
+    def _directory(self, source: Path, stat_result: os.stat_result, bitrate: int) -> Path:
+        key = self.cache.cache_key(source, stat_result, f"hls{self.segment_seconds}", bitrate)
+        return self.cache.entry_path(key, "")
+    
+    async def _start(self, source: Path, bitrate: int, directory: Path) -> VariantEncode:
+        """Start encoding a variant, or join the encode already running (or finished with a segment since evicted)"""
+        encode = self._encodes.get(directory.name)
+        if encode is not None and not encode.done:
+            return encode
+        
+        await require_ffmpeg()
+        # A concurrent request may have started it while ffmpeg was looked up
+        encode = self._encodes.get(directory.name)
+        if encode is not None and not encode.done:
+            return encode
+        
+        encode = VariantEncode()
+        self._encodes[directory.name] = encode
+        task = asyncio.create_task(self._encode(source, bitrate, directory, encode))
+        self._tasks[directory.name] = task
+        task.add_done_callback(lambda _: self._finished(directory.name, encode))
+        return encode
+    
+    def _finished(self, name: str, encode: VariantEncode):
+        # A newer encode of the same variant may have started once this one was marked done
+        if self._encodes.get(name) is encode:
+            del self._encodes[name]
+            del self._tasks[name]
+    
+    async def _encode(self, source: Path, bitrate: int, directory: Path, encode: VariantEncode):
+        command = [
+            "ffmpeg", "-nostdin", "-v", "error",
+            "-i", str(source),
+            "-map", "0:a:0", "-vn",
+            "-c:a", "aac", "-b:a", f"{bitrate}k", "-ar", "44100", "-ac", "2",
+            "-f", "segment", "-segment_time", str(self.segment_seconds), "-segment_format", "mpegts",
+            # Each finished segment is printed as "name,start,end" as soon as it is closed
+            "-segment_list", "pipe:1", "-segment_list_type", "csv",
+            "-muxdelay", "0", "-muxpreload", "0",
+            str(directory / "%d.ts.part"),
+        ]
+        
+        error = None
+        process = None
+        lengths: Dict[int, float] = {}
+        try:
+            async with self._slots:
+                loop = asyncio.get_running_loop()
+                await loop.run_in_executor(None, lambda: directory.mkdir(parents=True, exist_ok=True))
+                process = await asyncio.create_subprocess_exec(
+                    *command,
+                    stdout=asyncio.subprocess.PIPE,
+                    stderr=asyncio.subprocess.PIPE
+                )
+                stderr_task = asyncio.create_task(process.stderr.read())
+                
+                async for line in process.stdout:
+                    fields = line.decode(errors="ignore").strip().split(",")
+                    name = os.path.basename(fields[0])
+                    if len(fields) != 3 or not name.endswith(".ts.part"):
+                        continue
+                    index = int(name.split(".", 1)[0])
+                    lengths[index] = float(fields[2]) - float(fields[1])
+                    path = directory / f"{index}.ts"
+                    size = await loop.run_in_executor(None, self._publish, directory / name, path)
+                    self.cache.add(path, size)
+                    await encode.mark(index)
+                
+                stderr = await stderr_task
+                if await process.wait() != 0:
+                    error = f"Encoding HLS variant of {source} failed: {stderr.decode(errors='ignore').strip()}"
+                elif lengths and sorted(lengths) == list(range(len(lengths))):
+                    timings = [lengths[index] for index in range(len(lengths))]
+                    path = directory / TIMINGS_FILE
+                    size = await loop.run_in_executor(None, self._write_timings, path, timings)
+                    self.cache.add(path, size)
+                    self._timings[directory.name] = timings
+        except asyncio.CancelledError:
+            error = "Encoding cancelled"
+            raise
+        except Exception as e:
+            error = f"Encoding HLS variant of {source} failed: {e}"
+        finally:
+            if process is not None and process.returncode is None:
+                process.kill()
+                await process.wait()
+            if error:
+                print(error)
+            await encode.mark(error=error)
+    
+    @staticmethod
+    def _write_timings(path: Path, timings: List[float]) -> int:
+        part_path = path.with_name(path.name + ".part")
+        part_path.write_text("".join(f"{length:.3f}\n" for length in timings), encoding="utf-8")
+        os.replace(part_path, path)
+        return path.stat().st_size
+    
+    def _publish(self, part_path: Path, path: Path) -> int:
+        """Move a finished segment into place, returning its size"""
+        os.replace(part_path, path)
+        return path.stat().st_size
+    
+    async def close(self):
+        """Cancel running encodes"""
+        for task in list(self._tasks.values()):
+            task.cancel()
+        await asyncio.gather(*self._tasks.values(), return_exceptions=True)
@@ -0,0 +1,193 @@
+"""
+Live Library Watcher
+Follows filesystem events under the music folder (inotify and friends via
+watchdog, or polling where that is unavailable) and hands batches of
+changed paths to the scanner, so edits show up without a full rescan
+"""
+
+import asyncio
+import os
+import time
+from pathlib import Path
+from typing import Awaitable, Callable, Dict, Optional, Set
+
+from music_scanner import MusicScanner, SIDECAR_FILES
+
+try:
+    from watchdog.events import FileSystemEventHandler
+    from watchdog.observers import Observer
+    WATCHDOG_AVAILABLE = True
+except ImportError:
+    FileSystemEventHandler = object
+    WATCHDOG_AVAILABLE = False
+
+# Files whose changes matter to the library: audio and the sidecars next to it
+WATCHED_SUFFIXES = MusicScanner.SUPPORTED_FORMATS
+WATCHED_NAMES = set(SIDECAR_FILES)
+
+CHANGE_EVENTS = {"created", "modified", "moved", "deleted", "closed"}
+
+
+def is_relevant(path: str) -> bool:
+    name = os.path.basename(path)
+    return name in WATCHED_NAMES or os.path.splitext(name)[1] in WATCHED_SUFFIXES
+
+
+class _EventHandler(FileSystemEventHandler):
+    """Forwards relevant watchdog events (from the observer thread) to the watcher's loop"""
+    
+    def __init__(self, watcher: "LibraryWatcher", loop: asyncio.AbstractEventLoop):
+        self.watcher = watcher
+        self.loop = loop
+    
+    def on_any_event(self, event):
+        # Reads (opened / closed without writing) happen on every stream and change nothing
+        if event.event_type not in CHANGE_EVENTS:
+            return
+        # Modified directories only mean their entries changed, which arrive as their own events
+        if event.is_directory and event.event_type == "modified":
+            return
+        paths = [event.src_path, getattr(event, "dest_path", "")]
+        paths = [os.fsdecode(path) for path in paths if path]
+        if not event.is_directory:
+            paths = [path for path in paths if is_relevant(path)]
+        if paths:
+            self.loop.call_soon_threadsafe(self.watcher.notify, paths)
+
+
+class LibraryWatcher:
+    """
+    Debounced change feed for the music folder
+    
+    Events are collected until the folder has been quiet for debounce
+    seconds (or max_delay has passed since the first one), then the
+    collected paths are passed to on_changes in one call. Calls never
+    overlap; events arriving meanwhile go into the next batch.
+    """
+    
+    def __init__(self, folder: str, on_changes: Callable[[Set[str]], Awaitable[Dict]],
+                 debounce: Optional[float] = None, poll_interval: float = 10.0, max_delay: float = 30.0):
+        self.folder = Path(folder)
+        self.on_changes = on_changes
+        if debounce is None:
+            debounce = float(os.getenv("LIBRARY_WATCH_DEBOUNCE", "2"))
+        self.debounce = debounce
+        self.poll_interval = poll_interval
+        self.max_delay = max_delay
+        self.mode = None
+        self._observer = None
+        self._poller: Optional[asyncio.Task] = None
+        self._flusher: Optional[asyncio.Task] = None
+        self._pending: Set[str] = set()
+        self._first_event = 0.0
+        self._last_event = 0.0
+        self._wakeup: Optional[asyncio.Event] = None
+        self.status = {"batches": 0, "paths": 0, "last_batch_at": None, "last_result": None}
+    
+    def start(self):
+        """Start watching; must be called from the event loop"""
+        loop = asyncio.get_running_loop()
+        self._wakeup = asyncio.Event()
+        self._flusher = asyncio.create_task(self._flush_loop())
+        
+        if WATCHDOG_AVAILABLE:
+            try:
+                self._observer = Observer()
+                self._observer.schedule(_EventHandler(self, loop), str(self.folder), recursive=True)
+                self._observer.start()
+                self.mode = "events"
+                return
+            except Exception as e:
+                print(f"Filesystem events unavailable ({e}) - polling the music folder instead")
+                self._observer = None
+        
+        self._poller = asyncio.create_task(self._poll_loop())
+        self.mode = "polling"
+    
+    def notify(self, paths):
+        """Queue changed paths for the next batch"""
+        now = time.monotonic()
+        if not self._pending:
+            self._first_event = now
+        self._pending.update(paths)
+        self._last_event = now
+        if self._wakeup is not None:
+            self._wakeup.set()
+    
+    async def _flush_loop(self):
+        while True:
+            await self._wakeup.wait()
+            self._wakeup.clear()
+            
+            # Trailing-edge debounce, capped so a constant trickle of events still gets indexed
+            while self._pending:
+                now = time.monotonic()
+                due = min(self._last_event + self.debounce, self._first_event + self.max_delay)
+                if now >= due:
+                    break
+                await asyncio.sleep(due - now)
+            if not self._pending:
+                continue
+            
+            paths, self._pending = self._pending, set()
+            try:
+                result = await self.on_changes(paths)
+                self.status.update(last_result=result)
+            except Exception as e:
+                print(f"Indexing library changes failed: {e}")
+                self.status.update(last_result={"error": str(e)})
+            self.status["batches"] += 1
+            self.status["paths"] += len(paths)
+            self.status["last_batch_at"] = time.time()
+    
+    def _snapshot(self) -> Optional[Dict[str, tuple]]:
+        """(size, mtime_ns) of every relevant file, or None if the folder is missing"""
+        if not self.folder.is_dir():
+            return None
+        
+        snapshot = {}
+        stack = [str(self.folder)]
+        while stack:
+            try:
+                with os.scandir(stack.pop()) as entries:
+                    for entry in entries:
+                        try:
+                            if entry.is_dir(follow_symlinks=False):
+                                stack.append(entry.path)
+                            elif is_relevant(entry.name):
+                                stat_result = entry.stat()
+                                snapshot[entry.path] = (stat_result.st_size, stat_result.st_mtime_ns)
+                        except OSError:
+                            continue
+            except OSError:
+                continue
+        return snapshot
+    
+    async def _poll_loop(self):
+        loop = asyncio.get_running_loop()
+        previous = await loop.run_in_executor(None, self._snapshot)
+        while True:
+            await asyncio.sleep(self.poll_interval)
+            current = await loop.run_in_executor(None, self._snapshot)
+            # A folder that vanished or emptied at once is more likely unmounted than deleted
+            if current is None or (previous and not current):
+                continue
+            if previous is not None:
+                changed = {path for path in previous.keys() | current.keys()
+                           if previous.get(path) != current.get(path)}
+                if changed:
+                    self.notify(changed)
+            previous = current
+    
+    def get_status(self) -> Dict:
+        return {"mode": self.mode, "debounce": self.debounce, "pending": len(self._pending), **self.status}
+    
+    async def stop(self):
+        if self._observer is not None:
+            observer, self._observer = self._observer, None
+            observer.stop()
+            await asyncio.get_running_loop().run_in_executor(None, observer.join)
+        tasks = [task for task in (self._poller, self._flusher) if task is not None]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
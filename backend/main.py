@@ -1,10 +1,13 @@
-from fastapi import FastAPI, HTTPException, UploadFile, File, Query
+from fastapi import FastAPI, HTTPException, UploadFile, File, Query, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import FileResponse, StreamingResponse
 from fastapi.staticfiles import StaticFiles
 from pathlib import Path
 import os
-from typing import List, Optional
+import hashlib
+import json
+import asyncio
+from typing import Dict, List, Optional, Tuple
 from contextlib import asynccontextmanager
 from dotenv import load_dotenv
 import uvicorn
@@ -14,6 +17,14 @@ from database import Database
 from models import Track, Album, Artist, Playlist, TrackResponse, AlbumResponse, ArtistResponse, PlaylistResponse
 from youtube_downloader import YouTubeDownloader
 from audio_enhancer import audio_enhancer
+from streaming import stream_file, is_not_modified, HotFileCache
+from prefetcher import Prefetcher
+from transcoder import TranscodeCache, TranscodeUnavailable, CODECS, DEFAULT_CODEC, DEFAULT_BITRATE
+from covers import CoverStore, COVER_SIZES, COVER_FORMATS, is_content_hash, pick_size, pick_format
+from waveform import WaveformGenerator, BASE_RESOLUTION, peaks_from_blob, resample_peaks
+from library_watcher import LibraryWatcher
+from fingerprint import FingerprintIndex
+import hls
 
 load_dotenv()
 
@@ -22,18 +33,77 @@ MUSIC_FOLDER = os.getenv("MUSIC_FOLDER", "./music_library")
 db = Database()
 scanner = MusicScanner(db)
 youtube_downloader = YouTubeDownloader(MUSIC_FOLDER)
+transcode_cache = TranscodeCache("./transcode_cache")
+hls_segmenter = hls.HlsSegmenter(transcode_cache)
+stream_cache = HotFileCache()
+cover_store = CoverStore("./covers")
+prefetcher = Prefetcher(db, stream_cache, transcode_cache, cover_store)
+waveform_generator = WaveformGenerator(db)
+fingerprint_index = FingerprintIndex(db)
+
+
+def library_path(filepath: str) -> Path:
+    """
+    A file's path in the form the scanner, file manifest and watcher key it by
+    
+    Downloads come back as absolute paths while the library is walked from
+    MUSIC_FOLDER as configured; the same file must not be indexed twice.
+    """
+    path = Path(filepath)
+    try:
+        return Path(MUSIC_FOLDER) / path.resolve().relative_to(Path(MUSIC_FOLDER).resolve())
+    except ValueError:
+        return path
+
+
+def library_track_id(filepath: str) -> str:
+    """The id the scanner gives the track of a file (see MusicScanner.extract_metadata)"""
+    return hashlib.md5(str(library_path(filepath)).encode()).hexdigest()[:16]
+
+
+async def on_library_change(paths):
+    """Index files changed under the music folder since the last batch"""
+    if not os.path.isdir(MUSIC_FOLDER):
+        return {"skipped": "music folder missing"}
+    result = await scanner.scan_changes(paths)
+    if result["processed"]:
+        waveform_generator.start_background_job()
+        fingerprint_index.start_background_job()
+    return result
+
+
+# Set LIBRARY_WATCH=0 to pick up changes only through full scans
+library_watcher = LibraryWatcher(MUSIC_FOLDER, on_library_change) if os.getenv("LIBRARY_WATCH", "1") != "0" else None
 
 # Lifespan event handler (replaces on_event)
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    # Startup
+    # Startup - serve from the existing database while the library is scanned in the background
     db.init_db()
     print(f"Scanning music library at: {MUSIC_FOLDER}")
-    await scanner.scan_folder(MUSIC_FOLDER)
-    print("Music library scan complete!")
+    scan_task = scanner.start_background_scan(MUSIC_FOLDER)
+    # Compute missing waveforms once the scan has found every track
+    waveform_generator.start_background_job(after=scan_task)
+    fingerprint_index.start_background_job(after=scan_task)
+    # Follow later changes as they happen; batches wait for the scan to finish
+    if library_watcher:
+        library_watcher.start()
     yield
-    # Shutdown (if needed)
-    pass
+    # Shutdown - stop an unfinished scan, then close the database pool
+    if not scan_task.done():
+        scan_task.cancel()
+        try:
+            await scan_task
+        except asyncio.CancelledError:
+            pass
+    if library_watcher:
+        await library_watcher.stop()
+    await waveform_generator.close()
+    await fingerprint_index.close()
+    await prefetcher.close()
+    await hls_segmenter.close()
+    await transcode_cache.close()
+    db.close()
 
 app = FastAPI(
     title="Personal Music Player API", 
@@ -48,6 +118,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor"],
 )
 
 # Initialize cover folder
@@ -63,6 +134,7 @@ async def add_cors_headers(request, call_next):
     # Add CORS headers for media endpoints
     if (request.url.path.startswith("/covers/") or 
         request.url.path.startswith("/images/") or
+        request.url.path.startswith("/artwork/") or
         "/cover" in request.url.path or 
         "/animated-cover" in request.url.path):
         response.headers["Access-Control-Allow-Origin"] = "*"
@@ -81,6 +153,18 @@ if PUBLIC_IMAGES.exists():
 # Startup is now handled by lifespan context manager below
 
 
+async def paginate(response: Response, page_fn, **kwargs):
+    """Run a keyset page query and expose its next cursor in the X-Next-Cursor header"""
+    try:
+        items, next_cursor = await page_fn(**kwargs)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    return items
+
+
 @app.get("/")
 async def root():
     return {"message": "Personal Music Player API", "version": "1.0.0"}
@@ -89,115 +173,368 @@ async def root():
 # ==================== TRACKS ====================
 @app.get("/tracks", response_model=List[TrackResponse])
 async def get_tracks(
+    response: Response,
     limit: int = Query(50, ge=1, le=200),
     offset: int = Query(0, ge=0),
-    search: Optional[str] = None
+    search: Optional[str] = None,
+    cursor: Optional[str] = None
 ):
-    """Get all tracks with pagination and optional search"""
-    tracks = db.get_tracks(limit=limit, offset=offset, search=search)
+    """
+    Get all tracks with pagination and optional search
+    
+    Pass cursor (empty for the first page) to page by keyset instead of
+    offset; the next page's cursor is returned in the X-Next-Cursor header.
+    """
+    if cursor is not None:
+        return await paginate(response, db.aio.get_tracks_page, limit=limit, cursor=cursor, search=search)
+    
+    tracks = await db.aio.get_tracks(limit=limit, offset=offset, search=search)
     return tracks
 
 
 @app.get("/tracks/{track_id}", response_model=TrackResponse)
 async def get_track(track_id: str):
     """Get specific track by ID with all media asset paths"""
-    track = db.get_track(track_id)
+    track = await db.aio.get_track(track_id)
     if not track:
         raise HTTPException(status_code=404, detail="Track not found")
     
-    # Add paths to cover, lyrics, and animated cover based on file location
-    file_path = Path(track.get("file_path", ""))
-    if file_path.exists():
-        folder = file_path.parent
-        
-        # Check for cover.jpg
-        cover_file = folder / "cover.jpg"
-        if cover_file.exists():
-            track["cover_url"] = f"http://localhost:8000/tracks/{track_id}/cover"
-        
-        # Check for canvas.mp4 (preferred) or animated_cover.mp4 (fallback)
-        canvas_file = folder / "canvas.mp4"
-        animated_cover = folder / "animated_cover.mp4"
-        
-        if canvas_file.exists():
-            track["animated_cover_url"] = f"http://localhost:8000/tracks/{track_id}/animated-cover"
-        elif animated_cover.exists():
-            track["animated_cover_url"] = f"http://localhost:8000/tracks/{track_id}/animated-cover"
-        
-        # Check for lyrics file (lyrics.lrc) - load dynamically if not in database
-        if not track.get("lyrics"):
-            lyrics_file = folder / "lyrics.lrc"
-            print(f"[LYRICS DEBUG] Checking for lyrics file: {lyrics_file}")
-            print(f"[LYRICS DEBUG] File exists: {lyrics_file.exists()}")
-            if lyrics_file.exists():
-                try:
-                    with open(lyrics_file, 'r', encoding='utf-8') as f:
-                        lyrics_content = f.read()
-                        track["lyrics"] = lyrics_content
-                        print(f"[LYRICS DEBUG] Successfully loaded lyrics ({len(lyrics_content)} characters)")
-                        print(f"[LYRICS DEBUG] First 100 chars: {lyrics_content[:100]}")
-                except Exception as e:
-                    print(f"[LYRICS DEBUG] Error reading lyrics file for track {track_id}: {e}")
-            else:
-                print(f"[LYRICS DEBUG] No lyrics.lrc file found in folder: {folder}")
-        else:
-            print(f"[LYRICS DEBUG] Lyrics already in database ({len(track.get('lyrics', ''))} characters)")
+    # Asset URLs come from the folder assets recorded by the scanner, so nothing is stat'ed here.
+    # Lyrics too were read from lyrics.lrc by the scanner, which re-reads a folder's tracks when it changes.
+    assets = track["assets"]
+    if "cover.jpg" in assets:
+        track["cover_url"] = f"http://localhost:8000/tracks/{track_id}/cover"
+    if "canvas.mp4" in assets or "animated_cover.mp4" in assets:
+        track["animated_cover_url"] = f"http://localhost:8000/tracks/{track_id}/animated-cover"
     
     return track
 
 
+async def stat_audio_file(path: Path) -> Optional[os.stat_result]:
+    """Stat an audio file off the event loop, returning None if it is missing"""
+    try:
+        return await asyncio.get_running_loop().run_in_executor(None, os.stat, path)
+    except (FileNotFoundError, NotADirectoryError):
+        return None
+
+
 @app.get("/tracks/{track_id}/stream")
-async def stream_track(track_id: str, quality: str = Query("standard", pattern="^(standard|enhanced)$")):
-    """Stream audio file - supports quality switching between standard and enhanced"""
-    track = db.get_track(track_id)
+@app.head("/tracks/{track_id}/stream")
+async def stream_track(request: Request, track_id: str,
+                       quality: str = Query("standard", pattern="^(standard|enhanced)$"),
+                       codec: Optional[str] = Query(None, pattern="^(mp3|aac|opus)$"),
+                       bitrate: Optional[int] = Query(None, ge=32, le=320)):
+    """
+    Stream audio file - supports quality switching between standard and enhanced, byte ranges and 304s
+    
+    Passing codec and/or bitrate (kbps) transcodes the chosen file with FFmpeg.
+    The first play streams while transcoding; repeat plays come from the transcode cache.
+    An X-Prefetch-Tracks header (comma-separated ids) warms the tracks that play next.
+    """
+    upcoming = request.headers.get("x-prefetch-tracks")
+    if upcoming:
+        prefetcher.schedule([tid.strip() for tid in upcoming.split(",")], quality, codec, bitrate)
+    
+    track = await db.aio.get_track_stream_info(track_id)
     if not track or not track.get("file_path"):
         raise HTTPException(status_code=404, detail="Track not found")
     
-    # Determine which audio file to stream
-    file_path = Path(track["file_path"])
+    # Prefer the enhanced file when asked for and present, else fall back to the original
+    file_path, stat_result = None, None
+    if quality == "enhanced" and track.get("has_enhanced_version") and track.get("enhanced_file_path"):
+        file_path = Path(track["enhanced_file_path"])
+        stat_result = await stat_audio_file(file_path)
     
-    if quality == "enhanced" and track.get("has_enhanced_version"):
-        enhanced_path = track.get("enhanced_file_path")
-        if enhanced_path and Path(enhanced_path).exists():
-            file_path = Path(enhanced_path)
+    if not stat_result:
+        file_path = Path(track["file_path"])
+        stat_result = await stat_audio_file(file_path)
+        if not stat_result:
+            await db.aio.set_tracks_available([track["file_path"]], False)
+            raise HTTPException(status_code=404, detail="Audio file not found")
     
-    if not file_path.exists():
+    if codec or bitrate:
+        return await stream_transcoded(request, file_path, stat_result,
+                                       codec or DEFAULT_CODEC, bitrate or DEFAULT_BITRATE)
+    
+    return stream_file(request, file_path, stat_result, cache=stream_cache)
+
+
+async def stream_transcoded(request: Request, source: Path, stat_result: os.stat_result,
+                            codec: str, bitrate: int) -> Response:
+    """Serve a transcoded variant from the cache, or stream it while it is being transcoded"""
+    cached = await transcode_cache.lookup(source, stat_result, codec, bitrate)
+    if cached:
+        cached_stat = await stat_audio_file(cached)
+        if cached_stat:
+            return stream_file(request, cached, cached_stat, filename=source.stem + cached.suffix,
+                               cache=stream_cache)
+    
+    # HEAD is answered from the cache only - probing a variant must not start an encode
+    if request.method == "HEAD":
+        raise HTTPException(status_code=404, detail="Transcode not cached")
+    
+    try:
+        transcode = await transcode_cache.start(source, stat_result, codec, bitrate)
+    except TranscodeUnavailable as e:
+        raise HTTPException(status_code=503, detail=f"Transcoding unavailable: {e}")
+    
+    # Length and byte offsets are unknown until the transcode finishes
+    headers = {"Accept-Ranges": "none", "Cache-Control": "no-store"}
+    return StreamingResponse(transcode.stream(), media_type=transcode.media_type, headers=headers)
+
+
+# ==================== HLS STREAMING ====================
+async def get_hls_source(track_id: str, source: str):
+    """Resolve the track info, file and stat for an HLS source ("original" or "enhanced")"""
+    track = await db.aio.get_track_stream_info(track_id)
+    if not track:
+        raise HTTPException(status_code=404, detail="Track not found")
+    
+    path = track["enhanced_file_path"] if source == "enhanced" else track["file_path"]
+    if not path:
+        raise HTTPException(status_code=404, detail="No enhanced version found")
+    
+    file_path = Path(path)
+    stat_result = await stat_audio_file(file_path)
+    if not stat_result:
         raise HTTPException(status_code=404, detail="Audio file not found")
+    return track, file_path, stat_result
+
+
+@app.get("/tracks/{track_id}/hls/master.m3u8")
+async def get_hls_master_playlist(track_id: str, quality: str = Query("standard", pattern="^(standard|enhanced)$")):
+    """HLS master playlist - the bitrate ladder for the original (or enhanced) file"""
+    source = "enhanced" if quality == "enhanced" else "original"
+    await get_hls_source(track_id, source)
+    return Response(hls.master_playlist(source), media_type=hls.PLAYLIST_MEDIA_TYPE,
+                    headers={"Cache-Control": "no-cache"})
+
+
+@app.get("/tracks/{track_id}/hls/{variant}/index.m3u8")
+async def get_hls_media_playlist(track_id: str, variant: str):
+    """HLS media playlist for one variant, e.g. original-128"""
+    parsed = hls.parse_variant(variant)
+    if not parsed:
+        raise HTTPException(status_code=404, detail="Unknown variant")
     
-    # Safely encode filename for Content-Disposition header
-    safe_filename = file_path.name.encode('ascii', 'ignore').decode('ascii')
-    if not safe_filename:
-        safe_filename = "audio" + file_path.suffix
-    
-    return FileResponse(
-        file_path,
-        media_type="audio/mpeg",
-        headers={
-            "Accept-Ranges": "bytes",
-            "Content-Disposition": f'inline; filename="{safe_filename}"'
-        }
+    source, bitrate = parsed
+    track, file_path, stat_result = await get_hls_source(track_id, source)
+    # Without a scanned duration the variant is encoded up front to learn its segments
+    try:
+        timings = await hls_segmenter.timings(file_path, stat_result, bitrate, wait=not track["duration_ms"])
+    except TranscodeUnavailable as e:
+        raise HTTPException(status_code=503, detail=f"Transcoding unavailable: {e}")
+    if not timings and not track["duration_ms"]:
+        raise HTTPException(status_code=404, detail="Track duration unknown")
+    
+    playlist = hls.media_playlist(track["duration_ms"], hls_segmenter.version(file_path, stat_result),
+                                  hls_segmenter.segment_seconds, timings)
+    return Response(playlist, media_type=hls.PLAYLIST_MEDIA_TYPE, headers={"Cache-Control": "no-cache"})
+
+
+@app.get("/tracks/{track_id}/hls/{variant}/{segment}.ts")
+async def get_hls_segment(track_id: str, variant: str, segment: int):
+    """One MPEG-TS segment of a variant, encoded with the whole variant on first request"""
+    parsed = hls.parse_variant(variant)
+    if not parsed:
+        raise HTTPException(status_code=404, detail="Unknown variant")
+    
+    source, bitrate = parsed
+    track, file_path, stat_result = await get_hls_source(track_id, source)
+    # A finished encode knows the real segment count; otherwise the scanned duration
+    # bounds it, and an index past the end of the audio fails once the encode does
+    timings = await hls_segmenter.timings(file_path, stat_result, bitrate)
+    if timings:
+        count = len(timings)
+    elif track["duration_ms"]:
+        count = hls.segment_count(track["duration_ms"], hls_segmenter.segment_seconds)
+    else:
+        count = None
+    if segment < 0 or (count is not None and segment >= count):
+        raise HTTPException(status_code=404, detail="Segment not found")
+    
+    try:
+        segment_path = await hls_segmenter.segment(file_path, stat_result, bitrate, segment)
+    except TranscodeUnavailable as e:
+        raise HTTPException(status_code=503, detail=f"Transcoding unavailable: {e}")
+    except hls.SegmentNotFound:
+        raise HTTPException(status_code=404, detail="Segment not found")
+    except RuntimeError:
+        # The segmenter has already logged the encoder's error
+        raise HTTPException(status_code=503, detail="Segment encoding failed")
+    
+    # Segment URLs carry the source version, so they never change underneath a client
+    return FileResponse(segment_path, media_type=hls.SEGMENT_MEDIA_TYPE,
+                        headers={"Cache-Control": "public, max-age=31536000, immutable"})
+
+
+@app.get("/tracks/{track_id}/waveform")
+async def get_track_waveform(request: Request, track_id: str,
+                             resolution: int = Query(BASE_RESOLUTION, ge=16, le=BASE_RESOLUTION),
+                             format: str = Query("json", pattern="^(json|binary)$")):
+    """
+    Waveform peaks of a track at the requested resolution
+    
+    binary returns resolution (min, max) int8 pairs; json returns min and max
+    arrays scaled to [-1, 1]. Tracks the background job hasn't reached yet
+    are computed on demand.
+    """
+    track = await db.aio.get_track_stream_info(track_id)
+    if not track:
+        raise HTTPException(status_code=404, detail="Track not found")
+    
+    stat_result = await stat_audio_file(Path(track["file_path"]))
+    if stat_result is None:
+        raise HTTPException(status_code=404, detail="Audio file not found")
+    
+    waveform = await db.aio.get_waveform(track_id)
+    if (not waveform or waveform["file_size"] != stat_result.st_size
+            or waveform["file_mtime_ns"] != stat_result.st_mtime_ns):
+        if not await waveform_generator.generate(track_id, track["file_path"]):
+            raise HTTPException(status_code=500, detail="Could not compute waveform")
+        waveform = await db.aio.get_waveform(track_id)
+    
+    etag = f'"{waveform["file_size"]:x}-{waveform["file_mtime_ns"]:x}-{resolution}-{format}"'
+    headers = {"ETag": etag, "Cache-Control": "public, max-age=86400"}
+    if is_not_modified(request, etag, waveform["file_mtime_ns"] / 1e9):
+        return Response(status_code=304, headers=headers)
+    
+    peaks = resample_peaks(peaks_from_blob(waveform["peaks"]), resolution)
+    if format == "binary":
+        headers["X-Waveform-Resolution"] = str(len(peaks))
+        return Response(peaks.tobytes(), media_type="application/octet-stream", headers=headers)
+    
+    scaled = (peaks / 127).round(4)
+    return Response(
+        json.dumps({"resolution": len(peaks), "min": scaled[:, 0].tolist(), "max": scaled[:, 1].tolist()}),
+        media_type="application/json",
+        headers=headers
     )
 
 
+@app.post("/tracks/prefetch")
+async def prefetch_tracks(request: dict):
+    """
+    Warm up the tracks a client will play next
+    
+    Body: {"ids": [...], "quality": "standard"|"enhanced", "codec": ..., "bitrate": ...}.
+    Audio files, covers and lyrics are read ahead in the background and any
+    transcode the given codec/bitrate needs is started.
+    """
+    track_ids = request.get("ids", [])
+    quality = request.get("quality", "standard")
+    codec = request.get("codec")
+    bitrate = request.get("bitrate")
+    
+    if not isinstance(track_ids, list) or not all(isinstance(tid, str) for tid in track_ids):
+        raise HTTPException(status_code=400, detail="ids must be a list of track ids")
+    if quality not in ("standard", "enhanced"):
+        raise HTTPException(status_code=400, detail="quality must be standard or enhanced")
+    if codec is not None and codec not in CODECS:
+        raise HTTPException(status_code=400, detail=f"codec must be one of {', '.join(CODECS)}")
+    if bitrate is not None and (not isinstance(bitrate, int) or not 32 <= bitrate <= 320):
+        raise HTTPException(status_code=400, detail="bitrate must be between 32 and 320")
+    
+    return {"scheduled": prefetcher.schedule(track_ids, quality, codec, bitrate)}
+
+
+async def cover_response(request: Request, path: Path, digest: str, fmt: str,
+                         vary: bool, immutable: bool) -> Response:
+    """Serve a rendered cover variant with a content-hash ETag"""
+    try:
+        stat_result = await asyncio.get_running_loop().run_in_executor(None, os.stat, path)
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail="Cover image not found")
+    
+    etag = f'"{digest[:16]}-{path.stem}-{fmt}"'
+    headers = {"ETag": etag}
+    if vary:
+        headers["Vary"] = "Accept"
+    if immutable:
+        headers["Cache-Control"] = "public, max-age=31536000, immutable"
+    else:
+        headers["Cache-Control"] = "public, no-cache"
+    
+    if is_not_modified(request, etag, stat_result.st_mtime):
+        return Response(status_code=304, headers=headers)
+    return FileResponse(path, media_type=COVER_FORMATS[fmt]["media_type"], headers=headers, stat_result=stat_result)
+
+
+async def serve_cover(request: Request, source: Path, size: Optional[int], format: Optional[str],
+                      version: Optional[str], indexed: Optional[Tuple[int, int]] = None) -> Response:
+    """
+    One size/format variant of a cover image file
+    
+    The format follows the Accept header unless given explicitly. URLs whose
+    v= matches the current content hash are cached as immutable. indexed is
+    the file's (size, mtime_ns) from folder_assets, which spares a stat.
+    """
+    fmt = pick_format(format, request.headers.get("accept", ""))
+    try:
+        path, digest = await cover_store.variant(source, pick_size(size), fmt, indexed)
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail="Cover image not found")
+    except OSError as e:
+        print(f"Could not render cover {source}: {e}")
+        raise HTTPException(status_code=500, detail="Cover image could not be decoded")
+    
+    return await cover_response(request, path, digest, fmt, format is None, version == digest[:12])
+
+
+async def serve_artwork(request: Request, digest: str, size: Optional[int], format: Optional[str],
+                        version: Optional[str]) -> Response:
+    """One size/format variant of artwork already in the cover store"""
+    fmt = pick_format(format, request.headers.get("accept", ""))
+    path = cover_store.variant_path(digest, pick_size(size), fmt)
+    return await cover_response(request, path, digest, fmt, format is None, version == digest[:12])
+
+
+@app.get("/artwork/{digest}")
+@app.head("/artwork/{digest}")
+async def get_artwork(request: Request, digest: str,
+                      size: Optional[int] = Query(None, ge=1, le=COVER_SIZES[-1]),
+                      format: Optional[str] = Query(None, pattern="^(jpeg|webp)$")):
+    """Artwork by content hash - the URLs in album images, cacheable forever"""
+    if not is_content_hash(digest):
+        raise HTTPException(status_code=404, detail="Cover image not found")
+    return await serve_artwork(request, digest, size, format, digest[:12])
+
+
 @app.get("/tracks/{track_id}/cover")
 @app.head("/tracks/{track_id}/cover")
 @app.options("/tracks/{track_id}/cover")
-async def get_track_cover(track_id: str):
-    """Get cover image for a track"""
-    track = db.get_track(track_id)
-    if not track or not track.get("file_path"):
+async def get_track_cover(request: Request, track_id: str,
+                          size: Optional[int] = Query(None, ge=1, le=COVER_SIZES[-1]),
+                          format: Optional[str] = Query(None, pattern="^(jpeg|webp)$"),
+                          v: Optional[str] = None):
+    """Get cover image for a track, from its folder's cover.jpg or the embedded album art"""
+    track = await db.aio.get_track_cover_info(track_id)
+    if not track:
         raise HTTPException(status_code=404, detail="Track not found")
     
-    file_path = Path(track["file_path"])
-    cover_file = file_path.parent / "cover.jpg"
-    
-    if not cover_file.exists():
-        # Fallback to album art from database
-        if track.get("image_path"):
-            return FileResponse(f".{track['image_path']}")
-        raise HTTPException(status_code=404, detail="Cover image not found")
+    if track["folder_cover_size"] is not None:
+        return await serve_cover(request, Path(track["file_path"]).parent / "cover.jpg", size, format, v,
+                                 indexed=(track["folder_cover_size"], track["folder_cover_mtime_ns"]))
     
-    return FileResponse(cover_file, media_type="image/jpeg")
+    # Fallback to album art extracted by the scanner
+    digest = track["cover_hash"] or track["album_cover_hash"]
+    if digest:
+        return await serve_artwork(request, digest, size, format, v)
+    # Libraries scanned before covers were content-addressed
+    return await serve_cover(request, COVER_FOLDER / f"{track['album_id']}.jpg", size, format, v)
+
+
+@app.get("/albums/{album_id}/cover")
+@app.head("/albums/{album_id}/cover")
+async def get_album_cover(request: Request, album_id: str,
+                          size: Optional[int] = Query(None, ge=1, le=COVER_SIZES[-1]),
+                          format: Optional[str] = Query(None, pattern="^(jpeg|webp)$"),
+                          v: Optional[str] = None):
+    """Get album art at a given size"""
+    digest = await db.aio.get_album_cover_hash(album_id)
+    if digest:
+        return await serve_artwork(request, digest, size, format, v)
+    return await serve_cover(request, COVER_FOLDER / f"{album_id}.jpg", size, format, v)
 
 
 @app.get("/tracks/{track_id}/animated-cover")
@@ -205,22 +542,14 @@ async def get_track_cover(track_id: str):
 @app.options("/tracks/{track_id}/animated-cover")
 async def get_track_animated_cover(track_id: str):
     """Get animated cover (MP4 video) for track - supports canvas.mp4 or animated_cover.mp4"""
-    track = db.get_track(track_id)
-    if not track or not track.get("file_path"):
+    assets = await db.aio.get_track_assets(track_id)
+    if assets is None:
         raise HTTPException(status_code=404, detail="Track not found")
     
-    file_path = Path(track["file_path"])
-    folder = file_path.parent
-    
-    # Check for canvas.mp4 first (preferred naming)
-    canvas_file = folder / "canvas.mp4"
-    if canvas_file.exists():
-        return FileResponse(canvas_file, media_type="video/mp4")
-    
-    # Fallback to animated_cover.mp4 (legacy naming)
-    animated_cover = folder / "animated_cover.mp4"
-    if animated_cover.exists():
-        return FileResponse(animated_cover, media_type="video/mp4")
+    # canvas.mp4 is the preferred naming, animated_cover.mp4 the legacy one
+    for name in ("canvas.mp4", "animated_cover.mp4"):
+        if name in assets:
+            return FileResponse(assets[name]["path"], media_type="video/mp4")
     
     raise HTTPException(status_code=404, detail="Canvas video not found (looking for canvas.mp4 or animated_cover.mp4)")
 
@@ -228,7 +557,7 @@ async def get_track_animated_cover(track_id: str):
 @app.get("/tracks/{track_id}/lyrics")
 async def get_track_lyrics(track_id: str):
     """Get lyrics for a track - returns plain text LRC format"""
-    track = db.get_track(track_id)
+    track = await db.aio.get_track(track_id)
     if not track:
         raise HTTPException(status_code=404, detail="Track not found")
     
@@ -250,7 +579,7 @@ async def get_track_lyrics(track_id: str):
 @app.head("/tracks/{track_id}/lyrics")
 async def check_track_lyrics(track_id: str):
     """Check if lyrics exist for a track without downloading content"""
-    track = db.get_track(track_id)
+    track = await db.aio.get_track(track_id)
     if not track or not track.get("lyrics"):
         raise HTTPException(status_code=404, detail="Lyrics not available")
     return Response(status_code=200)
@@ -261,18 +590,14 @@ async def update_track_lyrics(track_id: str, request: dict):
     """Update lyrics for a track - updates both database and filesystem"""
     from pathlib import Path
     
-    track = db.get_track(track_id)
+    track = await db.aio.get_track(track_id)
     if not track:
         raise HTTPException(status_code=404, detail="Track not found")
     
     lyrics = request.get("lyrics", "")
     
     # Update database
-    cursor = db.conn.cursor()
-    cursor.execute("UPDATE tracks SET lyrics = ? WHERE id = ?", (lyrics, track_id))
-    db.conn.commit()
-    
-    if cursor.rowcount == 0:
+    if not await db.aio.update_track_lyrics(track_id, lyrics):
         raise HTTPException(status_code=404, detail="Track not found")
     
     # Also write to filesystem for consistency
@@ -307,10 +632,9 @@ async def enhance_track(
     - custom: User-definable preset
     """
     from pathlib import Path
-    from datetime import datetime
     
     # Get track info
-    track = db.get_track(track_id)
+    track = await db.aio.get_track(track_id)
     if not track:
         raise HTTPException(status_code=404, detail="Track not found")
     
@@ -319,15 +643,10 @@ async def enhance_track(
         raise HTTPException(status_code=404, detail="Audio file not found")
     
     # Check if already enhanced with this preset
-    cursor = db.conn.cursor()
-    cursor.execute(
-        "SELECT enhanced_file_path, enhancement_preset FROM tracks WHERE id = ?",
-        (track_id,)
-    )
-    row = cursor.fetchone()
+    enhanced = await db.aio.get_enhanced_version(track_id)
     
-    if row and row[0] and row[1] == preset:
-        enhanced_path = Path(row[0])
+    if enhanced and enhanced["enhanced_file_path"] and enhanced["enhancement_preset"] == preset:
+        enhanced_path = Path(enhanced["enhanced_file_path"])
         if enhanced_path.exists():
             return {
                 "message": "Track already enhanced with this preset",
@@ -353,15 +672,7 @@ async def enhance_track(
         raise HTTPException(status_code=500, detail="Audio enhancement failed")
     
     # Update database
-    cursor.execute("""
-        UPDATE tracks 
-        SET has_enhanced_version = 1,
-            enhanced_file_path = ?,
-            enhanced_at = ?,
-            enhancement_preset = ?
-        WHERE id = ?
-    """, (str(enhanced_filepath), datetime.now(), preset, track_id))
-    db.conn.commit()
+    await db.aio.set_enhanced_version(track_id, str(enhanced_filepath), preset)
     
     return {
         "message": "Track enhanced successfully",
@@ -377,14 +688,12 @@ async def delete_enhanced_version(track_id: str):
     """Remove enhanced version of a track"""
     from pathlib import Path
     
-    cursor = db.conn.cursor()
-    cursor.execute("SELECT enhanced_file_path FROM tracks WHERE id = ?", (track_id,))
-    row = cursor.fetchone()
+    enhanced = await db.aio.get_enhanced_version(track_id)
     
-    if not row or not row[0]:
+    if not enhanced or not enhanced["enhanced_file_path"]:
         raise HTTPException(status_code=404, detail="No enhanced version found")
     
-    enhanced_path = Path(row[0])
+    enhanced_path = Path(enhanced["enhanced_file_path"])
     
     # Delete enhanced file
     try:
@@ -394,15 +703,7 @@ async def delete_enhanced_version(track_id: str):
         print(f"Error deleting enhanced file: {e}")
     
     # Update database
-    cursor.execute("""
-        UPDATE tracks 
-        SET has_enhanced_version = 0,
-            enhanced_file_path = NULL,
-            enhanced_at = NULL,
-            enhancement_preset = NULL
-        WHERE id = ?
-    """, (track_id,))
-    db.conn.commit()
+    await db.aio.clear_enhanced_version(track_id)
     
     return {"message": "Enhanced version deleted"}
 
@@ -412,16 +713,11 @@ async def get_track_versions(track_id: str):
     """Get available versions (original and enhanced) of a track"""
     from pathlib import Path
     
-    track = db.get_track(track_id)
+    track = await db.aio.get_track(track_id)
     if not track:
         raise HTTPException(status_code=404, detail="Track not found")
     
-    cursor = db.conn.cursor()
-    cursor.execute("""
-        SELECT has_enhanced_version, enhanced_file_path, enhanced_at, enhancement_preset
-        FROM tracks WHERE id = ?
-    """, (track_id,))
-    row = cursor.fetchone()
+    enhanced = await db.aio.get_enhanced_version(track_id)
     
     versions = {
         "original": {
@@ -430,46 +726,33 @@ async def get_track_versions(track_id: str):
         }
     }
     
-    if row and row[0] and row[1]:
-        enhanced_path = Path(row[1])
+    if enhanced and enhanced["has_enhanced_version"] and enhanced["enhanced_file_path"]:
+        enhanced_path = Path(enhanced["enhanced_file_path"])
         versions["enhanced"] = {
             "file_path": str(enhanced_path),
             "exists": enhanced_path.exists(),
-            "preset": row[3],
-            "created_at": row[2]
+            "preset": enhanced["enhancement_preset"],
+            "created_at": enhanced["enhanced_at"]
         }
     
     return versions
 
 
 @app.get("/tracks/{track_id}/stream/enhanced")
-async def stream_enhanced_track(track_id: str):
+@app.head("/tracks/{track_id}/stream/enhanced")
+async def stream_enhanced_track(request: Request, track_id: str):
     """Stream enhanced version of a track"""
-    from pathlib import Path
-    
-    cursor = db.conn.cursor()
-    cursor.execute("SELECT enhanced_file_path FROM tracks WHERE id = ?", (track_id,))
-    row = cursor.fetchone()
+    track = await db.aio.get_track_stream_info(track_id)
     
-    if not row or not row[0]:
+    if not track or not track["enhanced_file_path"]:
         raise HTTPException(status_code=404, detail="No enhanced version found")
     
-    enhanced_path = Path(row[0])
-    if not enhanced_path.exists():
+    enhanced_path = Path(track["enhanced_file_path"])
+    stat_result = await stat_audio_file(enhanced_path)
+    if not stat_result:
         raise HTTPException(status_code=404, detail="Enhanced audio file not found")
     
-    safe_filename = enhanced_path.name.encode('ascii', 'ignore').decode('ascii')
-    if not safe_filename:
-        safe_filename = "audio_enhanced" + enhanced_path.suffix
-    
-    return FileResponse(
-        enhanced_path,
-        media_type="audio/mpeg",
-        headers={
-            "Accept-Ranges": "bytes",
-            "Content-Disposition": f'inline; filename="{safe_filename}"'
-        }
-    )
+    return stream_file(request, enhanced_path, stat_result, cache=stream_cache)
 
 
 @app.post("/enhance-batch")
@@ -506,19 +789,24 @@ async def enhance_tracks_batch(
 # ==================== ALBUMS ====================
 @app.get("/albums", response_model=List[AlbumResponse])
 async def get_albums(
+    response: Response,
     limit: int = Query(50, ge=1, le=200),
     offset: int = Query(0, ge=0),
-    search: Optional[str] = None
+    search: Optional[str] = None,
+    cursor: Optional[str] = None
 ):
-    """Get all albums with pagination"""
-    albums = db.get_albums(limit=limit, offset=offset, search=search)
+    """Get all albums with offset or cursor (X-Next-Cursor) pagination"""
+    if cursor is not None:
+        return await paginate(response, db.aio.get_albums_page, limit=limit, cursor=cursor, search=search)
+    
+    albums = await db.aio.get_albums(limit=limit, offset=offset, search=search)
     return albums
 
 
 @app.get("/albums/{album_id}", response_model=AlbumResponse)
 async def get_album(album_id: str):
     """Get specific album with tracks"""
-    album = db.get_album(album_id)
+    album = await db.aio.get_album(album_id)
     if not album:
         raise HTTPException(status_code=404, detail="Album not found")
     return album
@@ -527,26 +815,31 @@ async def get_album(album_id: str):
 @app.get("/albums/{album_id}/tracks", response_model=List[TrackResponse])
 async def get_album_tracks(album_id: str):
     """Get all tracks from an album"""
-    tracks = db.get_album_tracks(album_id)
+    tracks = await db.aio.get_album_tracks(album_id)
     return tracks
 
 
 # ==================== ARTISTS ====================
 @app.get("/artists", response_model=List[ArtistResponse])
 async def get_artists(
+    response: Response,
     limit: int = Query(50, ge=1, le=200),
     offset: int = Query(0, ge=0),
-    search: Optional[str] = None
+    search: Optional[str] = None,
+    cursor: Optional[str] = None
 ):
-    """Get all artists with pagination"""
-    artists = db.get_artists(limit=limit, offset=offset, search=search)
+    """Get all artists with offset or cursor (X-Next-Cursor) pagination"""
+    if cursor is not None:
+        return await paginate(response, db.aio.get_artists_page, limit=limit, cursor=cursor, search=search)
+    
+    artists = await db.aio.get_artists(limit=limit, offset=offset, search=search)
     return artists
 
 
 @app.get("/artists/{artist_id}", response_model=ArtistResponse)
 async def get_artist(artist_id: str):
     """Get specific artist details"""
-    artist = db.get_artist(artist_id)
+    artist = await db.aio.get_artist(artist_id)
     if not artist:
         raise HTTPException(status_code=404, detail="Artist not found")
     return artist
@@ -555,22 +848,29 @@ async def get_artist(artist_id: str):
 @app.get("/artists/{artist_id}/albums", response_model=List[AlbumResponse])
 async def get_artist_albums(artist_id: str):
     """Get all albums by an artist"""
-    albums = db.get_artist_albums(artist_id)
+    albums = await db.aio.get_artist_albums(artist_id)
     return albums
 
 
 @app.get("/artists/{artist_id}/tracks", response_model=List[TrackResponse])
 async def get_artist_tracks(artist_id: str, limit: int = 10):
     """Get top tracks by an artist"""
-    tracks = db.get_artist_tracks(artist_id, limit=limit)
+    tracks = await db.aio.get_artist_tracks(artist_id, limit=limit)
     return tracks
 
 
 # ==================== PLAYLISTS ====================
 @app.get("/playlists", response_model=List[PlaylistResponse])
-async def get_playlists():
-    """Get all playlists"""
-    playlists = db.get_playlists()
+async def get_playlists(
+    response: Response,
+    limit: int = Query(50, ge=1, le=200),
+    cursor: Optional[str] = None
+):
+    """Get all playlists, or one page of them when a cursor (X-Next-Cursor) is given"""
+    if cursor is not None:
+        return await paginate(response, db.aio.get_playlists_page, limit=limit, cursor=cursor)
+    
+    playlists = await db.aio.get_playlists()
     return playlists
 
 
@@ -578,7 +878,7 @@ async def get_playlists():
 async def get_playlist(playlist_id: str):
     """Get specific playlist with tracks"""
     try:
-        playlist = db.get_playlist(playlist_id)
+        playlist = await db.aio.get_playlist(playlist_id)
         if not playlist:
             raise HTTPException(status_code=404, detail="Playlist not found")
         return playlist
@@ -593,7 +893,7 @@ async def get_playlist(playlist_id: str):
 @app.post("/playlists", response_model=PlaylistResponse)
 async def create_playlist(name: str, description: Optional[str] = None):
     """Create a new playlist"""
-    playlist = db.create_playlist(name, description)
+    playlist = await db.aio.create_playlist(name, description)
     return playlist
 
 
@@ -604,7 +904,7 @@ async def update_playlist(
     description: Optional[str] = None
 ):
     """Update playlist details"""
-    success = db.update_playlist(playlist_id, name, description)
+    success = await db.aio.update_playlist(playlist_id, name, description)
     if not success:
         raise HTTPException(status_code=404, detail="Playlist not found")
     return {"message": "Playlist updated successfully"}
@@ -613,7 +913,7 @@ async def update_playlist(
 @app.delete("/playlists/{playlist_id}")
 async def delete_playlist(playlist_id: str):
     """Delete a playlist"""
-    success = db.delete_playlist(playlist_id)
+    success = await db.aio.delete_playlist(playlist_id)
     if not success:
         raise HTTPException(status_code=404, detail="Playlist not found")
     return {"message": "Playlist deleted successfully"}
@@ -622,7 +922,7 @@ async def delete_playlist(playlist_id: str):
 @app.post("/playlists/{playlist_id}/tracks")
 async def add_track_to_playlist(playlist_id: str, track_id: str):
     """Add a track to playlist"""
-    success = db.add_track_to_playlist(playlist_id, track_id)
+    success = await db.aio.add_track_to_playlist(playlist_id, track_id)
     if not success:
         raise HTTPException(status_code=404, detail="Playlist or track not found")
     return {"message": "Track added to playlist"}
@@ -631,7 +931,7 @@ async def add_track_to_playlist(playlist_id: str, track_id: str):
 @app.delete("/playlists/{playlist_id}/tracks/{track_id}")
 async def remove_track_from_playlist(playlist_id: str, track_id: str):
     """Remove a track from playlist"""
-    success = db.remove_track_from_playlist(playlist_id, track_id)
+    success = await db.aio.remove_track_from_playlist(playlist_id, track_id)
     if not success:
         raise HTTPException(status_code=404, detail="Playlist or track not found")
     return {"message": "Track removed from playlist"}
@@ -644,26 +944,21 @@ async def search_all(q: str, limit: int = 20):
     if not q or len(q) < 2:
         raise HTTPException(status_code=400, detail="Search query too short")
     
-    results = {
-        "tracks": db.get_tracks(limit=limit, search=q),
-        "albums": db.get_albums(limit=limit, search=q),
-        "artists": db.get_artists(limit=limit, search=q),
-    }
-    return results
+    return await db.aio.search_all(q, limit=limit)
 
 
 # ==================== LIBRARY ====================
 @app.get("/library/tracks", response_model=List[TrackResponse])
 async def get_saved_tracks():
     """Get user's saved/liked tracks"""
-    tracks = db.get_saved_tracks()
+    tracks = await db.aio.get_saved_tracks()
     return tracks
 
 
 @app.put("/library/tracks/{track_id}")
 async def save_track(track_id: str):
     """Save/like a track"""
-    success = db.save_track(track_id)
+    success = await db.aio.save_track(track_id)
     if not success:
         raise HTTPException(status_code=404, detail="Track not found")
     return {"message": "Track saved"}
@@ -675,7 +970,7 @@ async def save_tracks_bulk(request: dict):
     try:
         ids = request.get("ids", [])
         for track_id in ids:
-            db.save_track(track_id)
+            await db.aio.save_track(track_id)
         return {"message": "Tracks saved"}
     except Exception as e:
         print(f"Error saving tracks: {e}")
@@ -688,7 +983,7 @@ async def delete_tracks_bulk(request: dict):
     try:
         ids = request.get("ids", [])
         for track_id in ids:
-            db.unsave_track(track_id)
+            await db.aio.unsave_track(track_id)
         return {"message": "Tracks removed"}
     except Exception as e:
         print(f"Error removing tracks: {e}")
@@ -698,7 +993,7 @@ async def delete_tracks_bulk(request: dict):
 @app.delete("/library/tracks/{track_id}")
 async def unsave_track(track_id: str):
     """Remove track from saved"""
-    success = db.unsave_track(track_id)
+    success = await db.aio.unsave_track(track_id)
     if not success:
         raise HTTPException(status_code=404, detail="Track not found")
     return {"message": "Track removed from library"}
@@ -707,14 +1002,14 @@ async def unsave_track(track_id: str):
 @app.get("/library/albums", response_model=List[AlbumResponse])
 async def get_saved_albums():
     """Get user's saved albums"""
-    albums = db.get_saved_albums()
+    albums = await db.aio.get_saved_albums()
     return albums
 
 
 @app.put("/library/albums/{album_id}")
 async def save_album(album_id: str):
     """Save an album to library"""
-    success = db.save_album(album_id)
+    success = await db.aio.save_album(album_id)
     if not success:
         raise HTTPException(status_code=404, detail="Album not found")
     return {"message": "Album saved"}
@@ -723,7 +1018,7 @@ async def save_album(album_id: str):
 @app.delete("/library/albums/{album_id}")
 async def unsave_album(album_id: str):
     """Remove album from library"""
-    success = db.unsave_album(album_id)
+    success = await db.aio.unsave_album(album_id)
     if not success:
         raise HTTPException(status_code=404, detail="Album not found")
     return {"message": "Album removed from library"}
@@ -735,7 +1030,7 @@ async def save_albums_bulk(request: dict):
     try:
         ids = request.get("ids", [])
         for album_id in ids:
-            db.save_album(album_id)
+            await db.aio.save_album(album_id)
         return {"message": "Albums saved"}
     except Exception as e:
         print(f"Error saving albums: {e}")
@@ -748,7 +1043,7 @@ async def delete_albums_bulk(request: dict):
     try:
         ids = request.get("ids", [])
         for album_id in ids:
-            db.unsave_album(album_id)
+            await db.aio.unsave_album(album_id)
         return {"message": "Albums removed"}
     except Exception as e:
         print(f"Error removing albums: {e}")
@@ -763,7 +1058,7 @@ async def get_recommendations(
     limit: int = 20
 ):
     """Get song recommendations based on seed track or artist"""
-    recommendations = db.get_recommendations(
+    recommendations = await db.aio.get_recommendations(
         track_id=seed_track,
         artist_id=seed_artist,
         limit=limit
@@ -773,16 +1068,80 @@ async def get_recommendations(
 
 # ==================== ADMIN ====================
 @app.post("/admin/rescan")
-async def rescan_library():
-    """Manually trigger library rescan"""
-    await scanner.scan_folder(MUSIC_FOLDER)
-    return {"message": "Library rescan complete"}
+async def rescan_library(wait: bool = False):
+    """Start a library rescan in the background, or join the one already running"""
+    already_running = scanner.get_scan_status()["state"] == "running"
+    scan_task = scanner.start_background_scan(MUSIC_FOLDER)
+    
+    if wait:
+        # Shield so a client disconnect does not cancel the shared scan
+        await asyncio.shield(scan_task)
+        return {"message": "Library rescan complete", "status": scanner.get_scan_status()}
+    
+    return {
+        "message": "Library rescan already running" if already_running else "Library rescan started",
+        "status": scanner.get_scan_status()
+    }
+
+
+@app.get("/admin/scan/status")
+async def get_scan_status():
+    """Get progress of the current or last library scan, and of the live watcher"""
+    status = scanner.get_scan_status()
+    status["watcher"] = library_watcher.get_status() if library_watcher else None
+    return status
+
+
+@app.post("/admin/waveforms")
+async def generate_waveforms():
+    """Compute waveforms for tracks that lack one, or join the job already running"""
+    waveform_generator.start_background_job()
+    return waveform_generator.status
+
+
+@app.get("/admin/duplicates")
+async def get_duplicate_tracks():
+    """Groups of tracks holding the same recording by acoustic fingerprint, whatever their tags or names"""
+    groups = await fingerprint_index.duplicate_groups()
+    tracks = {track["id"]: track for track in
+              await db.aio.get_tracks_by_ids([track_id for group in groups for track_id in group])}
+    return {
+        "groups": [[tracks[track_id] for track_id in group if track_id in tracks] for group in groups],
+        "fingerprints": fingerprint_index.status
+    }
+
+
+async def find_recording(file_path: str) -> Optional[Dict]:
+    """
+    The library track an audio file is a copy of, if any (None when the file can't be fingerprinted)
+    
+    The file's own track is never a match - the watcher may have indexed and
+    fingerprinted a download before this runs.
+    """
+    try:
+        matches = await fingerprint_index.find_matches(file_path, exclude=library_track_id(file_path))
+    except Exception as e:
+        print(f"Could not fingerprint {file_path}: {e}")
+        return None
+    return matches[0] if matches else None
+
+
+@app.get("/admin/stream-cache")
+async def get_stream_cache_stats():
+    """Hit/miss statistics of the in-memory hot file cache"""
+    return stream_cache.get_stats()
+
+
+@app.post("/admin/reconcile")
+async def reconcile_library_counts(repair: bool = False):
+    """Verify album/artist track counters against the tracks table; repair=true fixes drift"""
+    return await db.aio.reconcile_counts(repair=repair)
 
 
 @app.get("/admin/stats")
 async def get_library_stats():
     """Get library statistics"""
-    stats = db.get_stats()
+    stats = await db.aio.get_stats()
     return stats
 
 
@@ -811,7 +1170,7 @@ async def download_youtube_audio(
     
     # Check for duplicates in database
     duration_ms = info.get('duration', 0) * 1000 if info.get('duration') else None
-    existing_track = db.check_duplicate_track(
+    existing_track = await db.aio.check_duplicate_track(
         title=info.get('title', ''),
         artist=info.get('artist', ''),
         duration_ms=duration_ms
@@ -832,31 +1191,44 @@ async def download_youtube_audio(
     if not filepath:
         raise HTTPException(status_code=500, detail="Download failed")
     
-    # Scan the new file into database with metadata
-    from pathlib import Path
-    import hashlib
+    # The same recording may already be in the library under another title
+    match = await find_recording(filepath)
+    if match:
+        Path(filepath).unlink(missing_ok=True)
+        return {
+            "message": "Song already exists in library (same recording)",
+            "title": info['title'],
+            "artist": info['artist'],
+            "duplicate": True,
+            "track_id": match["track_id"]
+        }
     
-    file_path_obj = Path(filepath)
-    track_id = hashlib.md5(str(file_path_obj).encode()).hexdigest()[:16]
+    # Scan the new file into database with metadata
+    file_path_obj = library_path(filepath)
+    track_id = library_track_id(filepath)
     artist_id = hashlib.md5(info['artist'].encode()).hexdigest()[:16]
     album_id = hashlib.md5(f"{info['artist']}-YouTube Downloads".encode()).hexdigest()[:16]
     
     # Add track with enhanced metadata
-    db.add_track(
-        track_id=track_id,
-        title=info['title'],
-        artist=info['artist'],
-        artist_id=artist_id,
-        album="YouTube Downloads",
-        album_id=album_id,
-        duration_ms=duration_ms or 0,
-        track_number=None,
-        year=None,
-        genre="YouTube",
-        file_path=str(file_path_obj),
-        image_path=None,
-        lyrics=info.get('lyrics')
-    )
+    written = await db.aio.add_tracks([{
+        "track_id": track_id,
+        "title": info['title'],
+        "artist": info['artist'],
+        "artist_id": artist_id,
+        "album": "YouTube Downloads",
+        "album_id": album_id,
+        "duration_ms": duration_ms or 0,
+        "track_number": None,
+        "year": None,
+        "genre": "YouTube",
+        "file_path": str(file_path_obj),
+        "image_path": None,
+        "lyrics": info.get('lyrics')
+    }])
+    if not written:
+        raise HTTPException(status_code=500, detail="Could not add the downloaded track to the library")
+    await db.aio.update_file_manifest([scanner.manifest_entry(file_path_obj)])
+    await fingerprint_index.index_track(track_id, str(file_path_obj))
     
     # Save lyrics to lyrics.lrc file if available
     if info.get('lyrics'):
@@ -892,15 +1264,24 @@ async def download_youtube_playlist(
     if not filepaths:
         raise HTTPException(status_code=500, detail="Playlist download failed")
     
-    # Scan all new files
+    # Drop recordings the library already has, then scan the rest in a single batch
     from pathlib import Path
+    new_files, duplicates = [], []
     for filepath in filepaths:
-        await scanner.process_file(Path(filepath))
+        match = await find_recording(filepath)
+        if match:
+            Path(filepath).unlink(missing_ok=True)
+            duplicates.append({"file": filepath, "track_id": match["track_id"]})
+        else:
+            new_files.append(filepath)
+    await scanner.process_files([library_path(filepath) for filepath in new_files])
+    fingerprint_index.start_background_job()
     
     return {
         "message": "Playlist download complete",
-        "downloaded": len(filepaths),
-        "files": filepaths
+        "downloaded": len(new_files),
+        "files": new_files,
+        "duplicates": duplicates
     }
 
 
@@ -909,7 +1290,7 @@ async def download_youtube_playlist(
 async def get_featured_playlists(limit: int = 10, locale: str = None):
     """Mock endpoint - returns user playlists"""
     try:
-        playlists = db.get_playlists()
+        playlists = await db.aio.get_playlists()
         return {"playlists": {"items": playlists[:limit]}}
     except Exception as e:
         print(f"Error in featured-playlists: {e}")
@@ -920,7 +1301,7 @@ async def get_featured_playlists(limit: int = 10, locale: str = None):
 async def get_top_tracks(limit: int = 8, timeRange: str = "short_term"):
     """Mock endpoint - returns tracks from library"""
     try:
-        tracks = db.get_tracks(limit=limit)
+        tracks = await db.aio.get_tracks(limit=limit)
         return {"items": tracks}
     except Exception as e:
         print(f"Error in top tracks: {e}")
@@ -931,7 +1312,7 @@ async def get_top_tracks(limit: int = 8, timeRange: str = "short_term"):
 async def get_top_artists(limit: int = 8, timeRange: str = "short_term"):
     """Mock endpoint - returns artists from library"""
     try:
-        artists = db.get_artists(limit=limit)
+        artists = await db.aio.get_artists(limit=limit)
         return {"items": artists}
     except Exception as e:
         print(f"Error in top artists: {e}")
@@ -942,7 +1323,7 @@ async def get_top_artists(limit: int = 8, timeRange: str = "short_term"):
 async def get_category_playlists(category_id: str, limit: int = 10):
     """Mock endpoint - returns playlists"""
     try:
-        playlists = db.get_playlists()
+        playlists = await db.aio.get_playlists()
         return {"playlists": {"items": playlists[:limit]}}
     except Exception as e:
         print(f"Error in category playlists: {e}")
@@ -953,7 +1334,7 @@ async def get_category_playlists(category_id: str, limit: int = 10):
 async def get_new_releases(limit: int = 10):
     """Mock endpoint - returns recent albums"""
     try:
-        albums = db.get_albums(limit=limit)
+        albums = await db.aio.get_albums(limit=limit)
         return {"albums": {"items": albums}}
     except Exception as e:
         print(f"Error in new releases: {e}")
@@ -982,7 +1363,7 @@ async def get_following(type: str = "artist", limit: int = 20):
     """Mock endpoint - returns followed artists"""
     try:
         if type == "artist":
-            artists = db.get_artists(limit=limit)
+            artists = await db.aio.get_artists(limit=limit)
             return {"artists": {"items": artists, "total": len(artists)}}
         return {"artists": {"items": [], "total": 0}}
     except Exception as e:
@@ -1003,7 +1384,7 @@ async def get_queue():
 async def get_my_albums(limit: int = 50):
     """Get user's saved albums"""
     try:
-        albums = db.get_saved_albums()
+        albums = await db.aio.get_saved_albums()
         return {"items": [{"album": album} for album in albums[:limit]]}
     except Exception as e:
         print(f"Error in my albums: {e}")
@@ -1014,7 +1395,7 @@ async def get_my_albums(limit: int = 50):
 async def get_my_playlists(limit: int = 50):
     """Get user's playlists"""
     try:
-        playlists = db.get_playlists()
+        playlists = await db.aio.get_playlists()
         return {"items": playlists[:limit]}
     except Exception as e:
         print(f"Error in my playlists: {e}")
@@ -1025,7 +1406,7 @@ async def get_my_playlists(limit: int = 50):
 async def get_my_tracks(limit: int = 50):
     """Get user's saved tracks"""
     try:
-        tracks = db.get_saved_tracks()
+        tracks = await db.aio.get_saved_tracks()
         return {"items": [{"track": track} for track in tracks[:limit]]}
     except Exception as e:
         print(f"Error in my tracks: {e}")
@@ -1040,7 +1421,7 @@ async def check_saved_tracks(ids: str):
         # Check each track in database
         results = []
         for track_id in track_ids:
-            track = db.get_track(track_id)
+            track = await db.aio.get_track(track_id)
             results.append(track.get('is_saved', False) if track else False)
         return results
     except Exception as e:
@@ -1049,10 +1430,18 @@ async def check_saved_tracks(ids: str):
 
 
 @app.get("/playlists/{playlist_id}/tracks")
-async def get_playlist_tracks_alt(playlist_id: str, limit: int = 50):
-    """Alternative endpoint for playlist tracks"""
+async def get_playlist_tracks_alt(playlist_id: str, limit: int = Query(50, ge=1, le=200),
+                                  cursor: Optional[str] = None):
+    """Alternative endpoint for playlist tracks - pass cursor to page through them"""
+    if cursor is not None:
+        try:
+            items, next_cursor = await db.aio.get_playlist_tracks_page(playlist_id, limit=limit, cursor=cursor)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        return {"items": items, "limit": limit, "next": next_cursor}
+    
     try:
-        playlist = db.get_playlist(playlist_id)
+        playlist = await db.aio.get_playlist(playlist_id)
         if not playlist:
             raise HTTPException(status_code=404, detail="Playlist not found")
         return playlist.get("tracks", {"items": []})
@@ -1129,7 +1518,7 @@ async def get_user(user_id: str):
 async def get_user_playlists(user_id: str, limit: int = 10):
     """Get user's playlists"""
     try:
-        playlists = db.get_playlists()
+        playlists = await db.aio.get_playlists()
         return {"items": playlists[:limit]}
     except Exception as e:
         print(f"Error getting user playlists: {e}")
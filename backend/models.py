@@ -36,6 +36,8 @@ class TrackResponse(BaseModel):
     enhancement_preset: Optional[str] = None
     has_lyrics: bool = False  # NEW: Indicates if lyrics are available
     lyrics: Optional[str] = None  # NEW: Actual lyrics content (if fetched)
+    cover_url: Optional[str] = None  # Folder cover.jpg, on track detail responses
+    animated_cover_url: Optional[str] = None  # canvas.mp4 / animated_cover.mp4, on track detail responses
 
 
 class Album(BaseModel):
@@ -56,6 +58,8 @@ class AlbumResponse(BaseModel):
     release_date: Optional[str] = None
     total_tracks: int
     images: List[dict]  # [{"url": "...", "height": 640, "width": 640}]
+    dominant_color: Optional[str] = None  # Hex colour, e.g. "#c81e1e"
+    palette: Optional[List[str]] = None  # Cover colours, dominant first
     tracks: Optional[List[TrackResponse]] = None
     is_saved: bool = False
 
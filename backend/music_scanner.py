@@ -1,165 +1,724 @@
 import os
+import time
+import asyncio
 import hashlib
+import multiprocessing
+import re
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
-from typing import List, Optional
+from typing import Dict, Iterable, List, Optional, get_args
+import base64
 from mutagen import File as MutagenFile
-from mutagen.id3 import ID3, APIC
-from mutagen.mp3 import MP3
-from mutagen.flac import FLAC
-from mutagen.mp4 import MP4
-from PIL import Image
-import io
+from mutagen.id3 import ID3
+from mutagen.flac import Picture
+from mutagen.mp4 import MP4Tags
+from audio_enhancer import EnhancementPreset
+from covers import CoverStore, content_hash
+
+
+# ID3 frames and MP4 atoms for the tags read by the scanner (Vorbis comments use the names as-is)
+ID3_FRAMES = {"title": "TIT2", "artist": "TPE1", "album": "TALB", "genre": "TCON", "date": "TDRC", "tracknumber": "TRCK"}
+MP4_ATOMS = {"title": "\xa9nam", "artist": "\xa9ART", "album": "\xa9alb", "genre": "\xa9gen", "date": "\xa9day"}
+
+# Files kept next to a folder's tracks (lyrics, folder artwork, looping canvases)
+SIDECAR_FILES = ("lyrics.lrc", "cover.jpg", "canvas.mp4", "animated_cover.mp4")
+
+# "<stem>_enhanced.<ext>" and "<stem>_enhanced_<preset>.<ext>" belong to the track "<stem>.<ext>"
+ENHANCED_STEM = re.compile(r"^(.+)_enhanced(?:_(?:%s))?$" % "|".join(get_args(EnhancementPreset)))
+
+# Scanner instance owned by each process pool worker (see _init_worker)
+_worker_scanner = None
+
+
+def _init_worker(cover_folder: str):
+    """Process pool initializer - builds a database-less scanner for metadata extraction"""
+    global _worker_scanner
+    _worker_scanner = MusicScanner(None, cover_folder=cover_folder, workers=1)
+
+
+def _extract_in_worker(file_path: str, has_lyrics: Optional[bool]) -> Optional[Dict]:
+    """Process pool entry point - parse tags and cover art for a single file"""
+    return _worker_scanner.extract_metadata(Path(file_path), has_lyrics)
 
 
 class MusicScanner:
     """Scans folders for music files and extracts metadata"""
     
     SUPPORTED_FORMATS = {'.mp3', '.flac', '.m4a', '.ogg', '.wav'}
+    WRITE_BATCH_SIZE = 200
+    # Smaller batches (watcher changes, downloads) are parsed in-process rather than
+    # paying for worker start-up - more than this many files per worker use the pool
+    POOL_FILES_PER_WORKER = 4
     
-    def __init__(self, database):
+    def __init__(self, database, cover_folder: str = "./covers", workers: Optional[int] = None):
         self.db = database
-        self.cover_folder = Path("./covers")
+        self.cover_folder = Path(cover_folder)
         self.cover_folder.mkdir(exist_ok=True)
+        self.cover_store = CoverStore(cover_folder)
+        # Cover hashes already rendered by this scanner (or process pool worker)
+        self._seen_covers = set()
+        
+        # Number of processes used for metadata extraction (1 = scan in-process)
+        if workers is None:
+            workers = int(os.getenv("SCAN_WORKERS", "0")) or os.cpu_count() or 1
+        self.workers = max(1, workers)
+        
+        self._scan_task: Optional[asyncio.Task] = None
+        # Full scans and incremental updates take turns writing
+        self._lock = asyncio.Lock()
+        self._reset_scan_status()
+    
+    def start_background_scan(self, folder_path: str) -> asyncio.Task:
+        """Start scanning folder in a background task, or return the scan already running"""
+        if self._scan_task is None or self._scan_task.done():
+            self._scan_task = asyncio.create_task(self.scan_folder(folder_path))
+        return self._scan_task
+    
+    def get_scan_status(self) -> Dict:
+        """Get progress of the current (or last) scan with throughput and ETA"""
+        status = dict(self.scan_status)
+        
+        started_at = status.get("started_at")
+        finished_at = status.get("finished_at")
+        done = status["processed"] + status["failed"]
+        remaining = max(status["to_process"] - done, 0)
+        
+        throughput = 0.0
+        if started_at:
+            elapsed = (finished_at or time.time()) - started_at
+            throughput = done / elapsed if elapsed > 0 else 0.0
+        
+        status["elapsed_seconds"] = round((finished_at or time.time()) - started_at, 1) if started_at else 0
+        status["files_per_second"] = round(throughput, 2)
+        status["eta_seconds"] = round(remaining / throughput, 1) if status["state"] == "running" and throughput else None
+        return status
+    
+    def _reset_scan_status(self, state: str = "idle"):
+        """Reset scan progress counters"""
+        self.scan_status = {
+            "state": state,
+            "files_seen": 0,
+            "unchanged": 0,
+            "to_process": 0,
+            "processed": 0,
+            "failed": 0,
+            "removed": 0,
+            "started_at": time.time() if state == "running" else None,
+            "finished_at": None,
+            "error": None
+        }
     
     async def scan_folder(self, folder_path: str):
-        """Recursively scan folder for music files"""
+        """
+        Recursively scan folder for music files
+        
+        Only new or changed files (by size, mtime and inode recorded in the
+        file manifest) are re-read; tracks whose files vanished are pruned.
+        Progress is reported through get_scan_status().
+        """
         folder = Path(folder_path)
         if not folder.exists():
             print(f"Music folder not found: {folder_path}")
             folder.mkdir(parents=True, exist_ok=True)
             return
         
-        music_files = []
-        for ext in self.SUPPORTED_FORMATS:
-            music_files.extend(folder.rglob(f"*{ext}"))
-        
-        # CRITICAL FIX: Filter out enhanced versions - they should not be separate tracks
-        standard_files = []
-        enhanced_files = {}
+        self._reset_scan_status("running")
+        status = self.scan_status
         
-        for file_path in music_files:
-            if '_enhanced' in file_path.stem:
-                # This is an enhanced version - extract the base name
-                base_name = file_path.stem.replace('_enhanced', '')
-                base_key = str(file_path.parent / base_name)
-                enhanced_files[base_key] = file_path
+        async with self._lock:
+            await self._scan_folder(folder, status)
+    
+    async def _scan_folder(self, folder: Path, status: Dict):
+        try:
+            # Walk the tree and stat files off the event loop; database calls run on its pool
+            manifest = await self.db.aio.get_file_manifest()
+            lyrics = await self.db.aio.get_folder_asset_states("lyrics.lrc")
+            loop = asyncio.get_running_loop()
+            changed, seen, sidecars = await loop.run_in_executor(None, self._find_changed_files, folder, manifest, lyrics)
+            
+            status["files_seen"] = len(seen)
+            status["to_process"] = len(changed)
+            status["unchanged"] = len(seen) - sum(len(entries) for _, _, entries in changed)
+            
+            await self._index_files(changed, status, sidecars)
+            
+            # Prune tracks whose files have vanished since the last scan. An empty
+            # walk over a populated manifest usually means an unmounted drive.
+            vanished = [path for path in manifest if path not in seen]
+            if vanished and not seen:
+                print(f"No music files found but {len(vanished)} were indexed - skipping prune")
             else:
-                standard_files.append(file_path)
+                if vanished:
+                    status["removed"] = await self.db.aio.remove_files(vanished)
+                await self.db.aio.set_folder_assets(self._asset_keys(sidecars), trees=[str(folder)])
+            
+            await self._compute_cover_palettes()
+            await self._update_availability(seen)
+            
+            status["state"] = "completed"
+            print(f"Scan finished: {status['processed']} processed, {status['failed']} failed, "
+                  f"{status['unchanged']} unchanged, {status['removed']} removed")
+        except asyncio.CancelledError:
+            status["state"] = "cancelled"
+            raise
+        except Exception as e:
+            print(f"Library scan failed: {e}")
+            status["state"] = "failed"
+            status["error"] = str(e)
+        finally:
+            status["finished_at"] = time.time()
+    
+    async def _index_files(self, changed: List[tuple], status: Dict, sidecars: Dict[Path, Dict[str, tuple]]):
+        """
+        Extract and store (file_path, enhanced_path, manifest_entries) items, counting results in status
         
-        print(f"Found {len(standard_files)} tracks ({len(enhanced_files)} with enhanced versions)")
+        sidecars are the walk's sidecar files, which tell whether each folder has lyrics.
+        """
+        # Parse new and changed files (in parallel when workers > 1) while
+        # this coroutine stays the single writer, flushing results in batches
+        pending = []
         
-        for file_path in standard_files:
-            try:
-                # Check if this track has an enhanced version
-                base_key = str(file_path.parent / file_path.stem)
-                enhanced_path = enhanced_files.get(base_key)
-                await self.process_file(file_path, enhanced_path)
-            except Exception as e:
-                print(f"Error processing {file_path}: {e}")
-    
-    async def process_file(self, file_path: Path, enhanced_path: Optional[Path] = None):
-        """Extract metadata and add to database"""
-        try:
-            audio = MutagenFile(str(file_path), easy=True)
-            if audio is None:
-                return
+        async for (file_path, enhanced_path, manifest_entries), metadata in self._extract_all(changed, sidecars):
+            if isinstance(metadata, Exception):
+                print(f"Error processing {file_path}: {metadata}")
+                status["failed"] += 1
+                continue
             
-            # Extract metadata from tags
-            title = self._get_tag(audio, 'title')
-            artist = self._get_tag(audio, 'artist')
-            album = self._get_tag(audio, 'album')
+            pending.append((self._with_enhanced_version(metadata, enhanced_path) if metadata else None,
+                            manifest_entries))
             
-            # Smart fallback: Parse from filename if metadata is missing or looks like a channel name
-            # Common patterns: "Artist - Title", "Artist - Title (Type)", "Title - Artist"
-            filename = file_path.stem
+            if len(pending) >= self.WRITE_BATCH_SIZE:
+                await self._flush_batch(pending, status)
+                pending = []
+        
+        await self._flush_batch(pending, status)
+    
+    async def scan_changes(self, paths: Iterable[str]) -> Dict:
+        """
+        Re-index only the parts of the library touched by changed paths
+        
+        Each changed file's folder is listed (not walked) and compared with
+        its manifest entries, so creates, edits, renames and deletes - and
+        enhanced versions appearing next to an original - are handled alike.
+        Changed directories are walked as a whole; a changed lyrics.lrc
+        re-reads the tracks in its folder, and the folder assets of every
+        listed folder are refreshed. Returns counts of processed, failed and
+        removed files.
+        """
+        status = {"processed": 0, "failed": 0, "removed": 0}
+        loop = asyncio.get_running_loop()
+        
+        async with self._lock:
+            folders, trees, forced = await loop.run_in_executor(None, self._classify_changes, paths)
             
-            # If no title or artist, try to parse from filename
-            if not title or not artist:
-                parsed = self._parse_filename(filename)
-                if not title:
-                    title = parsed.get('title', filename)
-                if not artist:
-                    artist = parsed.get('artist', 'Unknown Artist')
+            manifest = {}
+            for folder in folders:
+                entries = await self.db.aio.get_file_manifest(prefix=os.path.join(str(folder), ""))
+                manifest.update((path, state) for path, state in entries.items() if Path(path).parent == folder)
+            for tree in trees:
+                manifest.update(await self.db.aio.get_file_manifest(prefix=os.path.join(str(tree), "")))
             
-            # Additional check: if artist looks like a channel/uploader name, try filename
-            # Common YouTube/music video channel patterns
-            channel_keywords = ['music', 'official', 'vevo', 'records', 'entertainment', 'media', 'channel', 'video', 'lyrics']
-            if artist and any(keyword in artist.lower() for keyword in channel_keywords):
-                parsed = self._parse_filename(filename)
-                if parsed.get('artist'):
-                    print(f"  ⚠ Replacing channel name '{artist}' with filename artist '{parsed['artist']}'")
-                    artist = parsed['artist']
+            def find_changes():
+                # Listings merge, so a folder that is also inside a walked tree is counted once
+                listing = None
+                for folder in folders - trees:
+                    if folder.is_dir():
+                        listing = self._walk(folder, recursive=False, listing=listing)
+                for tree in trees:
+                    if tree.is_dir():
+                        listing = self._walk(tree, listing=listing)
+                listing = listing or {"tracks": {}, "enhanced": {}, "sidecars": {}}
+                return (*self._diff_with_manifest(listing, manifest, forced), listing["sidecars"])
             
-            # Final fallbacks
-            if not title:
-                title = filename
-            if not artist:
-                artist = 'Unknown Artist'
-            if not album:
-                album = 'Unknown Album'
+            changed, seen, sidecars = await loop.run_in_executor(None, find_changes)
+            await self.db.aio.set_folder_assets(self._asset_keys(sidecars), folders=[str(folder) for folder in folders],
+                                                trees=[str(tree) for tree in trees])
+            await self._index_files(changed, status, sidecars)
+            await self._compute_cover_palettes()
             
-            # Get additional metadata
-            track_number = self._get_track_number(audio)
-            year = self._get_year(audio)
-            genre = self._get_tag(audio, 'genre')
+            vanished = [path for path in manifest if path not in seen]
+            if vanished:
+                status["removed"] = await self.db.aio.remove_files(vanished)
+        
+        if any(status.values()):
+            print(f"Library changes indexed: {status['processed']} processed, {status['failed']} failed, "
+                  f"{status['removed']} removed")
+        return status
+    
+    def _classify_changes(self, paths: Iterable[str]) -> tuple:
+        """Sort changed paths into (folders to list, directory trees to walk, folders to re-read)"""
+        folders, trees, forced = set(), set(), set()
+        for path in map(Path, paths):
+            if path.name == "lyrics.lrc":
+                folders.add(path.parent)
+                forced.add(path.parent)
+            elif path.suffix in self.SUPPORTED_FORMATS or path.name in SIDECAR_FILES:
+                folders.add(path.parent)
+            elif path.is_dir() or not path.exists():
+                # A directory that appeared, or one that is gone along with everything in it
+                trees.add(path)
+            else:
+                folders.add(path.parent)
+        return folders, trees, forced
+    
+    def _asset_keys(self, sidecars: Dict[Path, Dict[str, tuple]]) -> Dict[str, Dict[str, tuple]]:
+        """Key a walk's sidecars by folder path as stored in the database (the tracks' folder)"""
+        return {str(folder): names for folder, names in sidecars.items()}
+    
+    async def _compute_cover_palettes(self):
+        """
+        Compute the colour palette of every cover that doesn't have one yet
+        
+        Folder cover.jpg files that are new or changed are hashed and rendered
+        into the cover store first, so albums whose only art is a folder cover
+        get a palette too.
+        """
+        loop = asyncio.get_running_loop()
+        folders = await self.db.aio.get_folder_covers_without_hash()
+        if folders:
+            def store_folder_covers() -> Dict[str, str]:
+                hashes = {}
+                for folder in folders:
+                    try:
+                        hashes[folder] = self._store_album_art((Path(folder) / "cover.jpg").read_bytes())
+                    except OSError as e:
+                        print(f"Error reading folder cover in {folder}: {e}")
+                return {folder: digest for folder, digest in hashes.items() if digest}
             
-            # Get duration in milliseconds
-            duration_ms = int(audio.info.length * 1000) if hasattr(audio.info, 'length') else 0
+            await self.db.aio.set_folder_cover_hashes(await loop.run_in_executor(None, store_folder_covers))
+        
+        digests = await self.db.aio.get_covers_without_palette()
+        if not digests:
+            return
+        
+        def compute() -> Dict[str, List[str]]:
+            palettes = {}
+            for digest in digests:
+                try:
+                    palettes[digest] = self.cover_store.palette(digest)
+                except Exception as e:
+                    print(f"Could not compute palette for cover {digest}: {e}")
+            return palettes
+        
+        palettes = await loop.run_in_executor(None, compute)
+        await self.db.aio.set_cover_palettes(palettes)
+    
+    async def _update_availability(self, seen: set):
+        """
+        Refresh the tracks' availability flags after a scan
+        
+        Files found by the walk are available. Tracks outside the walk (e.g.
+        imported before they were scanned, or outside the music folder) are
+        checked on disk once here, so requests never have to.
+        """
+        availability = await self.db.aio.get_track_availability()
+        unseen = [path for path in availability if path not in seen]
+        
+        loop = asyncio.get_running_loop()
+        existing = await loop.run_in_executor(None, lambda: {path for path in unseen if os.path.exists(path)})
+        
+        now_available, now_missing = [], []
+        for path, available in availability.items():
+            exists = path in seen or path in existing
+            if exists and not available:
+                now_available.append(path)
+            elif not exists and available:
+                now_missing.append(path)
+        
+        await self.db.aio.set_tracks_available(now_available, True)
+        await self.db.aio.set_tracks_available(now_missing, False)
+        if now_missing:
+            print(f"Marked {len(now_missing)} tracks unavailable (files missing)")
+    
+    def _find_changed_files(self, folder: Path, manifest: Dict[str, tuple], lyrics: Dict[str, tuple]) -> tuple:
+        """
+        Walk folder and compare every audio file against the file manifest
+        
+        Folders whose lyrics.lrc appeared, changed or vanished since its state
+        in lyrics (as recorded in folder_assets) have all their tracks re-read.
+        Returns (changed, seen, sidecars) as _diff_with_manifest does, plus
+        the walk's sidecar files.
+        """
+        listing = self._walk(folder)
+        print(f"Found {len(listing['tracks'])} tracks ({len(listing['enhanced'])} with enhanced versions)")
+        found = {str(directory): names["lyrics.lrc"] for directory, names in listing["sidecars"].items()
+                 if "lyrics.lrc" in names}
+        forced = {Path(directory) for directory in found.keys() | lyrics.keys()
+                  if found.get(directory) != lyrics.get(directory)}
+        return (*self._diff_with_manifest(listing, manifest, forced), listing["sidecars"])
+    
+    def _walk(self, folder: Path, recursive: bool = True, listing: Optional[Dict] = None) -> Dict:
+        """
+        List folder (and its subfolders if recursive) in a single pass
+        
+        Every entry is read once with os.scandir, whose directory reads also
+        return the file types, and sorted by name into:
+          tracks    - {path: state} for original audio files
+          enhanced  - {(folder, base stem): (path, state)} for enhanced versions
+          sidecars  - {folder: {name: (size, mtime_ns)}} for SIDECAR_FILES
+        States are the (size, mtime_ns, inode) kept in the file manifest.
+        Pass listing to add to an earlier result (overlapping walks merge).
+        """
+        listing = listing or {"tracks": {}, "enhanced": {}, "sidecars": {}}
+        stack = [folder]
+        while stack:
+            directory = stack.pop()
+            try:
+                with os.scandir(directory) as entries:
+                    for entry in entries:
+                        try:
+                            if entry.is_dir(follow_symlinks=False):
+                                if recursive:
+                                    stack.append(Path(entry.path))
+                                continue
+                            
+                            name = entry.name
+                            if name in SIDECAR_FILES:
+                                st = entry.stat()
+                                listing["sidecars"].setdefault(directory, {})[name] = (st.st_size, st.st_mtime_ns)
+                                continue
+                            
+                            stem, ext = os.path.splitext(name)
+                            if ext not in self.SUPPORTED_FORMATS or not entry.is_file():
+                                continue
+                            
+                            st = entry.stat()
+                            # DirEntry stats carry no inode on Windows; entry.inode() does
+                            path = Path(entry.path)
+                            state = (st.st_size, st.st_mtime_ns, st.st_ino or entry.inode())
+                            enhanced = ENHANCED_STEM.match(stem)
+                            if enhanced:
+                                listing["enhanced"][(directory, enhanced.group(1))] = (path, state)
+                            else:
+                                listing["tracks"][path] = state
+                        except OSError as e:
+                            print(f"Error reading {entry.path}: {e}")
+            except OSError as e:
+                print(f"Error listing {directory}: {e}")
+        return listing
+    
+    def _diff_with_manifest(self, listing: Dict, manifest: Dict[str, tuple],
+                            force: Iterable[Path] = ()) -> tuple:
+        """
+        Compare a _walk listing against the file manifest
+        
+        Returns (changed, seen) where changed holds (file_path, enhanced_path,
+        manifest_entries) for new or modified tracks - and every track in a
+        force folder - and seen is the set of every audio path found. Manifest
+        paths missing from seen are the vanished files, including enhanced
+        twins whose tracks remove_files then clears.
+        """
+        force = set(force)
+        enhanced_files = listing["enhanced"]
+        
+        seen = set()
+        changed = []
+        
+        for file_path, state in listing["tracks"].items():
+            seen.add(str(file_path))
+            manifest_entries = [(str(file_path), *state)]
             
-            # Generate IDs
-            track_id = self._generate_id(str(file_path))
-            artist_id = self._generate_id(artist)
-            album_id = self._generate_id(f"{artist}-{album}")
+            # Enhanced versions are stored on their original's track, never as tracks of their own
+            enhanced_path = None
+            enhanced = enhanced_files.get((file_path.parent, file_path.stem))
+            if enhanced:
+                enhanced_path, enhanced_state = enhanced
+                manifest_entries.append((str(enhanced_path), *enhanced_state))
+                seen.add(str(enhanced_path))
             
-            # Extract album art
-            image_path = await self._extract_album_art(file_path, album_id)
+            if (file_path.parent not in force
+                    and all(manifest.get(entry[0]) == entry[1:] for entry in manifest_entries)):
+                continue
             
-            # Check for lyrics file in same directory (lyrics.lrc)
-            lyrics_content = None
-            lyrics_file = file_path.parent / "lyrics.lrc"
-            if lyrics_file.exists():
+            changed.append((file_path, enhanced_path, manifest_entries))
+        
+        return changed, seen
+    
+    async def _extract_all(self, files: List[tuple], sidecars: Optional[Dict[Path, Dict[str, tuple]]] = None):
+        """
+        Extract metadata for (file_path, ...) items
+        
+        sidecars, from the walk that found the files, say which folders hold
+        lyrics.lrc; without them each file's folder is checked when it's read.
+        Yields (item, metadata) pairs as extraction finishes, where metadata is
+        None for unreadable audio and the raised exception on failure. Runs in a
+        process pool when more than one worker is configured and there are
+        enough files to pay for starting the workers.
+        """
+        loop = asyncio.get_running_loop()
+        
+        def has_lyrics(file_path: Path) -> Optional[bool]:
+            return None if sidecars is None else "lyrics.lrc" in sidecars.get(file_path.parent, {})
+        
+        if self.workers <= 1 or len(files) <= self.workers * self.POOL_FILES_PER_WORKER:
+            for item in files:
                 try:
-                    with open(lyrics_file, 'r', encoding='utf-8') as f:
-                        lyrics_content = f.read()
+                    metadata = await loop.run_in_executor(None, self.extract_metadata, item[0], has_lyrics(item[0]))
                 except Exception as e:
-                    print(f"Error reading lyrics file: {e}")
+                    metadata = e
+                yield item, metadata
+            return
+        
+        print(f"Extracting metadata with {self.workers} worker processes")
+        
+        # Forking a process that runs an event loop and threads can copy held locks into
+        # the child, so workers start from a clean interpreter (forkserver, or spawn on Windows)
+        start_method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+        pool = ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=multiprocessing.get_context(start_method),
+            initializer=_init_worker,
+            initargs=(str(self.cover_folder),)
+        )
+        try:
+            queue = iter(files)
+            in_flight = {}
             
-            # Add to database with enhanced version info
-            self.db.add_track(
-                track_id=track_id,
-                title=title,
-                artist=artist,
-                artist_id=artist_id,
-                album=album,
-                album_id=album_id,
-                duration_ms=duration_ms,
-                track_number=track_number,
-                year=year,
-                genre=genre,
-                file_path=str(file_path),
-                image_path=image_path,
-                lyrics=lyrics_content
-            )
+            # Keep a bounded number of files queued so results stream back steadily
+            def submit_next() -> bool:
+                item = next(queue, None)
+                if item is None:
+                    return False
+                future = loop.run_in_executor(pool, _extract_in_worker, str(item[0]), has_lyrics(item[0]))
+                in_flight[future] = item
+                return True
             
-            # Update enhanced version info if exists
-            if enhanced_path and enhanced_path.exists():
-                cursor = self.db.conn.cursor()
-                cursor.execute("""
-                    UPDATE tracks 
-                    SET has_enhanced_version = 1,
-                        enhanced_file_path = ?
-                    WHERE id = ?
-                """, (str(enhanced_path), track_id))
-                self.db.conn.commit()
-                print(f"  ✅ Track has enhanced version: {enhanced_path.name}")
+            for _ in range(self.workers * 4):
+                if not submit_next():
+                    break
             
+            while in_flight:
+                done, _ = await asyncio.wait(in_flight, return_when=asyncio.FIRST_COMPLETED)
+                for future in done:
+                    item = in_flight.pop(future)
+                    try:
+                        metadata = future.result()
+                    except Exception as e:
+                        metadata = e
+                    submit_next()
+                    yield item, metadata
+        finally:
+            # Waiting for the workers to exit would block the event loop (and, when
+            # cancelled, wait out the files in flight) - they wind down on their own
+            pool.shutdown(wait=False, cancel_futures=True)
+    
+    async def process_file(self, file_path: Path, enhanced_path: Optional[Path] = None) -> bool:
+        """Extract metadata and add to database. Returns False if the file could not be processed or isn't readable audio."""
+        try:
+            loop = asyncio.get_running_loop()
+            metadata = await loop.run_in_executor(None, self.extract_metadata, file_path)
+            if not metadata:
+                return False
+            return bool(await self.db.aio.add_tracks([self._with_enhanced_version(metadata, enhanced_path)]))
         except Exception as e:
             print(f"Error processing {file_path}: {e}")
+            return False
     
-    def _get_tag(self, audio, tag_name: str) -> Optional[str]:
+    async def process_files(self, file_paths: List[Path]) -> int:
+        """
+        Extract metadata for several files and add them to the database in one batch
+        
+        Stored files are recorded in the file manifest too, so later scans
+        and the watcher treat them as already indexed. Returns the tracks
+        written.
+        """
+        pending = []
+        async for (file_path, _), metadata in self._extract_all([(path, None) for path in file_paths]):
+            if isinstance(metadata, Exception):
+                print(f"Error processing {file_path}: {metadata}")
+                continue
+            pending.append((metadata, [self.manifest_entry(file_path)]))
+        
+        return await self._flush_batch(pending, {"processed": 0, "failed": 0})
+    
+    def manifest_entry(self, file_path: Path) -> tuple:
+        """(path, size, mtime_ns, inode) of a file as recorded in the file manifest"""
+        st = os.stat(file_path)
+        return (str(file_path), st.st_size, st.st_mtime_ns, st.st_ino)
+    
+    def extract_metadata(self, file_path: Path, has_lyrics: Optional[bool] = None) -> Optional[Dict]:
+        """
+        Parse tags, lyrics and album art for a file without touching the database
+        
+        has_lyrics says whether lyrics.lrc is next to the file, as a directory
+        walk found it; when None it is simply opened if present. Safe to run
+        in a worker process. Returns the keyword arguments for
+        Database.add_track, or None if the file is not readable audio.
+        """
+        audio = self.read_audio_file(file_path)
+        if audio is None:
+            return None
+        tags = audio["tags"]
+        
+        # Extract metadata from tags
+        title = self._get_tag(tags, 'title')
+        artist = self._get_tag(tags, 'artist')
+        album = self._get_tag(tags, 'album')
+        
+        # Smart fallback: Parse from filename if metadata is missing or looks like a channel name
+        # Common patterns: "Artist - Title", "Artist - Title (Type)", "Title - Artist"
+        filename = file_path.stem
+        
+        # If no title or artist, try to parse from filename
+        if not title or not artist:
+            parsed = self._parse_filename(filename)
+            if not title:
+                title = parsed.get('title', filename)
+            if not artist:
+                artist = parsed.get('artist', 'Unknown Artist')
+        
+        # Additional check: if artist looks like a channel/uploader name, try filename
+        # Common YouTube/music video channel patterns
+        channel_keywords = ['music', 'official', 'vevo', 'records', 'entertainment', 'media', 'channel', 'video', 'lyrics']
+        if artist and any(keyword in artist.lower() for keyword in channel_keywords):
+            parsed = self._parse_filename(filename)
+            if parsed.get('artist'):
+                print(f"  ⚠ Replacing channel name '{artist}' with filename artist '{parsed['artist']}'")
+                artist = parsed['artist']
+        
+        # Final fallbacks
+        if not title:
+            title = filename
+        if not artist:
+            artist = 'Unknown Artist'
+        if not album:
+            album = 'Unknown Album'
+        
+        # Get additional metadata
+        track_number = self._get_track_number(tags)
+        year = self._get_year(tags)
+        genre = self._get_tag(tags, 'genre')
+        duration_ms = audio["duration_ms"]
+        
+        # Generate IDs
+        track_id = self._generate_id(str(file_path))
+        artist_id = self._generate_id(artist)
+        album_id = self._generate_id(f"{artist}-{album}")
+        
+        # Store album art
+        cover_hash = self._store_album_art(audio["art"]) if audio["art"] else None
+        image_path = f"/artwork/{cover_hash}" if cover_hash else None
+        
+        # Lyrics file in same directory (lyrics.lrc)
+        lyrics_content = None
+        if has_lyrics is not False:
+            try:
+                with open(file_path.parent / "lyrics.lrc", 'r', encoding='utf-8') as f:
+                    lyrics_content = f.read()
+            except FileNotFoundError:
+                pass
+            except Exception as e:
+                print(f"Error reading lyrics file: {e}")
+        
+        return {
+            "track_id": track_id,
+            "title": title,
+            "artist": artist,
+            "artist_id": artist_id,
+            "album": album,
+            "album_id": album_id,
+            "duration_ms": duration_ms,
+            "track_number": track_number,
+            "year": year,
+            "genre": genre,
+            "file_path": str(file_path),
+            "image_path": image_path,
+            "cover_hash": cover_hash,
+            "lyrics": lyrics_content
+        }
+    
+    def read_audio_file(self, file_path: Path) -> Optional[Dict]:
+        """
+        Parse a file once for its tags, duration, embedded art and codec info
+        
+        Tags are returned as lists of strings under the names used by
+        mutagen's easy interfaces (title, artist, album, genre, date,
+        tracknumber), whatever the container. Returns None if the file is not
+        readable audio.
+        """
+        audio = MutagenFile(str(file_path))
+        if audio is None:
+            return None
+        
+        tags = {}
+        art = None
+        if isinstance(audio.tags, ID3):
+            # MP3, WAV and AIFF
+            for name, frame_id in ID3_FRAMES.items():
+                frame = audio.tags.get(frame_id)
+                if frame is not None:
+                    tags[name] = [str(text) for text in (frame.genres if frame_id == "TCON" else frame.text)]
+            pictures = audio.tags.getall("APIC")
+            # Prefer the front cover (picture type 3)
+            pictures.sort(key=lambda picture: picture.type != 3)
+            if pictures:
+                art = pictures[0].data
+        elif isinstance(audio.tags, MP4Tags):
+            # M4A
+            for name, atom in MP4_ATOMS.items():
+                if atom in audio.tags:
+                    tags[name] = [str(value) for value in audio.tags[atom]]
+            if "trkn" in audio.tags:
+                number, total = audio.tags["trkn"][0]
+                tags["tracknumber"] = [f"{number}/{total}" if total else str(number)]
+            if "covr" in audio.tags:
+                art = bytes(audio.tags["covr"][0])
+        elif audio.tags is not None:
+            # FLAC, Ogg Vorbis and Opus (Vorbis comments)
+            tags = {key.lower(): list(values) for key, values in audio.tags.items()}
+            if getattr(audio, "pictures", None):
+                art = audio.pictures[0].data
+            elif "metadata_block_picture" in tags:
+                try:
+                    art = Picture(base64.b64decode(tags["metadata_block_picture"][0])).data
+                except Exception as e:
+                    print(f"Error reading album art from {file_path}: {e}")
+        
+        info = audio.info
+        return {
+            "tags": tags,
+            "duration_ms": int(info.length * 1000) if getattr(info, "length", None) else 0,
+            "art": art,
+            "codec": {
+                "format": type(audio).__name__.lower(),
+                "bitrate": getattr(info, "bitrate", None),
+                "sample_rate": getattr(info, "sample_rate", None),
+                "channels": getattr(info, "channels", None)
+            }
+        }
+    
+    def _with_enhanced_version(self, metadata: Dict, enhanced_path: Optional[Path]) -> Dict:
+        """Attach enhanced version info to extracted metadata if the enhanced file exists"""
+        if enhanced_path and enhanced_path.exists():
+            metadata["enhanced_file_path"] = str(enhanced_path)
+            print(f"  ✅ Track has enhanced version: {enhanced_path.name}")
+        return metadata
+    
+    async def _flush_batch(self, pending: List[tuple], status: Dict) -> int:
+        """
+        Write a batch of (metadata or None, manifest_entries) items, counting results in status
+        
+        Only files whose tracks were stored - or that aren't readable audio,
+        so have no track - are recorded in the manifest; the others are
+        counted as failed and retried by the next scan. Returns the tracks
+        written.
+        """
+        written = set(await self.db.aio.add_tracks([metadata for metadata, _ in pending if metadata]))
+        
+        manifest_entries = []
+        for metadata, entries in pending:
+            if metadata and metadata["track_id"] not in written:
+                status["failed"] += 1
+                continue
+            status["processed"] += 1
+            manifest_entries.extend(entries)
+        await self.db.aio.update_file_manifest(manifest_entries)
+        return len(written)
+    
+    def _get_tag(self, tags: Dict, tag_name: str) -> Optional[str]:
         """Safely get tag value"""
         try:
-            value = audio.get(tag_name)
+            value = tags.get(tag_name)
             if value:
                 result = str(value[0]) if isinstance(value, list) else str(value)
                 # Clean up empty or whitespace-only values
@@ -216,10 +775,10 @@ class MusicScanner:
         
         return result
     
-    def _get_track_number(self, audio) -> Optional[int]:
+    def _get_track_number(self, tags: Dict) -> Optional[int]:
         """Extract track number"""
         try:
-            track = self._get_tag(audio, 'tracknumber')
+            track = self._get_tag(tags, 'tracknumber')
             if track:
                 # Handle "1/12" format
                 return int(track.split('/')[0])
@@ -227,10 +786,10 @@ class MusicScanner:
             pass
         return None
     
-    def _get_year(self, audio) -> Optional[int]:
+    def _get_year(self, tags: Dict) -> Optional[int]:
         """Extract year from date tag"""
         try:
-            date = self._get_tag(audio, 'date')
+            date = self._get_tag(tags, 'date')
             if date:
                 return int(date[:4])
         except:
@@ -241,51 +800,20 @@ class MusicScanner:
         """Generate consistent ID from text"""
         return hashlib.md5(text.encode()).hexdigest()[:16]
     
-    async def _extract_album_art(self, file_path: Path, album_id: str) -> Optional[str]:
-        """Extract and save album artwork"""
-        try:
-            # Check if cover already exists
-            cover_path = self.cover_folder / f"{album_id}.jpg"
-            if cover_path.exists():
-                return f"/covers/{album_id}.jpg"
-            
-            # Try to extract from file
-            audio = MutagenFile(str(file_path))
-            image_data = None
-            
-            if isinstance(audio, MP3):
-                # MP3 with ID3 tags
-                try:
-                    tags = ID3(str(file_path))
-                    for tag in tags.values():
-                        if isinstance(tag, APIC):
-                            image_data = tag.data
-                            break
-                except:
-                    pass
-            
-            elif isinstance(audio, FLAC):
-                # FLAC files
-                if audio.pictures:
-                    image_data = audio.pictures[0].data
-            
-            elif isinstance(audio, MP4):
-                # M4A files
-                if 'covr' in audio:
-                    image_data = audio['covr'][0]
-            
-            if image_data:
-                # Save image
-                try:
-                    img = Image.open(io.BytesIO(image_data))
-                    # Resize to reasonable size
-                    img.thumbnail((640, 640), Image.Resampling.LANCZOS)
-                    img.save(cover_path, "JPEG", quality=85)
-                    return f"/covers/{album_id}.jpg"
-                except Exception as e:
-                    print(f"Error saving album art: {e}")
-            
-        except Exception as e:
-            print(f"Error extracting album art from {file_path}: {e}")
+    def _store_album_art(self, image_data: bytes) -> Optional[str]:
+        """
+        Store embedded artwork in the content-addressed cover store
         
-        return None
+        Returns the hash of the image bytes. Images already in the store - the
+        same art on every track of an album, or across compilations and
+        re-rips - are not decoded or resized again.
+        """
+        cover_hash = content_hash(image_data)
+        if cover_hash not in self._seen_covers:
+            try:
+                self.cover_store.render(image_data, cover_hash)
+            except Exception as e:
+                print(f"Error saving album art: {e}")
+                return None
+            self._seen_covers.add(cover_hash)
+        return cover_hash
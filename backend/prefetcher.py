@@ -0,0 +1,124 @@
+"""
+Next-track Prefetching
+Warms the files of tracks a client is about to play - audio, cover, lyrics -
+and pre-starts any transcode they will need, so track changes don't wait on
+a cold disk
+"""
+
+import asyncio
+import os
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from covers import CoverStore, COVER_SIZES, RENDERED_FORMATS
+from streaming import HotFileCache
+from transcoder import TranscodeCache, TranscodeUnavailable, DEFAULT_CODEC, DEFAULT_BITRATE
+
+
+def advise_willneed(path: Path, length: int = 0) -> bool:
+    """
+    Ask the OS to read a file into the page cache in the background
+    
+    Uses posix_fadvise(WILLNEED) where available; elsewhere (Windows) reads
+    the first length bytes (or the whole file) instead. Returns False if
+    the file could not be opened.
+    """
+    try:
+        with open(path, "rb") as file:
+            if hasattr(os, "posix_fadvise"):
+                os.posix_fadvise(file.fileno(), 0, length, os.POSIX_FADV_WILLNEED)
+            else:
+                file.read(length or -1)
+        return True
+    except OSError:
+        return False
+
+
+class Prefetcher:
+    """
+    Warms upcoming tracks named by the client
+    
+    Requests are deduplicated for a short window so repeated hints for the
+    same queue cost nothing, and at most max_tracks ids are taken per hint.
+    """
+    
+    max_tracks = 5
+    dedupe_seconds = 60
+    # How much of an audio file to read ahead - enough to start and seek early on
+    readahead_bytes = 8 * 1024 * 1024
+    
+    def __init__(self, database, stream_cache: HotFileCache, transcode_cache: TranscodeCache,
+                 cover_store: CoverStore):
+        self.db = database
+        self.stream_cache = stream_cache
+        self.transcode_cache = transcode_cache
+        self.cover_store = cover_store
+        self.cover_folder = cover_store.root.parent
+        self._recent: Dict[tuple, float] = {}
+        self._tasks = set()
+    
+    def schedule(self, track_ids: List[str], quality: str = "standard",
+                 codec: Optional[str] = None, bitrate: Optional[int] = None) -> int:
+        """Warm tracks in the background. Returns how many were scheduled."""
+        now = time.monotonic()
+        self._recent = {key: at for key, at in self._recent.items() if now - at < self.dedupe_seconds}
+        
+        scheduled = 0
+        for track_id in track_ids[:self.max_tracks]:
+            key = (track_id, quality, codec, bitrate)
+            if not track_id or key in self._recent:
+                continue
+            self._recent[key] = now
+            
+            task = asyncio.create_task(self.warm(track_id, quality, codec, bitrate))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+            scheduled += 1
+        return scheduled
+    
+    async def warm(self, track_id: str, quality: str = "standard",
+                   codec: Optional[str] = None, bitrate: Optional[int] = None):
+        """Warm one track's audio, cover and lyrics, and start its transcode if one is needed"""
+        try:
+            # Loads the row (and its lyrics) into SQLite's page cache too
+            track = await self.db.aio.get_track(track_id)
+            if not track or not track.get("file_path"):
+                return
+            
+            file_path = Path(track["file_path"])
+            loop = asyncio.get_running_loop()
+            # Sidecars the scanner recorded next to the track (lyrics, folder cover, canvas)
+            paths = [file_path.parent / name for name in track["assets"]]
+            
+            # Warm the file the stream endpoint will pick for this quality
+            if quality == "enhanced" and track["has_enhanced_version"] and track["enhanced_file_path"]:
+                enhanced_path = Path(track["enhanced_file_path"])
+                if await loop.run_in_executor(None, enhanced_path.exists):
+                    file_path = enhanced_path
+            if track["cover_hash"]:
+                paths += [self.cover_store.variant_path(track["cover_hash"], COVER_SIZES[-1], fmt) for fmt in RENDERED_FORMATS]
+            elif track["album"]["id"]:
+                paths.append(self.cover_folder / f"{track['album']['id']}.jpg")
+            
+            opened = await loop.run_in_executor(None, advise_willneed, file_path, self.readahead_bytes)
+            if not opened:
+                return
+            await loop.run_in_executor(None, lambda: [advise_willneed(path) for path in paths if path.exists()])
+            
+            stat_result = await loop.run_in_executor(None, os.stat, file_path)
+            self.stream_cache.warm(file_path, stat_result)
+            
+            if codec or bitrate:
+                codec, bitrate = codec or DEFAULT_CODEC, bitrate or DEFAULT_BITRATE
+                if not await self.transcode_cache.lookup(file_path, stat_result, codec, bitrate):
+                    await self.transcode_cache.start(file_path, stat_result, codec, bitrate)
+        except TranscodeUnavailable:
+            pass
+        except Exception as e:
+            print(f"Prefetch of track {track_id} failed: {e}")
+    
+    async def close(self):
+        for task in list(self._tasks):
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
@@ -0,0 +1,484 @@
+"""
+Ranged Audio Streaming
+Serves audio files with single and multi-range (206) responses, ETag /
+Last-Modified validation (304) and per-format content types, from an
+in-memory cache of hot files where possible
+"""
+
+import asyncio
+import os
+import re
+import secrets
+from collections import OrderedDict
+from email.utils import formatdate, parsedate_to_datetime
+from functools import partial
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple, Union
+from urllib.parse import quote
+
+import anyio
+from starlette.concurrency import run_in_threadpool
+from starlette.requests import Request
+from starlette.responses import Response
+
+
+AUDIO_MEDIA_TYPES = {
+    ".mp3": "audio/mpeg",
+    ".flac": "audio/flac",
+    ".m4a": "audio/mp4",
+    ".aac": "audio/aac",
+    ".ogg": "audio/ogg",
+    ".opus": "audio/ogg",
+    ".wav": "audio/wav",
+}
+
+# More ranges than this in one request are ignored and the whole file is served
+MAX_RANGES = 16
+
+_RANGE_SPEC = re.compile(r"^(\d*)-(\d*)$")
+
+# A body segment is either literal bytes (multipart headers) or an (offset, count) slice of the file
+Segment = Union[bytes, Tuple[int, int]]
+
+
+class RangeNotSatisfiable(Exception):
+    """No requested range overlaps the file"""
+
+
+class ShortRead(Exception):
+    """The file ended before the bytes promised by Content-Length were sent"""
+
+
+def media_type_for(path: Path) -> str:
+    """Get the Content-Type for an audio file from its extension"""
+    return AUDIO_MEDIA_TYPES.get(path.suffix.lower(), "application/octet-stream")
+
+
+def make_etag(stat_result: os.stat_result) -> str:
+    """Strong validator from the file's size and modification time"""
+    return f'"{stat_result.st_size:x}-{stat_result.st_mtime_ns:x}"'
+
+
+def parse_range_header(value: str, size: int) -> Optional[List[Tuple[int, int]]]:
+    """
+    Parse a Range header into sorted (start, end) inclusive byte ranges
+    
+    Overlapping and adjacent ranges are merged so no byte is sent twice.
+    Returns None when the header should be ignored (other units, malformed
+    or too many ranges) and raises RangeNotSatisfiable when every range lies
+    outside the file.
+    """
+    unit, _, spec = value.partition("=")
+    if unit.strip().lower() != "bytes":
+        return None
+    
+    specs = [part.strip() for part in spec.split(",") if part.strip()]
+    if not specs or len(specs) > MAX_RANGES:
+        return None
+    
+    ranges = []
+    for part in specs:
+        match = _RANGE_SPEC.match(part)
+        if not match or match.group(0) == "-":
+            return None
+        first, last = match.groups()
+        
+        if first:
+            start = int(first)
+            end = int(last) if last else size - 1
+            if last and end < start:
+                return None
+            if start >= size:
+                continue
+            ranges.append((start, min(end, size - 1)))
+        else:
+            # Suffix range: the final N bytes
+            length = int(last)
+            if length == 0 or size == 0:
+                continue
+            ranges.append((max(0, size - length), size - 1))
+    
+    if not ranges:
+        raise RangeNotSatisfiable()
+    
+    ranges.sort()
+    merged = [ranges[0]]
+    for start, end in ranges[1:]:
+        last_start, last_end = merged[-1]
+        if start <= last_end + 1:
+            merged[-1] = (last_start, max(last_end, end))
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def is_not_modified(request: Request, etag: str, mtime: float) -> bool:
+    """Evaluate If-None-Match / If-Modified-Since against the file's validators"""
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        # Weak comparison - W/ prefixes are ignored for If-None-Match
+        tags = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+        return "*" in tags or etag in tags
+    
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since:
+        try:
+            return int(mtime) <= parsedate_to_datetime(if_modified_since).timestamp()
+        except (TypeError, ValueError):
+            return False
+    return False
+
+
+def if_range_matches(request: Request, etag: str, mtime: float) -> bool:
+    """Whether a Range request may be honoured given its If-Range precondition"""
+    if_range = request.headers.get("if-range")
+    if if_range is None:
+        return True
+    
+    if_range = if_range.strip()
+    if if_range.startswith('"') or if_range.startswith("W/"):
+        # Strong comparison only - a weak tag never matches
+        return if_range == etag
+    try:
+        return int(mtime) == int(parsedate_to_datetime(if_range).timestamp())
+    except (TypeError, ValueError):
+        return False
+
+
+def content_disposition(path: Path) -> str:
+    """inline Content-Disposition with an ASCII fallback and the UTF-8 filename"""
+    fallback = path.name.encode("ascii", "ignore").decode("ascii").replace('"', "")
+    if not fallback:
+        fallback = "audio" + path.suffix
+    return f"inline; filename=\"{fallback}\"; filename*=UTF-8''{quote(path.name)}"
+
+
+def stream_file(request: Request, path: Path, stat_result: os.stat_result,
+                filename: Optional[str] = None, cache: Optional["HotFileCache"] = None) -> Response:
+    """
+    Build the response for a GET/HEAD of an audio file
+    
+    Returns 304 when the client's copy is current, 416 for unsatisfiable
+    ranges, 206 for one range (or multipart/byteranges for several) and 200
+    for the whole file. filename overrides the name in Content-Disposition;
+    bytes held by cache are served from memory.
+    """
+    size = stat_result.st_size
+    etag = make_etag(stat_result)
+    media_type = media_type_for(path)
+    headers = {
+        "Accept-Ranges": "bytes",
+        "ETag": etag,
+        "Last-Modified": formatdate(stat_result.st_mtime, usegmt=True),
+        "Content-Disposition": content_disposition(Path(filename) if filename else path),
+    }
+    
+    if is_not_modified(request, etag, stat_result.st_mtime):
+        return Response(status_code=304, headers=headers)
+    
+    ranges = None
+    range_header = request.headers.get("range")
+    if range_header and if_range_matches(request, etag, stat_result.st_mtime):
+        try:
+            ranges = parse_range_header(range_header, size)
+        except RangeNotSatisfiable:
+            headers["Content-Range"] = f"bytes */{size}"
+            return Response(status_code=416, headers=headers)
+    
+    body_options = {"send_body": request.method != "HEAD", "stat_result": stat_result, "cache": cache}
+    
+    if not ranges:
+        return RangedFileResponse(path, 200, headers, media_type, [(0, size)], **body_options)
+    
+    if len(ranges) == 1:
+        start, end = ranges[0]
+        headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+        return RangedFileResponse(path, 206, headers, media_type, [(start, end - start + 1)], **body_options)
+    
+    boundary = secrets.token_hex(12)
+    segments: List[Segment] = []
+    for index, (start, end) in enumerate(ranges):
+        separator = "\r\n" if index else ""
+        part_header = (
+            f"{separator}--{boundary}\r\n"
+            f"Content-Type: {media_type}\r\n"
+            f"Content-Range: bytes {start}-{end}/{size}\r\n\r\n"
+        )
+        segments.append(part_header.encode("latin-1"))
+        segments.append((start, end - start + 1))
+    segments.append(f"\r\n--{boundary}--\r\n".encode("latin-1"))
+    
+    return RangedFileResponse(path, 206, headers, f"multipart/byteranges; boundary={boundary}",
+                              segments, **body_options)
+
+
+class HotFileCache:
+    """
+    Bounded in-memory cache of popular audio files
+    
+    Files up to whole_file_max bytes are held whole, larger ones only their
+    first head_bytes - enough to start playback without touching the disk.
+    Entries are keyed by path, size and mtime, so an edited file is never
+    served stale. A miss is filled from the bytes the response reads anyway;
+    only when that can't cover the entry (a mid-file range, zero-copy send)
+    is the file loaded in the background, and then on its second miss, so
+    a file is never read twice for one request.
+    
+    Eviction is GreedyDual-Size: an entry's priority is the clock at its last
+    hit plus head_bytes / size, and evicting an entry advances the clock to
+    its priority. Recently used entries survive, and of two equally recent
+    entries the larger one goes first.
+    """
+    
+    head_bytes = 1024 * 1024
+    whole_file_max = 16 * 1024 * 1024
+    # Keys missed once and not filled, remembered to admit them on the next miss
+    max_seen = 4096
+    
+    def __init__(self, max_bytes: Optional[int] = None):
+        if max_bytes is None:
+            max_bytes = int(os.getenv("STREAM_CACHE_MAX_MB", "256")) * 1024 * 1024
+        self.max_bytes = max_bytes
+        # key -> [data, priority]
+        self._entries: Dict[tuple, list] = {}
+        self._keys_by_path: Dict[str, tuple] = {}
+        self._loading = set()
+        self._seen: "OrderedDict[tuple, None]" = OrderedDict()
+        self._tasks = set()
+        self._clock = 0.0
+        self._size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+    
+    @property
+    def enabled(self) -> bool:
+        return self.max_bytes > 0
+    
+    def _key(self, path: Path, stat_result: os.stat_result) -> tuple:
+        return (str(path), stat_result.st_size, stat_result.st_mtime_ns)
+    
+    def _priority(self, length: int) -> float:
+        return self._clock + self.head_bytes / max(length, 1)
+    
+    def _length(self, size: int) -> int:
+        """Bytes cached for a file of this size, 0 if it can't be cached"""
+        length = size if size <= self.whole_file_max else self.head_bytes
+        return length if length <= self.max_bytes else 0
+    
+    def get(self, path: Path, stat_result: os.stat_result) -> Optional[bytes]:
+        """Get the cached leading bytes (or all bytes) of a file, scheduling a load on a repeated miss"""
+        if not self.enabled:
+            return None
+        
+        key = self._key(path, stat_result)
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            if key in self._seen:
+                del self._seen[key]
+                self._schedule_load(path, key)
+            else:
+                self._seen[key] = None
+                if len(self._seen) > self.max_seen:
+                    self._seen.popitem(last=False)
+            return None
+        
+        self.hits += 1
+        entry[1] = self._priority(len(entry[0]))
+        return entry[0]
+    
+    def fill_length(self, stat_result: os.stat_result) -> int:
+        """How many leading bytes a response should hand to fill() after a miss"""
+        return self._length(stat_result.st_size) if self.enabled else 0
+    
+    def fill(self, path: Path, stat_result: os.stat_result, data: bytes):
+        """Cache the leading bytes a response read from the file after a miss"""
+        key = self._key(path, stat_result)
+        if key in self._entries or len(data) != self.fill_length(stat_result):
+            return
+        self._seen.pop(key, None)
+        self._insert(key, data)
+    
+    def warm(self, path: Path, stat_result: os.stat_result):
+        """Load a file ahead of its first request, without counting a lookup"""
+        key = self._key(path, stat_result)
+        if self.enabled and key not in self._entries:
+            self._schedule_load(path, key)
+    
+    def _schedule_load(self, path: Path, key: tuple):
+        length = self._length(key[1])
+        if key in self._loading or length == 0:
+            return
+        
+        self._loading.add(key)
+        task = asyncio.get_running_loop().create_task(self._load(path, key, length))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+    
+    async def _load(self, path: Path, key: tuple, length: int):
+        try:
+            data = await run_in_threadpool(_read_head, path, length)
+            # A short read means the file changed since it was stat-ed
+            if len(data) == length and key not in self._entries:
+                self._insert(key, data)
+        except OSError:
+            pass
+        finally:
+            self._loading.discard(key)
+    
+    def _insert(self, key: tuple, data: bytes):
+        previous = self._keys_by_path.get(key[0])
+        if previous is not None:
+            self._remove(previous)
+        
+        while self._entries and self._size + len(data) > self.max_bytes:
+            victim = min(self._entries, key=lambda k: self._entries[k][1])
+            self._clock = self._entries[victim][1]
+            self._remove(victim)
+            self.evictions += 1
+        
+        self._entries[key] = [data, self._priority(len(data))]
+        self._keys_by_path[key[0]] = key
+        self._size += len(data)
+    
+    def _remove(self, key: tuple):
+        data, _ = self._entries.pop(key)
+        self._size -= len(data)
+        if self._keys_by_path.get(key[0]) == key:
+            del self._keys_by_path[key[0]]
+    
+    def get_stats(self) -> Dict:
+        lookups = self.hits + self.misses
+        return {
+            "enabled": self.enabled,
+            "entries": len(self._entries),
+            "size_bytes": self._size,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else None,
+            "evictions": self.evictions
+        }
+
+
+class RangedFileResponse(Response):
+    """
+    Send slices of a file, interleaved with literal byte segments
+    
+    Bytes held by the hot file cache are sent from memory. The rest go out
+    through the ASGI zero-copy send extension when the server offers it, and
+    as fixed-size chunks read in a worker thread otherwise. Sending stops as
+    soon as the client disconnects.
+    """
+    
+    chunk_size = 256 * 1024
+    
+    def __init__(self, path: Path, status_code: int, headers: dict, media_type: str,
+                 segments: List[Segment], send_body: bool = True,
+                 stat_result: Optional[os.stat_result] = None, cache: Optional[HotFileCache] = None):
+        self.path = path
+        self.status_code = status_code
+        self.media_type = media_type
+        self.segments = segments
+        self.send_body = send_body
+        self.stat_result = stat_result
+        self.cache = cache
+        self.background = None
+        
+        length = sum(len(s) if isinstance(s, bytes) else s[1] for s in segments)
+        self.init_headers({**headers, "Content-Length": str(length)})
+    
+    async def __call__(self, scope, receive, send):
+        await send({"type": "http.response.start", "status": self.status_code, "headers": self.raw_headers})
+        
+        if not self.send_body:
+            await send({"type": "http.response.body", "body": b"", "more_body": False})
+            return
+        
+        async with anyio.create_task_group() as task_group:
+            async def run_until_cancelled(func):
+                await func()
+                task_group.cancel_scope.cancel()
+            
+            task_group.start_soon(run_until_cancelled, partial(self._send_segments, scope, send))
+            await run_until_cancelled(partial(self._listen_for_disconnect, receive))
+    
+    async def _listen_for_disconnect(self, receive):
+        while True:
+            message = await receive()
+            if message["type"] == "http.disconnect":
+                break
+    
+    async def _send_segments(self, scope, send):
+        zero_copy = "http.response.zerocopysend" in scope.get("extensions", {})
+        cached = None
+        # On a miss, the leading bytes read below are kept to fill the cache
+        fill = None
+        fill_length = 0
+        if self.cache is not None and self.stat_result is not None:
+            cached = self.cache.get(self.path, self.stat_result)
+            if cached is None and not zero_copy:
+                fill = bytearray()
+                fill_length = self.cache.fill_length(self.stat_result)
+        
+        file = None
+        try:
+            for segment in self.segments:
+                if isinstance(segment, bytes):
+                    await send({"type": "http.response.body", "body": segment, "more_body": True})
+                    continue
+                
+                offset, count = segment
+                
+                # Serve the part of the slice the cache holds from memory
+                if cached is not None and offset < len(cached):
+                    end = min(offset + count, len(cached))
+                    for start in range(offset, end, self.chunk_size):
+                        chunk = cached[start:min(start + self.chunk_size, end)]
+                        await send({"type": "http.response.body", "body": chunk, "more_body": True})
+                    count -= end - offset
+                    offset = end
+                if count <= 0:
+                    continue
+                
+                if file is None:
+                    file = await run_in_threadpool(open, self.path, "rb")
+                
+                if zero_copy:
+                    await send({"type": "http.response.zerocopysend", "file": file,
+                                "offset": offset, "count": count, "more_body": True})
+                    continue
+                
+                while count > 0:
+                    chunk = await run_in_threadpool(_read_at, file, offset, min(self.chunk_size, count))
+                    if not chunk:
+                        # File shrank underneath us. Raising makes the server abort the
+                        # connection, so clients never take the short body for a whole one.
+                        raise ShortRead(f"{self.path} ended {count} bytes short of the response")
+                    if fill is not None and offset == len(fill) < fill_length:
+                        fill += chunk[:fill_length - len(fill)]
+                        if len(fill) == fill_length:
+                            self.cache.fill(self.path, self.stat_result, bytes(fill))
+                            fill = None
+                    offset += len(chunk)
+                    count -= len(chunk)
+                    await send({"type": "http.response.body", "body": chunk, "more_body": True})
+        finally:
+            if file is not None:
+                file.close()
+        
+        await send({"type": "http.response.body", "body": b"", "more_body": False})
+
+
+def _read_head(path: Path, length: int) -> bytes:
+    with open(path, "rb") as file:
+        return file.read(length)
+
+
+def _read_at(file, offset: int, size: int) -> bytes:
+    """Read size bytes at offset (pread where available, seek + read on Windows)"""
+    if hasattr(os, "pread"):
+        return os.pread(file.fileno(), size, offset)
+    file.seek(offset)
+    return file.read(size)
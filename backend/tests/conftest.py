@@ -0,0 +1,63 @@
+import os
+import sys
+import wave
+from pathlib import Path
+
+import numpy as np
+import pytest
+from starlette.requests import Request
+
+# Backend modules import each other by name, as main.py runs them
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from database import Database
+
+
+@pytest.fixture(scope="session")
+def app_module(tmp_path_factory):
+    """The API module (main), imported with its caches and folders under a temporary directory"""
+    cwd = os.getcwd()
+    os.chdir(tmp_path_factory.mktemp("app"))
+    try:
+        import main
+    finally:
+        os.chdir(cwd)
+    return main
+
+
+def make_request(headers: dict = None, method: str = "GET") -> Request:
+    """A bare request for calling route handlers directly"""
+    return Request({
+        "type": "http", "method": method, "path": "/", "query_string": b"",
+        "headers": [(name.lower().encode(), value.encode()) for name, value in (headers or {}).items()],
+    })
+
+
+@pytest.fixture
+def db(tmp_path):
+    database = Database(str(tmp_path / "library.db"), pool_size=2)
+    database.init_db()
+    yield database
+    database.close()
+
+
+def write_wav(path: Path, seconds: float = 12.0, seed: int = 0, rate: int = 8000) -> Path:
+    """Write a mono 16-bit WAV of band-limited noise that fingerprints reliably"""
+    rng = np.random.default_rng(seed)
+    samples = np.convolve(rng.standard_normal(int(seconds * rate)), np.ones(4) / 4, mode="same")
+    samples = (samples / np.abs(samples).max() * 0.8 * 32767).astype("<i2")
+    with wave.open(str(path), "wb") as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(2)
+        wav.setframerate(rate)
+        wav.writeframes(samples.tobytes())
+    return path
+
+
+def track(track_id: str, file_path: str, title: str = "Song", artist: str = "Artist", **extra) -> dict:
+    """add_tracks keyword arguments for a minimal track"""
+    return {
+        "track_id": track_id, "title": title, "artist": artist, "artist_id": f"artist-{artist}",
+        "album": "Album", "album_id": f"album-{artist}", "duration_ms": 180000,
+        "file_path": file_path, "image_path": None, **extra
+    }
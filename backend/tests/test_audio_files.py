@@ -0,0 +1,132 @@
+import io
+import struct
+
+import pytest
+from mutagen.flac import FLAC, Picture
+from mutagen.id3 import APIC, ID3, TALB, TCON, TDRC, TIT2, TPE1, TRCK
+from mutagen.mp4 import MP4, MP4Cover
+from PIL import Image
+
+import music_scanner
+from music_scanner import MusicScanner
+
+RATE = 44100
+
+
+def jpeg() -> bytes:
+    buffer = io.BytesIO()
+    Image.new("RGB", (64, 64), (120, 30, 30)).save(buffer, "JPEG")
+    return buffer.getvalue()
+
+
+def write_mp3(path, art: bytes):
+    """Five seconds of silent 128 kbps MPEG-1 Layer III frames, tagged with ID3"""
+    path.write_bytes((bytes([0xFF, 0xFB, 0x90, 0x64]) + b"\0" * 413) * 192)
+    tags = ID3()
+    tags.add(TIT2(encoding=3, text="Mp3 Song"))
+    tags.add(TPE1(encoding=3, text="Mp3 Artist"))
+    tags.add(TALB(encoding=3, text="Mp3 Album"))
+    tags.add(TCON(encoding=3, text="Rock"))
+    tags.add(TDRC(encoding=3, text="2019"))
+    tags.add(TRCK(encoding=3, text="4/12"))
+    tags.add(APIC(encoding=3, mime="image/png", type=0, desc="other", data=b"not the cover"))
+    tags.add(APIC(encoding=3, mime="image/jpeg", type=3, desc="front", data=art))
+    tags.save(str(path))
+
+
+def write_flac(path, art: bytes, seconds=5):
+    """A FLAC stream with only STREAMINFO, tagged with Vorbis comments and a picture block"""
+    info = (struct.pack(">HH", 4096, 4096) + b"\0" * 6
+            + ((RATE << 44) | (1 << 41) | (15 << 36) | (RATE * seconds)).to_bytes(8, "big") + b"\0" * 16)
+    path.write_bytes(b"fLaC" + bytes([0x80]) + len(info).to_bytes(3, "big") + info)
+    audio = FLAC(str(path))
+    audio.update({"TITLE": "Flac Song", "ARTIST": "Flac Artist", "ALBUM": "Flac Album",
+                  "GENRE": "Jazz", "DATE": "2020-05-01", "TRACKNUMBER": "7"})
+    picture = Picture()
+    picture.type, picture.mime, picture.data = 3, "image/jpeg", art
+    audio.add_picture(picture)
+    audio.save()
+
+
+def write_m4a(path, art: bytes, seconds=5):
+    """An AAC track with an empty mdat, tagged with MP4 atoms"""
+    def atom(name, payload):
+        return struct.pack(">I4s", 8 + len(payload), name) + payload
+
+    def full_atom(name, payload):
+        return atom(name, b"\0" * 4 + payload)
+
+    sample_entry = atom(b"mp4a", b"\0" * 6 + struct.pack(">H", 1) + b"\0" * 8
+                        + struct.pack(">HHHHI", 2, 16, 0, 0, RATE << 16) + atom(b"free", b""))
+    media = atom(b"mdia",
+                 full_atom(b"mdhd", struct.pack(">IIIIHH", 0, 0, RATE, RATE * seconds, 0x55C4, 0))
+                 + full_atom(b"hdlr", struct.pack(">I4s", 0, b"soun") + b"\0" * 13)
+                 + atom(b"minf", atom(b"stbl", full_atom(b"stsd", struct.pack(">I", 1) + sample_entry))))
+    movie = atom(b"moov", full_atom(b"mvhd", struct.pack(">IIII", 0, 0, 1000, seconds * 1000) + b"\0" * 80)
+                 + atom(b"trak", media))
+    path.write_bytes(atom(b"ftyp", b"M4A \0\0\0\0M4A isom") + movie + atom(b"mdat", b""))
+
+    audio = MP4(str(path))
+    audio.add_tags()
+    audio.tags.update({"\xa9nam": ["M4a Song"], "\xa9ART": ["M4a Artist"], "\xa9alb": ["M4a Album"],
+                       "\xa9gen": ["Pop"], "\xa9day": ["2021"], "trkn": [(2, 9)],
+                       "covr": [MP4Cover(art, MP4Cover.FORMAT_JPEG)]})
+    audio.save()
+
+
+@pytest.fixture
+def scanner(tmp_path, monkeypatch):
+    """A database-less scanner that counts how often mutagen opens a file"""
+    parses, original = [], music_scanner.MutagenFile
+
+    def counting_file(*args, **kwargs):
+        parses.append(args[0])
+        return original(*args, **kwargs)
+    monkeypatch.setattr(music_scanner, "MutagenFile", counting_file)
+
+    scanner = MusicScanner(None, cover_folder=str(tmp_path / "covers"), workers=1)
+    scanner.parses = parses
+    return scanner
+
+
+@pytest.mark.parametrize("writer, suffix, expected, codec", [
+    (write_mp3, ".mp3", {"title": "Mp3 Song", "artist": "Mp3 Artist", "album": "Mp3 Album",
+                         "genre": "Rock", "date": "2019", "tracknumber": "4/12"}, "mp3"),
+    (write_flac, ".flac", {"title": "Flac Song", "artist": "Flac Artist", "album": "Flac Album",
+                           "genre": "Jazz", "date": "2020-05-01", "tracknumber": "7"}, "flac"),
+    (write_m4a, ".m4a", {"title": "M4a Song", "artist": "M4a Artist", "album": "M4a Album",
+                         "genre": "Pop", "date": "2021", "tracknumber": "2/9"}, "mp4"),
+])
+def test_one_parse_reads_tags_art_duration_and_codec(scanner, tmp_path, writer, suffix, expected, codec):
+    art = jpeg()
+    path = tmp_path / f"song{suffix}"
+    writer(path, art)
+
+    audio = scanner.read_audio_file(path)
+
+    assert scanner.parses == [str(path)]
+    assert {name: values[0] for name, values in audio["tags"].items() if name in expected} == expected
+    assert audio["art"] == art
+    assert abs(audio["duration_ms"] - 5000) < 100
+    assert audio["codec"]["format"] == codec
+    assert audio["codec"]["sample_rate"] == RATE
+
+
+def test_extract_metadata_parses_each_file_once(scanner, tmp_path):
+    path = tmp_path / "song.m4a"
+    write_m4a(path, jpeg())
+
+    metadata = scanner.extract_metadata(path)
+
+    assert scanner.parses == [str(path)]
+    assert (metadata["title"], metadata["artist"], metadata["album"]) == ("M4a Song", "M4a Artist", "M4a Album")
+    assert (metadata["track_number"], metadata["year"], metadata["genre"]) == (2, 2021, "Pop")
+    assert metadata["cover_hash"] and metadata["image_path"] == f"/artwork/{metadata['cover_hash']}"
+
+
+def test_unrecognised_files_are_skipped(scanner, tmp_path):
+    path = tmp_path / "notes.txt"
+    path.write_bytes(b"plain text, not audio")
+
+    assert scanner.read_audio_file(path) is None
+    assert scanner.extract_metadata(path) is None
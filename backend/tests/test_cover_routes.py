@@ -0,0 +1,65 @@
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+from PIL import Image
+
+from conftest import make_request
+from covers import WEBP_SUPPORTED, CoverStore, pick_format, pick_size
+
+
+def test_sizes_round_up_and_formats_follow_accept():
+    assert [pick_size(size) for size in (None, 1, 64, 100, 640)] == [640, 64, 64, 160, 640]
+    assert pick_format("jpeg", "image/webp") == "jpeg"
+    assert pick_format(None, "text/html") == "jpeg"
+    assert pick_format(None, "image/avif,image/webp,*/*") == ("webp" if WEBP_SUPPORTED else "jpeg")
+
+
+@pytest.fixture
+def album_cover(app_module, db, tmp_path, monkeypatch):
+    """Call the album cover route for an album whose art is an 800px JPEG"""
+    monkeypatch.setattr(app_module, "db", db)
+    monkeypatch.setattr(app_module, "COVER_FOLDER", tmp_path)
+    monkeypatch.setattr(app_module, "cover_store", CoverStore(str(tmp_path)))
+    Image.new("RGB", (800, 800), (10, 120, 200)).save(tmp_path / "album-1.jpg")
+    
+    def call(album_id="album-1", size=None, format=None, v=None, headers=None):
+        return asyncio.run(app_module.get_album_cover(make_request(headers), album_id,
+                                                      size=size, format=format, v=v))
+    return call
+
+
+def test_cover_variants_are_resized_and_revalidated_by_etag(album_cover):
+    response = album_cover(size=100, format="jpeg")
+    assert response.media_type == "image/jpeg"
+    with Image.open(response.path) as image:
+        assert max(image.size) == 160
+    
+    etag = response.headers["ETag"]
+    assert album_cover(size=100, format="jpeg").headers["ETag"] == etag
+    assert album_cover(size=320, format="jpeg").headers["ETag"] != etag
+    
+    cached = album_cover(size=100, format="jpeg", headers={"If-None-Match": etag})
+    assert cached.status_code == 304
+    assert cached.headers["ETag"] == etag
+
+
+def test_negotiated_covers_vary_on_accept(album_cover):
+    negotiated = album_cover(headers={"Accept": "image/webp"})
+    assert negotiated.headers["Vary"] == "Accept"
+    assert negotiated.media_type == ("image/webp" if WEBP_SUPPORTED else "image/jpeg")
+    assert "Vary" not in album_cover(format="jpeg").headers
+
+
+def test_only_urls_naming_the_current_hash_are_immutable(album_cover):
+    digest = album_cover(format="jpeg").headers["ETag"].strip('"')[:12]
+    
+    assert album_cover(format="jpeg", v=digest).headers["Cache-Control"] == "public, max-age=31536000, immutable"
+    assert album_cover(format="jpeg", v="0" * 12).headers["Cache-Control"] == "public, no-cache"
+    assert album_cover(format="jpeg").headers["Cache-Control"] == "public, no-cache"
+
+
+def test_missing_cover_is_a_404(album_cover):
+    with pytest.raises(HTTPException) as error:
+        album_cover(album_id="no-such-album")
+    assert error.value.status_code == 404
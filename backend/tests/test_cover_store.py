@@ -0,0 +1,70 @@
+import asyncio
+import io
+import os
+
+from PIL import Image
+
+import covers
+from conftest import track
+from covers import COVER_SIZES, CoverStore, content_hash
+
+
+def jpeg(color: tuple) -> bytes:
+    buffer = io.BytesIO()
+    Image.new("RGB", (300, 300), color).save(buffer, "JPEG")
+    return buffer.getvalue()
+
+
+def count_calls(monkeypatch, module, name: str) -> list:
+    """Wrap module.name so each call is recorded"""
+    calls, original = [], getattr(module, name)
+    
+    def wrapper(*args, **kwargs):
+        calls.append(args)
+        return original(*args, **kwargs)
+    monkeypatch.setattr(module, name, wrapper)
+    return calls
+
+
+def test_identical_art_is_stored_and_rendered_once(tmp_path, monkeypatch):
+    renders = count_calls(monkeypatch, covers, "render_variants")
+    store = CoverStore(str(tmp_path))
+    red, blue = jpeg((200, 0, 0)), jpeg((0, 0, 200))
+    
+    digest = store.render(red)
+    assert store.render(red) == digest == content_hash(red)
+    assert store.render(blue) != digest
+    assert len(renders) == 2
+    assert store.has_variants(digest)
+    assert store.variant_path(digest, COVER_SIZES[0], "jpeg").exists()
+
+
+def test_equal_files_share_variants_and_are_hashed_once_until_changed(tmp_path, monkeypatch):
+    store = CoverStore(str(tmp_path / "store"))
+    first, second = tmp_path / "a.jpg", tmp_path / "b.jpg"
+    first.write_bytes(jpeg((0, 150, 0)))
+    second.write_bytes(first.read_bytes())
+    
+    async def variant(path):
+        return await store.variant(path, 160, "jpeg")
+    renders = count_calls(monkeypatch, covers, "render_variants")
+    a_path, a_digest = asyncio.run(variant(first))[:2]
+    b_path, b_digest = asyncio.run(variant(second))[:2]
+    assert (a_path, a_digest) == (b_path, b_digest)
+    assert a_path.exists() and len(renders) == 1
+    
+    hashes = count_calls(monkeypatch, covers, "content_hash")
+    store.source_hash(first)
+    assert hashes == []
+    first.write_bytes(jpeg((0, 0, 0)))
+    os.utime(first, ns=(0, first.stat().st_mtime_ns + 10**9))
+    assert store.source_hash(first) != a_digest
+    assert len(hashes) == 1
+
+
+def test_tracks_sharing_art_share_one_cover_row(db):
+    digest = "ab" * 20
+    db.add_tracks([track("a", "/music/a.mp3", cover_hash=digest), track("b", "/music/b.mp3", cover_hash=digest)])
+    
+    assert [row[0] for row in db._reader().execute("SELECT hash FROM covers")] == [digest]
+    assert db.get_album_cover_hash("album-Artist") == digest
@@ -0,0 +1,34 @@
+from conftest import track
+
+
+def query_plans(connection, run) -> list:
+    """EXPLAIN QUERY PLAN of every SELECT that run() issues on connection, one string per statement"""
+    statements = []
+    connection.set_trace_callback(statements.append)
+    try:
+        run()
+    finally:
+        connection.set_trace_callback(None)
+    return [" | ".join(row[3] for row in connection.execute(f"EXPLAIN QUERY PLAN {sql}"))
+            for sql in statements if sql.lstrip().upper().startswith("SELECT")]
+
+
+def test_unavailable_tracks_are_hidden_by_the_stored_flag(db):
+    db.add_tracks([track("a", "/music/a.mp3", title="A"), track("b", "/music/b.mp3", title="B")])
+    # Neither file exists; listings trust the flag rather than the disk
+    assert [row["id"] for row in db.get_tracks()] == ["a", "b"]
+    
+    assert db.set_tracks_available(["/music/b.mp3"], False) == 1
+    assert db.get_track_availability() == {"/music/a.mp3": True, "/music/b.mp3": False}
+    assert [row["id"] for row in db.get_tracks()] == ["a"]
+    assert [row["id"] for row in db.get_tracks(only_available=False)] == ["a", "b"]
+
+
+def test_track_listing_reads_the_availability_index_in_title_order(db):
+    db.add_tracks([track(f"t{i}", f"/music/{i}.mp3", title=f"Song {i}") for i in range(20)])
+    
+    plans = query_plans(db._reader(), lambda: db.get_tracks(limit=5))
+    assert plans, "get_tracks ran no query"
+    assert "USING INDEX idx_tracks_available_title" in plans[0]
+    # The index already yields title order, so no sort pass is needed
+    assert "TEMP B-TREE" not in plans[0]
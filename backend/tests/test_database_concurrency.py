@@ -0,0 +1,45 @@
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from conftest import track
+
+
+def test_database_uses_wal(db):
+    assert db._reader().execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+
+
+def test_reads_proceed_while_a_write_transaction_is_open(db):
+    db.add_tracks([track("a", "/music/a.mp3", title="A")])
+    in_transaction, release = threading.Event(), threading.Event()
+    
+    def write():
+        with db._writer() as cursor:
+            cursor.execute("UPDATE tracks SET title = 'Changed' WHERE id = 'a'")
+            in_transaction.set()
+            release.wait(5)
+    
+    writer = threading.Thread(target=write)
+    writer.start()
+    try:
+        assert in_transaction.wait(5)
+        
+        async def read_concurrently():
+            return await asyncio.gather(*(db.aio.get_tracks() for _ in range(4)))
+        # Readers neither block on the writer nor see its uncommitted change
+        results = asyncio.run(asyncio.wait_for(read_concurrently(), timeout=5))
+        assert all([row["name"] for row in rows] == ["A"] for rows in results)
+    finally:
+        release.set()
+        writer.join()
+    
+    assert db.get_track("a")["name"] == "Changed"
+
+
+def test_concurrent_writers_are_serialized(db):
+    batches = [[track(f"{batch}-{i}", f"/music/{batch}-{i}.mp3") for i in range(20)] for batch in range(8)]
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        list(pool.map(db.add_tracks, batches))
+    
+    assert len(db.get_tracks(limit=500)) == 160
+    assert db.get_album("album-Artist")["total_tracks"] == 160
@@ -0,0 +1,46 @@
+from conftest import track
+
+
+def counts(db) -> tuple:
+    """Stored ({album_id: total_tracks}, {artist_id: (total_tracks, total_albums)})"""
+    cursor = db.conn.cursor()
+    cursor.execute("SELECT id, total_tracks FROM albums")
+    albums = dict(cursor.fetchall())
+    cursor.execute("SELECT id, total_tracks, total_albums FROM artists")
+    return albums, {row[0]: tuple(row[1:]) for row in cursor.fetchall()}
+
+
+def test_counters_follow_added_tracks(db):
+    db.add_tracks([track("a", "/music/a.mp3"), track("b", "/music/b.mp3"),
+                   track("c", "/music/c.mp3", artist="Other")])
+    # Re-adding a known track updates it without counting it again
+    db.add_tracks([track("a", "/music/a.mp3", title="Renamed")])
+    
+    albums, artists = counts(db)
+    assert albums == {"album-Artist": 2, "album-Other": 1}
+    assert artists == {"artist-Artist": (2, 1), "artist-Other": (1, 1)}
+    assert db.get_album("album-Artist")["total_tracks"] == 2
+
+
+def test_counters_follow_tracks_moving_between_albums_and_removals(db):
+    db.add_tracks([track("a", "/music/a.mp3"), track("b", "/music/b.mp3")])
+    db.add_tracks([track("b", "/music/b.mp3", album="Second", album_id="album-second")])
+    albums, artists = counts(db)
+    assert albums == {"album-Artist": 1, "album-second": 1}
+    assert artists == {"artist-Artist": (2, 2)}
+    
+    db.remove_files(["/music/a.mp3"])
+    albums, artists = counts(db)
+    assert albums.get("album-Artist", 0) == 0 and albums["album-second"] == 1
+    assert artists == {"artist-Artist": (1, 1)}
+
+
+def test_reconcile_counts_repairs_drift(db):
+    db.add_tracks([track("a", "/music/a.mp3"), track("b", "/music/b.mp3")])
+    db.conn.execute("UPDATE albums SET total_tracks = 7")
+    db.conn.commit()
+    
+    assert db.reconcile_counts()["drifted"] == 1
+    db.reconcile_counts(repair=True)
+    assert db.reconcile_counts()["drifted"] == 0
+    assert counts(db)[0] == {"album-Artist": 2}
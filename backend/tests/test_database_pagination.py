@@ -0,0 +1,64 @@
+import pytest
+
+from conftest import track
+
+
+def collect_pages(fetch, limit: int) -> list:
+    """Follow next cursors from the first page to the last, returning the pages"""
+    pages, cursor = [], None
+    while True:
+        rows, cursor = fetch(limit=limit, cursor=cursor)
+        pages.append(rows)
+        if cursor is None:
+            return pages
+
+
+def test_cursor_round_trip(db):
+    cursor = db._encode_cursor(["Señor / \"quoted\"", "id-1"])
+    assert "=" not in cursor
+    assert db._decode_cursor(cursor) == ["Señor / \"quoted\"", "id-1"]
+    assert db._decode_cursor(None) is None
+    assert db._decode_cursor("") is None
+
+
+@pytest.mark.parametrize("cursor", ["not base64!", "e30", "WzFd"])
+def test_malformed_cursors_are_rejected(db, cursor):
+    with pytest.raises(ValueError):
+        db._decode_cursor(cursor)
+
+
+def test_track_pages_cover_every_track_once_with_tied_titles(db):
+    # Equal titles are ordered by id, so page boundaries inside a tie lose nothing
+    db.add_tracks([track(f"t{i}", f"/music/{i}.mp3", title=("Same" if i % 2 else f"Song {i}"))
+                   for i in range(7)])
+    
+    pages = collect_pages(db.get_tracks_page, limit=3)
+    assert [len(page) for page in pages] == [3, 3, 1]
+    ordered = [(row["name"], row["id"]) for page in pages for row in page]
+    assert ordered == sorted(ordered)
+    assert len(set(ordered)) == 7
+
+
+def test_track_pages_skip_unavailable_tracks_and_filter_by_search(db):
+    db.add_tracks([track("a", "/music/a.mp3", title="Blue Monday"),
+                   track("b", "/music/b.mp3", title="Blue Velvet"),
+                   track("c", "/music/c.mp3", title="Red Rain")])
+    db.set_tracks_available(["/music/b.mp3"], False)
+    
+    assert [row["id"] for page in collect_pages(db.get_tracks_page, 1) for row in page] == ["a", "c"]
+    rows, cursor = db.get_tracks_page(search="blue", only_available=False)
+    assert [row["id"] for row in rows] == ["a", "b"] and cursor is None
+
+
+def test_album_and_playlist_pages(db):
+    db.add_tracks([track(f"t{i}", f"/music/{i}.mp3", artist=f"Artist {i}") for i in range(5)])
+    album_pages = collect_pages(db.get_albums_page, limit=2)
+    assert [row["id"] for page in album_pages for row in page] == [f"album-Artist {i}" for i in range(5)]
+    
+    playlist = db.create_playlist("Mix")
+    for track_id in ("t3", "t1", "t4"):
+        db.add_track_to_playlist(playlist["id"], track_id)
+    
+    def fetch(limit, cursor):
+        return db.get_playlist_tracks_page(playlist["id"], limit=limit, cursor=cursor)
+    assert [item["track"]["id"] for page in collect_pages(fetch, 2) for item in page] == ["t3", "t1", "t4"]
@@ -0,0 +1,57 @@
+from conftest import track
+
+
+def ids(rows: list) -> list:
+    return [row["id"] for row in rows]
+
+
+def on_disk(tmp_path, name: str) -> str:
+    """Path of an (empty) file that exists, so the track counts as available"""
+    path = tmp_path / name
+    path.touch()
+    return str(path)
+
+
+def test_title_matches_rank_above_artist_and_genre_matches(db, tmp_path):
+    db.add_tracks([
+        track("genre", on_disk(tmp_path, "1.mp3"), title="Something", artist="Someone", genre="Night Jazz"),
+        track("artist", on_disk(tmp_path, "2.mp3"), title="Other", artist="Night Riders"),
+        track("title", on_disk(tmp_path, "3.mp3"), title="Night Drive", artist="Band"),
+    ])
+    
+    assert ids(db.get_tracks(search="night")) == ["title", "artist", "genre"]
+
+
+def test_search_is_prefix_accent_and_case_insensitive(db, tmp_path):
+    db.add_tracks([track("a", on_disk(tmp_path, "a.mp3"), title="Déjà Vu", artist="Beyoncé"),
+                   track("b", on_disk(tmp_path, "b.mp3"), title="Halo", artist="Beyoncé")])
+    
+    assert ids(db.get_tracks(search="DEJA")) == ["a"]
+    assert ids(db.get_tracks(search="beyon vu")) == ["a"]
+    assert set(ids(db.get_tracks(search="beyonce"))) == {"a", "b"}
+    # Punctuation alone is no query at all
+    assert db.get_tracks(search="!!") == []
+
+
+def test_index_follows_track_updates_and_removals(db, tmp_path):
+    path = on_disk(tmp_path, "a.mp3")
+    db.add_tracks([track("a", path, title="Old Name")])
+    db.add_tracks([track("a", path, title="New Name")])
+    assert db.get_tracks(search="old") == []
+    assert ids(db.get_tracks(search="new")) == ["a"]
+    
+    db.remove_files([path])
+    assert db.get_tracks(search="new", only_available=False) == []
+
+
+def test_search_all_returns_albums_and_artists_whose_own_name_matches(db, tmp_path):
+    db.add_tracks([
+        track("a", on_disk(tmp_path, "a.mp3"), title="Wonderwall", artist="Oasis", album="Morning Glory"),
+        track("b", on_disk(tmp_path, "b.mp3"), title="Morning", artist="Beck", album="Sea Change"),
+    ])
+    
+    results = db.search_all("morning")
+    assert ids(results["tracks"]) == ["b", "a"]
+    assert ids(results["albums"]) == ["album-Oasis"]
+    assert results["artists"] == []
+    assert ids(db.search_all("oasis")["artists"]) == ["artist-Oasis"]
@@ -0,0 +1,82 @@
+import asyncio
+
+from conftest import track
+from music_scanner import MusicScanner
+
+
+def test_add_tracks_replaces_a_file_indexed_under_another_id(db):
+    db.add_tracks([track("old-id", "/music/a.mp3", title="A")])
+    written = db.add_tracks([
+        track("new-id", "/music/a.mp3", title="A"),
+        track("b", "/music/b.mp3", title="B"),
+        track("c", "/music/c.mp3", title="C"),
+    ])
+    
+    assert written == ["new-id", "b", "c"]
+    ids = {row["id"] for row in db.get_tracks(limit=10)}
+    assert ids == {"new-id", "b", "c"}
+
+
+def test_add_tracks_keeps_the_rest_of_a_batch_when_one_row_fails(db):
+    # Two batch tracks for one file can't both be stored; the unrelated track still is
+    written = db.add_tracks([
+        track("a", "/music/a.mp3"),
+        track("a2", "/music/a.mp3"),
+        track("b", "/music/b.mp3"),
+    ])
+    
+    assert written == ["a", "b"]
+    assert {row["id"] for row in db.get_tracks(limit=10)} == {"a", "b"}
+    assert db.get_album("album-Artist")["total_tracks"] == 2
+
+
+def test_add_tracks_updates_counters(db):
+    db.add_tracks([track("a", "/music/a.mp3"), track("b", "/music/b.mp3")])
+    db.add_tracks([track("a", "/music/a.mp3")])
+    
+    assert db.get_album("album-Artist")["total_tracks"] == 2
+    assert db.reconcile_counts()["drifted"] == 0
+
+
+def test_flush_batch_only_records_stored_files(db, tmp_path):
+    scanner = MusicScanner(db, cover_folder=str(tmp_path / "covers"), workers=1)
+    status = {"processed": 0, "failed": 0}
+    pending = [
+        (track("a", "/music/a.mp3"), [("/music/a.mp3", 1, 1, 1)]),
+        (track("a2", "/music/a.mp3"), [("/music/a.mp3", 1, 1, 1)]),
+        (track("b", "/music/b.mp3"), [("/music/b.mp3", 2, 2, 2)]),
+        (None, [("/music/broken.mp3", 3, 3, 3)]),
+    ]
+    
+    assert asyncio.run(scanner._flush_batch(pending, status)) == 2
+    assert status == {"processed": 3, "failed": 1}
+    assert set(db.get_file_manifest()) == {"/music/a.mp3", "/music/b.mp3", "/music/broken.mp3"}
+
+
+def test_has_lyrics_is_kept_on_write(db):
+    db.add_tracks([
+        track("a", "/music/a.mp3", lyrics="[00:01.00] Hello"),
+        track("b", "/music/b.mp3", lyrics=""),
+        track("c", "/music/c.mp3"),
+    ])
+    
+    listed = {row["id"]: row["has_lyrics"] for row in db.get_tracks(limit=10)}
+    assert listed == {"a": True, "b": False, "c": False}
+    assert db.get_track("b")["lyrics"] is None
+    
+    db.update_track_lyrics("a", "")
+    db.update_track_lyrics("c", "[00:02.00] Hi")
+    listed = {row["id"]: row["has_lyrics"] for row in db.get_tracks(limit=10)}
+    assert listed == {"a": False, "b": False, "c": True}
+
+
+def test_folder_cover_hash_survives_a_rescan_until_the_cover_changes(db):
+    db.set_folder_assets({"/music/A": {"cover.jpg": (10, 1)}}, trees=["/music"])
+    assert db.get_folder_covers_without_hash() == ["/music/A"]
+    db.set_folder_cover_hashes({"/music/A": "a" * 40})
+    
+    db.set_folder_assets({"/music/A": {"cover.jpg": (10, 1)}}, trees=["/music"])
+    assert db.get_folder_covers_without_hash() == []
+    
+    db.set_folder_assets({"/music/A": {"cover.jpg": (12, 2)}}, trees=["/music"])
+    assert db.get_folder_covers_without_hash() == ["/music/A"]
@@ -0,0 +1,35 @@
+import pytest
+
+from conftest import track
+
+
+@pytest.mark.parametrize("title, artist", [
+    ("Bohemian Rhapsody (Official Video)", "Queen"),
+    ("Bohemian Rhapsody [Remastered HD]", "Queen - Topic"),
+    ("bohemian rhapsody - lyrics", "QueenVEVO"),
+    ("Bohemian  Rhapsody!", "Queen feat. Someone"),
+    ("Bohemian Rhapsody ft. Someone", "queen"),
+])
+def test_match_keys_strip_release_noise(db, title, artist):
+    assert db.match_keys(title, artist) == ("bohemian rhapsody", "queen")
+
+
+def test_match_keys_keep_meaningful_words(db):
+    assert db.match_keys("Lyrics of Love", "Artist") == ("lyrics of love", "artist")
+    assert db.match_keys("Café del Mar", "Énergie") == ("cafe del mar", "energie")
+    assert db.match_keys(None, None) == ("", "")
+
+
+def test_check_duplicate_track_prefers_the_closest_duration(db):
+    db.add_tracks([
+        track("long", "/music/long.mp3", title="Song (Official Audio)", duration_ms=184000),
+        track("close", "/music/close.mp3", title="Song", duration_ms=181000),
+        track("unknown", "/music/unknown.mp3", title="song", duration_ms=0),
+    ])
+    
+    # Only the columns the download handler needs, not the lyrics
+    assert db.check_duplicate_track("Song [Lyrics]", "Artist - Topic", duration_ms=180000) == {
+        "id": "close", "title": "Song", "artist": "Artist", "duration_ms": 181000}
+    # Too far from every known length, so only the track of unknown length remains
+    assert db.check_duplicate_track("Song", "Artist", duration_ms=240000)["id"] == "unknown"
+    assert db.check_duplicate_track("Other Song", "Artist", duration_ms=180000) is None
@@ -0,0 +1,60 @@
+import asyncio
+import shutil
+
+import numpy as np
+
+from conftest import track, write_wav
+from fingerprint import FingerprintIndex, bit_error_rate, compute_fingerprint
+
+
+def test_bit_error_rate_is_zero_for_identical_and_high_for_unrelated():
+    rng = np.random.default_rng(1)
+    a = rng.integers(0, 2**32, 200, dtype=np.uint64).astype(np.uint32)
+    b = rng.integers(0, 2**32, 200, dtype=np.uint64).astype(np.uint32)
+    assert bit_error_rate(a, a) == 0.0
+    assert bit_error_rate(a, b) > 0.4
+
+
+def test_bit_error_rate_finds_shifted_alignment():
+    rng = np.random.default_rng(2)
+    a = rng.integers(0, 2**32, 200, dtype=np.uint64).astype(np.uint32)
+    assert bit_error_rate(a[3:], a) == 0.0
+
+
+def test_compute_fingerprint_rejects_short_audio():
+    try:
+        compute_fingerprint(np.zeros(100, dtype=np.float32))
+    except ValueError:
+        return
+    raise AssertionError("expected ValueError")
+
+
+def test_fingerprinted_file_is_not_its_own_duplicate(db, tmp_path):
+    original = write_wav(tmp_path / "song.wav")
+    copy = tmp_path / "copy.wav"
+    shutil.copy(original, copy)
+    db.add_tracks([track("t1", str(original))])
+    index = FingerprintIndex(db, workers=1)
+    
+    async def run():
+        assert await index.index_track("t1", str(original))
+        return (await index.find_matches(str(original), exclude="t1"),
+                await index.find_matches(str(copy), exclude="t-copy"))
+    
+    own, other = asyncio.run(run())
+    assert own == []
+    assert [match["track_id"] for match in other] == ["t1"]
+    assert other[0]["bit_error_rate"] == 0.0
+
+
+def test_unrelated_recordings_do_not_match(db, tmp_path):
+    first = write_wav(tmp_path / "first.wav", seed=1)
+    second = write_wav(tmp_path / "second.wav", seed=2)
+    db.add_tracks([track("t1", str(first))])
+    index = FingerprintIndex(db, workers=1)
+    
+    async def run():
+        await index.index_track("t1", str(first))
+        return await index.find_matches(str(second))
+    
+    assert asyncio.run(run()) == []
@@ -0,0 +1,95 @@
+import asyncio
+import os
+
+import pytest
+
+import hls
+from hls import HlsSegmenter, SegmentNotFound, VariantEncode
+from transcoder import TranscodeCache
+
+FAKE_FFMPEG = """#!/bin/sh
+# Writes two segments next to the output pattern (the last argument) and lists them
+for last; do :; done
+dir=$(dirname "$last")
+printf 'first' > "$dir/0.ts.part"; echo "0.ts.part,0.000000,4.010000"
+printf 'second' > "$dir/1.ts.part"; echo "1.ts.part,4.010000,5.500000"
+"""
+
+
+def extinf(playlist: str) -> list:
+    return [float(line[len("#EXTINF:"):-1]) for line in playlist.splitlines() if line.startswith("#EXTINF:")]
+
+
+def test_parse_variant_accepts_only_the_ladder():
+    assert hls.parse_variant("original-128") == ("original", 128)
+    assert hls.parse_variant("enhanced-64") == ("enhanced", 64)
+    assert hls.parse_variant("original-100") is None
+    assert hls.parse_variant("remix-128") is None
+
+
+def test_master_playlist_lists_every_bitrate():
+    playlist = hls.master_playlist("original")
+    assert [line for line in playlist.splitlines() if not line.startswith("#")] == \
+        [f"original-{bitrate}/index.m3u8" for bitrate in hls.LADDER]
+
+
+def test_media_playlist_from_duration_ends_with_a_partial_segment():
+    playlist = hls.media_playlist(10_500, "v1", segment_seconds=4)
+    assert extinf(playlist) == [4.0, 4.0, 2.5]
+    assert "#EXT-X-TARGETDURATION:4" in playlist
+    assert "2.ts?v=v1" in playlist and "3.ts?v=v1" not in playlist
+    assert playlist.rstrip().endswith("#EXT-X-ENDLIST")
+
+
+def test_media_playlist_prefers_encoded_timings():
+    # A stale scanned duration is ignored once the real segments are known
+    playlist = hls.media_playlist(60_000, "v1", segment_seconds=4, timings=[4.02, 1.5])
+    assert extinf(playlist) == [4.02, 1.5]
+    assert "#EXT-X-TARGETDURATION:5" in playlist
+
+
+def test_wait_for_tells_a_missing_segment_from_a_failed_encode():
+    async def run():
+        finished = VariantEncode()
+        await finished.mark(0)
+        await finished.mark()
+        await finished.wait_for(0)
+        with pytest.raises(SegmentNotFound):
+            await finished.wait_for(5)
+        
+        failed = VariantEncode()
+        await failed.mark(error="boom")
+        with pytest.raises(RuntimeError, match="boom"):
+            await failed.wait_for(0)
+    asyncio.run(run())
+
+
+def test_encode_records_segment_timings(tmp_path, monkeypatch):
+    bin_dir = tmp_path / "bin"
+    bin_dir.mkdir()
+    ffmpeg = bin_dir / "ffmpeg"
+    ffmpeg.write_text(FAKE_FFMPEG)
+    ffmpeg.chmod(0o755)
+    monkeypatch.setenv("PATH", f"{bin_dir}{os.pathsep}{os.environ.get('PATH', '')}")
+    
+    source = tmp_path / "song.flac"
+    source.write_bytes(b"audio")
+    stat_result = source.stat()
+    
+    async def run():
+        segmenter = HlsSegmenter(TranscodeCache(str(tmp_path / "cache")), segment_seconds=4)
+        assert await segmenter.timings(source, stat_result, 128) is None
+        
+        timings = await segmenter.timings(source, stat_result, 128, wait=True)
+        path = await segmenter.segment(source, stat_result, 128, 1)
+        with pytest.raises(SegmentNotFound):
+            await segmenter.segment(source, stat_result, 128, 2)
+        
+        # A restarted server reads the timings back from the cache
+        reloaded = HlsSegmenter(TranscodeCache(str(tmp_path / "cache")), segment_seconds=4)
+        return timings, path, await reloaded.timings(source, stat_result, 128)
+    
+    timings, path, reloaded = asyncio.run(run())
+    assert timings == pytest.approx([4.01, 1.49])
+    assert path.read_bytes() == b"second"
+    assert reloaded == timings
@@ -0,0 +1,53 @@
+import asyncio
+
+from conftest import write_wav
+from music_scanner import MusicScanner
+
+
+def scan(scanner: MusicScanner, folder) -> dict:
+    async def run():
+        await scanner.scan_folder(str(folder))
+        return scanner.get_scan_status()
+    return asyncio.run(run())
+
+
+def test_classify_changes(tmp_path):
+    scanner = MusicScanner(None, cover_folder=str(tmp_path / "covers"), workers=1)
+    album = tmp_path / "Album"
+    album.mkdir()
+    (album / "notes.txt").write_text("", encoding="utf-8")
+    new_tree = tmp_path / "New"
+    new_tree.mkdir()
+    
+    folders, trees, forced = scanner._classify_changes([
+        str(album / "song.mp3"),
+        str(album / "cover.jpg"),
+        str(album / "notes.txt"),
+        str(tmp_path / "Other" / "lyrics.lrc"),
+        str(new_tree),
+        str(tmp_path / "Deleted"),
+    ])
+    
+    assert folders == {album, tmp_path / "Other"}
+    assert trees == {new_tree, tmp_path / "Deleted"}
+    assert forced == {tmp_path / "Other"}
+
+
+def test_scan_changes_indexes_new_files_and_drops_deleted_folders(db, tmp_path):
+    music = tmp_path / "music"
+    old = music / "Old"
+    old.mkdir(parents=True)
+    write_wav(old / "Artist - Old.wav", seconds=1)
+    scanner = MusicScanner(db, cover_folder=str(tmp_path / "covers"), workers=1)
+    scan(scanner, music)
+    
+    new = music / "New"
+    new.mkdir()
+    write_wav(new / "Artist - New.wav", seconds=1, seed=1)
+    for path in old.iterdir():
+        path.unlink()
+    old.rmdir()
+    
+    status = asyncio.run(scanner.scan_changes([str(new / "Artist - New.wav"), str(old)]))
+    assert status == {"processed": 1, "failed": 0, "removed": 1}
+    assert [row["name"] for row in db.get_tracks(limit=10)] == ["New"]
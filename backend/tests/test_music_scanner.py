@@ -0,0 +1,88 @@
+import asyncio
+
+import music_scanner
+from conftest import write_wav
+from music_scanner import MusicScanner
+
+
+def collect(scanner: MusicScanner, files: list, sidecars: dict = None) -> list:
+    async def run():
+        return [item async for item in scanner._extract_all(files, sidecars)]
+    return asyncio.run(run())
+
+
+def test_small_batches_are_extracted_without_a_process_pool(tmp_path, monkeypatch):
+    def no_pool(*args, **kwargs):
+        raise AssertionError("process pool started for a small batch")
+    monkeypatch.setattr(music_scanner, "ProcessPoolExecutor", no_pool)
+    
+    scanner = MusicScanner(None, cover_folder=str(tmp_path / "covers"), workers=8)
+    files = [(tmp_path / f"{name}.mp3", None) for name in ("a", "b")]
+    for path, _ in files:
+        path.write_bytes(b"not audio")
+    
+    results = collect(scanner, files)
+    assert [item for item, _ in results] == files
+    assert all(metadata is None or isinstance(metadata, Exception) for _, metadata in results)
+
+
+def scan(scanner: MusicScanner, folder) -> dict:
+    async def run():
+        await scanner.scan_folder(str(folder))
+        return scanner.get_scan_status()
+    return asyncio.run(run())
+
+
+def test_albums_with_only_a_folder_cover_get_a_palette(db, tmp_path):
+    from PIL import Image
+    
+    album = tmp_path / "music" / "Album"
+    album.mkdir(parents=True)
+    write_wav(album / "Artist - Song.wav", seconds=1)
+    Image.new("RGB", (200, 200), (200, 30, 30)).save(album / "cover.jpg")
+    
+    scanner = MusicScanner(db, cover_folder=str(tmp_path / "covers"), workers=1)
+    assert scan(scanner, tmp_path / "music")["processed"] == 1
+    
+    track = db.get_tracks(limit=1)[0]
+    assert track["album"]["dominant_color"] is not None
+    red, green, blue = (int(track["album"]["dominant_color"][i:i + 2], 16) for i in (1, 3, 5))
+    assert red > 150 and green < 80 and blue < 80
+    assert db.get_album(track["album"]["id"])["dominant_color"] == track["album"]["dominant_color"]
+
+
+def test_rescan_reads_a_lyrics_file_added_since_the_last_scan(db, tmp_path):
+    album = tmp_path / "music" / "Album"
+    album.mkdir(parents=True)
+    write_wav(album / "Artist - Song.wav", seconds=1)
+    scanner = MusicScanner(db, cover_folder=str(tmp_path / "covers"), workers=1)
+    
+    scan(scanner, tmp_path / "music")
+    track_id = db.get_tracks(limit=1)[0]["id"]
+    assert db.get_track(track_id)["lyrics"] is None
+    
+    (album / "lyrics.lrc").write_text("[00:01.00] Hello", encoding="utf-8")
+    assert scan(scanner, tmp_path / "music")["processed"] == 1
+    assert db.get_track(track_id)["lyrics"] == "[00:01.00] Hello"
+    
+    assert scan(scanner, tmp_path / "music")["processed"] == 0
+
+
+def test_lyrics_are_read_only_where_the_walk_found_them(tmp_path, monkeypatch):
+    folder = tmp_path / "Album"
+    folder.mkdir()
+    song = folder / "Artist - Song.wav"
+    write_wav(song, seconds=1)
+    (folder / "lyrics.lrc").write_text("[00:01.00] Hello", encoding="utf-8")
+    scanner = MusicScanner(None, cover_folder=str(tmp_path / "covers"), workers=1)
+    
+    def no_stat(self, *args, **kwargs):
+        raise AssertionError("lyrics file checked per track")
+    monkeypatch.setattr(type(folder), "exists", no_stat)
+    
+    found = collect(scanner, [(song, None)], {folder: {"lyrics.lrc": (16, 0)}})
+    assert found[0][1]["lyrics"] == "[00:01.00] Hello"
+    
+    # A walk that saw no lyrics file is trusted without opening one
+    missing = collect(scanner, [(song, None)], {folder: {}})
+    assert missing[0][1]["lyrics"] is None
@@ -0,0 +1,64 @@
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+
+from conftest import make_request, track
+
+
+@pytest.fixture
+def prefetcher(app_module, monkeypatch):
+    """The app's prefetcher with its dedupe window cleared and warm() recording its calls"""
+    prefetcher = app_module.prefetcher
+    warmed = []
+    
+    async def warm(track_id, quality="standard", codec=None, bitrate=None):
+        warmed.append((track_id, quality, codec, bitrate))
+    monkeypatch.setattr(prefetcher, "_recent", {})
+    monkeypatch.setattr(prefetcher, "warm", warm)
+    monkeypatch.setattr(prefetcher, "warmed", warmed, raising=False)
+    return prefetcher
+
+
+def test_schedule_dedupes_recent_hints_and_caps_the_batch(prefetcher):
+    async def run():
+        first = prefetcher.schedule(["a", "", "b", "c", "d", "e", "f", "g"])
+        again = prefetcher.schedule(["a", "b"])
+        other_variant = prefetcher.schedule(["a"], codec="opus", bitrate=96)
+        await asyncio.gather(*prefetcher._tasks)
+        return first, again, other_variant
+    
+    # The first max_tracks ids are taken, blanks skipped; a repeat hint is free
+    assert asyncio.run(run()) == (4, 0, 1)
+    assert [call[0] for call in prefetcher.warmed] == ["a", "b", "c", "d", "a"]
+    assert prefetcher.warmed[-1] == ("a", "standard", "opus", 96)
+
+
+def test_stream_request_schedules_the_prefetch_header(app_module, prefetcher, db, monkeypatch):
+    monkeypatch.setattr(app_module, "db", db)
+    request = make_request({"X-Prefetch-Tracks": "next-1, next-2 ,,next-3"})
+    
+    async def run():
+        with pytest.raises(HTTPException) as error:
+            await app_module.stream_track(request, "missing", quality="enhanced", codec=None, bitrate=None)
+        await asyncio.gather(*prefetcher._tasks)
+        return error.value.status_code
+    
+    # Hints are scheduled even when the requested track itself can't be played
+    assert asyncio.run(run()) == 404
+    assert prefetcher.warmed == [(track_id, "enhanced", None, None) for track_id in ("next-1", "next-2", "next-3")]
+
+
+def test_warm_reads_ahead_and_fills_the_hot_cache(app_module, db, tmp_path, monkeypatch):
+    song = tmp_path / "song.mp3"
+    song.write_bytes(b"x" * 1024)
+    db.add_tracks([track("a", str(song))])
+    
+    prefetcher = app_module.prefetcher
+    warmed = []
+    monkeypatch.setattr(prefetcher, "db", db)
+    monkeypatch.setattr(prefetcher.stream_cache, "warm", lambda path, stat_result: warmed.append(path))
+    
+    asyncio.run(prefetcher.warm("a"))
+    asyncio.run(prefetcher.warm("missing"))
+    assert warmed == [song]
@@ -0,0 +1,58 @@
+import asyncio
+
+import music_scanner
+from music_scanner import MusicScanner
+
+
+def scanner_at(tmp_path, monkeypatch, now: float, **status) -> MusicScanner:
+    """A scanner whose status holds the given counters, with the clock stopped at now"""
+    scanner = MusicScanner(None, cover_folder=str(tmp_path / "covers"), workers=1)
+    scanner.scan_status.update(status)
+    monkeypatch.setattr(music_scanner.time, "time", lambda: now)
+    return scanner
+
+
+def test_idle_status_has_no_progress(tmp_path):
+    status = MusicScanner(None, cover_folder=str(tmp_path / "covers"), workers=1).get_scan_status()
+    assert status["state"] == "idle"
+    assert (status["elapsed_seconds"], status["files_per_second"], status["eta_seconds"]) == (0, 0.0, None)
+
+
+def test_running_scan_reports_throughput_and_eta(tmp_path, monkeypatch):
+    scanner = scanner_at(tmp_path, monkeypatch, 120.0, state="running", started_at=100.0,
+                         to_process=100, processed=30, failed=10)
+    
+    status = scanner.get_scan_status()
+    assert status["elapsed_seconds"] == 20.0
+    assert status["files_per_second"] == 2.0
+    # 60 files left at 2 files a second
+    assert status["eta_seconds"] == 30.0
+
+
+def test_finished_scan_keeps_its_elapsed_time_and_drops_the_eta(tmp_path, monkeypatch):
+    scanner = scanner_at(tmp_path, monkeypatch, 500.0, state="completed", started_at=100.0, finished_at=110.0,
+                         to_process=20, processed=20)
+    
+    status = scanner.get_scan_status()
+    assert status["elapsed_seconds"] == 10.0
+    assert status["files_per_second"] == 2.0
+    assert status["eta_seconds"] is None
+
+
+def test_background_scan_is_started_once_and_completes(db, tmp_path):
+    music = tmp_path / "music"
+    music.mkdir()
+    (music / "broken.mp3").write_bytes(b"not audio")
+    scanner = MusicScanner(db, cover_folder=str(tmp_path / "covers"), workers=1)
+    
+    async def run():
+        task = scanner.start_background_scan(str(music))
+        assert scanner.start_background_scan(str(music)) is task
+        await task
+    asyncio.run(run())
+    
+    status = scanner.get_scan_status()
+    assert status["state"] == "completed"
+    assert (status["files_seen"], status["to_process"]) == (1, 1)
+    assert status["processed"] + status["failed"] == 1
+    assert status["finished_at"] is not None and status["eta_seconds"] is None
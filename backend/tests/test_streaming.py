@@ -0,0 +1,59 @@
+import asyncio
+import os
+
+import pytest
+
+from streaming import RangedFileResponse, RangeNotSatisfiable, ShortRead, parse_range_header
+
+
+def test_parse_range_header_merges_overlapping_ranges():
+    assert parse_range_header("bytes=0-9,5-19,30-", 100) == [(0, 19), (30, 99)]
+    assert parse_range_header("bytes=-10", 100) == [(90, 99)]
+    assert parse_range_header("bytes=50-500", 100) == [(50, 99)]
+
+
+def test_parse_range_header_ignores_malformed_and_foreign_units():
+    assert parse_range_header("items=0-1", 100) is None
+    assert parse_range_header("bytes=9-2", 100) is None
+    assert parse_range_header("bytes=-", 100) is None
+
+
+def test_parse_range_header_rejects_ranges_past_the_end():
+    with pytest.raises(RangeNotSatisfiable):
+        parse_range_header("bytes=200-300", 100)
+
+
+def send_response(response: RangedFileResponse, messages: list):
+    """Run the response as an ASGI app whose client never disconnects, collecting sent messages"""
+    async def receive():
+        await asyncio.sleep(3600)
+    
+    async def send(message):
+        messages.append(message)
+    
+    asyncio.run(response({"type": "http", "extensions": {}}, receive, send))
+
+
+def test_full_body_is_sent_and_finished(tmp_path):
+    path = tmp_path / "song.mp3"
+    path.write_bytes(b"x" * 1000)
+    response = RangedFileResponse(path, 200, {}, "audio/mpeg", [(0, 1000)], stat_result=os.stat(path))
+    
+    messages = []
+    send_response(response, messages)
+    assert b"".join(message.get("body", b"") for message in messages[1:]) == b"x" * 1000
+    assert messages[-1]["more_body"] is False
+
+
+def test_file_shrinking_mid_stream_aborts_instead_of_ending_the_body(tmp_path):
+    path = tmp_path / "song.mp3"
+    path.write_bytes(b"x" * 1000)
+    stat_result = os.stat(path)
+    path.write_bytes(b"x" * 400)
+    response = RangedFileResponse(path, 200, {}, "audio/mpeg", [(0, 1000)], stat_result=stat_result)
+    
+    messages = []
+    with pytest.raises(ShortRead):
+        send_response(response, messages)
+    assert sum(len(message.get("body", b"")) for message in messages[1:]) == 400
+    assert all(message.get("more_body", True) for message in messages)
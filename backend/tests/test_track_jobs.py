@@ -0,0 +1,43 @@
+import asyncio
+
+import pytest
+
+from track_jobs import TrackJob
+
+
+class RecordingJob(TrackJob):
+    name = "Recording"
+    
+    def __init__(self, tracks, **kwargs):
+        super().__init__(None, **kwargs)
+        self.tracks = tracks
+        self.seen = []
+    
+    async def pending_tracks(self):
+        return self.tracks
+    
+    async def process(self, track_id, file_path):
+        self.seen.append(track_id)
+        return not track_id.startswith("bad")
+
+
+def test_track_job_hooks_are_abstract():
+    class Incomplete(TrackJob):
+        async def pending_tracks(self):
+            return []
+    
+    with pytest.raises(TypeError):
+        Incomplete(None)
+
+
+def test_run_counts_processed_and_failed_tracks():
+    tracks = [{"id": track_id, "file_path": f"/{track_id}"} for track_id in ("a", "bad1", "b", "c", "bad2")]
+    job = RecordingJob(tracks, workers=2)
+    
+    async def run():
+        await job.start_background_job()
+    asyncio.run(run())
+    
+    assert job.seen == ["a", "bad1", "b", "c", "bad2"]
+    assert job.status["state"] == "completed"
+    assert (job.status["total"], job.status["processed"], job.status["failed"]) == (5, 3, 2)
@@ -0,0 +1,52 @@
+import asyncio
+import os
+import sys
+
+import pytest
+
+from transcoder import Transcode, TranscodeCache
+
+
+class SlowTranscode(Transcode):
+    """Writes a little output, then hangs like a long ffmpeg run"""
+    
+    def command(self):
+        return [sys.executable, "-c", "import sys, time; sys.stdout.write('x'); sys.stdout.flush(); time.sleep(30)"]
+
+
+def test_cancelled_transcode_fails_its_listeners_and_removes_the_part_file(tmp_path):
+    transcode = SlowTranscode(tmp_path / "song.mp3", "mp3", 128, tmp_path / "out" / "x.mp3.part", tmp_path / "out" / "x.mp3")
+    
+    async def run():
+        task = asyncio.create_task(transcode.run())
+        listener = asyncio.create_task(consume(transcode))
+        while transcode.size == 0:
+            await asyncio.sleep(0.01)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        with pytest.raises(RuntimeError):
+            await asyncio.wait_for(listener, 5)
+    
+    asyncio.run(run())
+    assert transcode.done and transcode.failed
+    assert not transcode.temp_path.exists()
+    assert not transcode.final_path.exists()
+
+
+async def consume(transcode: Transcode) -> bytes:
+    return b"".join([chunk async for chunk in transcode.stream()])
+
+
+def test_cache_key_follows_file_contents_not_path_spelling(tmp_path):
+    cache = TranscodeCache(str(tmp_path / "cache"))
+    source = tmp_path / "song.mp3"
+    source.write_bytes(b"audio")
+    stat_result = os.stat(source)
+    
+    key = cache.cache_key(source, stat_result, "mp3", 128)
+    assert cache.cache_key(tmp_path / "." / "song.mp3", stat_result, "mp3", 128) == key
+    assert cache.cache_key(source, stat_result, "mp3", 192) != key
+    
+    source.write_bytes(b"edited audio")
+    assert cache.cache_key(source, os.stat(source), "mp3", 128) != key
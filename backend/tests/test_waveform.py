@@ -0,0 +1,72 @@
+import asyncio
+import json
+import os
+
+import numpy as np
+import pytest
+
+from conftest import make_request, track, write_wav
+from waveform import BASE_RESOLUTION, compute_peaks, resample_peaks
+
+
+def test_peaks_hold_the_extremes_of_each_bucket():
+    samples = np.zeros(4000, dtype=np.float32)
+    samples[10] = 1.0
+    samples[3990] = -0.5
+    
+    peaks = compute_peaks(samples, resolution=4)
+    assert peaks.dtype == np.int8 and peaks.shape == (4, 2)
+    assert peaks.tolist() == [[0, 127], [0, 0], [0, 0], [-64, 0]]
+    assert compute_peaks(np.zeros(0, dtype=np.float32)).shape == (BASE_RESOLUTION, 2)
+
+
+def test_resampled_peaks_keep_the_overall_extremes():
+    peaks = compute_peaks(np.sin(np.linspace(0, 40, 50000, dtype=np.float32)) * np.linspace(0, 1, 50000))
+    low = resample_peaks(peaks, 100)
+    
+    assert low.shape == (100, 2)
+    assert (low[:, 0].min(), low[:, 1].max()) == (peaks[:, 0].min(), peaks[:, 1].max())
+    assert resample_peaks(peaks, BASE_RESOLUTION * 2) is peaks
+
+
+@pytest.fixture
+def waveform_route(app_module, db, tmp_path, monkeypatch):
+    """Call the waveform route for a WAV track, returning the response"""
+    song = write_wav(tmp_path / "song.wav", seconds=2)
+    db.add_tracks([track("a", str(song))])
+    monkeypatch.setattr(app_module, "db", db)
+    monkeypatch.setattr(app_module.waveform_generator, "db", db)
+    
+    def call(resolution=BASE_RESOLUTION, format="json", headers=None):
+        return asyncio.run(app_module.get_track_waveform(make_request(headers), "a",
+                                                         resolution=resolution, format=format))
+    call.song = song
+    return call
+
+
+def test_waveform_route_serves_json_and_binary_peaks(waveform_route):
+    body = json.loads(waveform_route(resolution=64).body)
+    assert body["resolution"] == 64
+    assert len(body["min"]) == len(body["max"]) == 64
+    assert all(-1 <= low <= high <= 1 for low, high in zip(body["min"], body["max"]))
+    
+    binary = waveform_route(resolution=64, format="binary")
+    assert binary.media_type == "application/octet-stream"
+    assert binary.headers["X-Waveform-Resolution"] == "64"
+    assert np.frombuffer(binary.body, dtype=np.int8).reshape(-1, 2).tolist() == \
+        [[round(low * 127), round(high * 127)] for low, high in zip(body["min"], body["max"])]
+
+
+def test_waveform_etag_revalidates_and_follows_the_file(waveform_route):
+    etag = waveform_route(resolution=64).headers["ETag"]
+    assert waveform_route(resolution=64).headers["ETag"] == etag
+    assert waveform_route(resolution=128).headers["ETag"] != etag
+    assert waveform_route(resolution=64, format="binary").headers["ETag"] != etag
+    
+    cached = waveform_route(resolution=64, headers={"If-None-Match": etag})
+    assert cached.status_code == 304 and cached.body == b""
+    
+    # Editing the file invalidates the stored peaks and their ETag
+    write_wav(waveform_route.song, seconds=3, seed=1)
+    os.utime(waveform_route.song, ns=(0, os.stat(waveform_route.song).st_mtime_ns + 10**9))
+    assert waveform_route(resolution=64, headers={"If-None-Match": etag}).status_code == 200
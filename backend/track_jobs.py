@@ -0,0 +1,80 @@
+"""
+Per-Track Background Jobs
+Shared scaffolding for jobs that work through every track a query returns
+after each library scan (waveforms, fingerprints), with progress reporting
+"""
+
+import asyncio
+import os
+from abc import ABC, abstractmethod
+import time
+from typing import Dict, List, Optional
+
+
+class TrackJob(ABC):
+    """
+    Background job over the tracks that need some derived data
+    
+    Subclasses set name and workers_env and implement pending_tracks() and
+    process(). A run takes the pending tracks once up front, so files that
+    fail (or change again) aren't retried until the next run, and processes
+    them workers at a time.
+    """
+    
+    name = "Track"
+    # Environment variable overriding the number of tracks processed at once
+    workers_env: Optional[str] = None
+    
+    def __init__(self, database, workers: Optional[int] = None):
+        self.db = database
+        if workers is None:
+            workers = (int(os.getenv(self.workers_env, "0")) if self.workers_env else 0) or min(4, os.cpu_count() or 1)
+        self.workers = max(1, workers)
+        self._job: Optional[asyncio.Task] = None
+        self.status = {"state": "idle", "total": 0, "processed": 0, "failed": 0,
+                       "started_at": None, "finished_at": None}
+    
+    @abstractmethod
+    async def pending_tracks(self) -> List[Dict[str, str]]:
+        """Tracks ({"id", "file_path"}) the job should process"""
+    
+    @abstractmethod
+    async def process(self, track_id: str, file_path: str) -> bool:
+        """Process one track, returning False if it failed"""
+    
+    def start_background_job(self, after: Optional[asyncio.Task] = None) -> asyncio.Task:
+        """Start processing pending tracks (once after has finished), or return the running job"""
+        if self._job is None or self._job.done():
+            self.status = {"state": "waiting" if after is not None else "running", "total": 0,
+                           "processed": 0, "failed": 0, "started_at": time.time(), "finished_at": None}
+            self._job = asyncio.create_task(self._run(after))
+        return self._job
+    
+    async def _run(self, after: Optional[asyncio.Task]):
+        if after is not None:
+            await asyncio.wait([after])
+            self.status["state"] = "running"
+        
+        try:
+            tracks = await self.pending_tracks()
+            self.status["total"] = len(tracks)
+            for start in range(0, len(tracks), self.workers):
+                batch = tracks[start:start + self.workers]
+                results = await asyncio.gather(*(self.process(track["id"], track["file_path"]) for track in batch))
+                for ok in results:
+                    self.status["processed" if ok else "failed"] += 1
+            
+            self.status["state"] = "completed"
+        except asyncio.CancelledError:
+            self.status["state"] = "cancelled"
+            raise
+        except Exception as e:
+            print(f"{self.name} job failed: {e}")
+            self.status["state"] = "failed"
+        finally:
+            self.status["finished_at"] = time.time()
+    
+    async def close(self):
+        if self._job is not None and not self._job.done():
+            self._job.cancel()
+            await asyncio.gather(self._job, return_exceptions=True)
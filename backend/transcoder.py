@@ -0,0 +1,280 @@
+"""
+On-the-fly Transcoding using FFmpeg
+Streams a lower-bitrate copy of a track while it is produced and keeps the
+result in a size-bounded, content-addressed disk cache for repeat plays
+"""
+
+import asyncio
+import hashlib
+import os
+import shutil
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import AsyncIterator, Dict, List, Optional
+
+# ffmpeg encoder arguments, container and file extension for each output codec
+CODECS = {
+    "mp3": {"args": ["-c:a", "libmp3lame"], "format": "mp3", "ext": ".mp3", "media_type": "audio/mpeg"},
+    "aac": {"args": ["-c:a", "aac"], "format": "adts", "ext": ".aac", "media_type": "audio/aac"},
+    "opus": {"args": ["-c:a", "libopus"], "format": "ogg", "ext": ".opus", "media_type": "audio/ogg"},
+}
+
+DEFAULT_CODEC = "mp3"
+DEFAULT_BITRATE = 192
+
+
+class TranscodeUnavailable(Exception):
+    """ffmpeg is not installed"""
+
+
+async def require_ffmpeg():
+    """Raise TranscodeUnavailable unless ffmpeg is on the PATH (looked up off the event loop)"""
+    if await asyncio.get_running_loop().run_in_executor(None, shutil.which, "ffmpeg") is None:
+        raise TranscodeUnavailable("ffmpeg is not installed")
+
+
+class Transcode:
+    """
+    One running ffmpeg transcode
+    
+    Output is kept in memory while the transcode runs so any number of
+    listeners can stream it from the start, and is written to a temp file that
+    is renamed into the cache once ffmpeg exits cleanly.
+    """
+    
+    read_size = 64 * 1024
+    
+    def __init__(self, source: Path, codec: str, bitrate: int, temp_path: Path, final_path: Path):
+        self.source = source
+        self.codec = codec
+        self.bitrate = bitrate
+        self.temp_path = temp_path
+        self.final_path = final_path
+        self.media_type = CODECS[codec]["media_type"]
+        self.chunks: List[bytes] = []
+        self.size = 0
+        self.done = False
+        self.failed = False
+        self._changed = asyncio.Condition()
+    
+    def command(self) -> List[str]:
+        spec = CODECS[self.codec]
+        return [
+            "ffmpeg", "-nostdin", "-v", "error",
+            "-i", str(self.source),
+            "-map", "0:a:0", "-vn",
+            *spec["args"], "-b:a", f"{self.bitrate}k",
+            "-f", spec["format"], "pipe:1",
+        ]
+    
+    async def run(self) -> bool:
+        """Run ffmpeg to completion, publishing output as it arrives. Returns True on success."""
+        loop = asyncio.get_running_loop()
+        process = None
+        out = None
+        try:
+            # File writes go through the executor so a slow disk never stalls the event loop
+            await loop.run_in_executor(None, lambda: self.temp_path.parent.mkdir(parents=True, exist_ok=True))
+            process = await asyncio.create_subprocess_exec(
+                *self.command(),
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.DEVNULL
+            )
+            
+            out = await loop.run_in_executor(None, open, self.temp_path, "wb")
+            while True:
+                chunk = await process.stdout.read(self.read_size)
+                if not chunk:
+                    break
+                await self._publish(chunk)
+                await loop.run_in_executor(None, out.write, chunk)
+            await loop.run_in_executor(None, out.close)
+            
+            if await process.wait() != 0 or self.size == 0:
+                raise RuntimeError(f"ffmpeg exited with code {process.returncode}")
+            
+            await loop.run_in_executor(None, os.replace, self.temp_path, self.final_path)
+            return True
+        except asyncio.CancelledError:
+            # Listeners must not wait for output that will never come
+            self.failed = True
+            raise
+        except Exception as e:
+            print(f"Transcode of {self.source} to {self.codec}@{self.bitrate}k failed: {e}")
+            self.failed = True
+            return False
+        finally:
+            if process is not None and process.returncode is None:
+                process.kill()
+                await process.wait()
+            if out is not None:
+                out.close()
+            self.temp_path.unlink(missing_ok=True)
+            self.done = True
+            async with self._changed:
+                self._changed.notify_all()
+    
+    async def _publish(self, chunk: bytes):
+        self.chunks.append(chunk)
+        self.size += len(chunk)
+        async with self._changed:
+            self._changed.notify_all()
+    
+    async def stream(self) -> AsyncIterator[bytes]:
+        """Yield the output from its first byte, waiting for ffmpeg as needed"""
+        index = 0
+        while True:
+            while index < len(self.chunks):
+                yield self.chunks[index]
+                index += 1
+            if self.done:
+                if self.failed:
+                    raise RuntimeError("Transcode failed")
+                return
+            async with self._changed:
+                await self._changed.wait_for(lambda: self.done or index < len(self.chunks))
+
+
+class TranscodeCache:
+    """
+    Disk cache of transcoded tracks with least-recently-used eviction
+    
+    Entries are keyed by a hash of the source identity (device, inode, size,
+    mtime) and the output codec and bitrate, so an edited source never serves
+    a stale variant. The cache directory's total size is kept under max_bytes.
+    """
+    
+    def __init__(self, cache_dir: str = "./transcode_cache", max_bytes: Optional[int] = None):
+        self.cache_dir = Path(cache_dir)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        if max_bytes is None:
+            max_bytes = int(os.getenv("TRANSCODE_CACHE_MAX_MB", "2048")) * 1024 * 1024
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[Path, int]" = OrderedDict()
+        self._total = 0
+        self._running: Dict[str, Transcode] = {}
+        self._tasks = set()
+        self._load()
+    
+    def _load(self):
+        """Index existing cache files, least recently used first"""
+        files = []
+        for path in self.cache_dir.rglob("*"):
+            if not path.is_file():
+                continue
+            if path.name.endswith(".part"):
+                # Left over from an interrupted transcode
+                path.unlink(missing_ok=True)
+                continue
+            stat_result = path.stat()
+            files.append((stat_result.st_atime, path, stat_result.st_size))
+        
+        for _, path, size in sorted(files):
+            self._entries[path] = size
+            self._total += size
+        self._evict()
+    
+    def cache_key(self, source: Path, stat_result: os.stat_result, variant: str, bitrate: int) -> str:
+        """
+        Hash of the source identity and the output variant (codec, HLS segment, ...) and bitrate
+        
+        The file is identified by its stat result alone, so however its path is
+        spelled no filesystem call is needed to key it.
+        """
+        identity = (f"{stat_result.st_dev}|{stat_result.st_ino}|{stat_result.st_size}|{stat_result.st_mtime_ns}"
+                    f"|{variant}|{bitrate}")
+        return hashlib.sha1(identity.encode("utf-8")).hexdigest()
+    
+    def entry_path(self, key: str, ext: str) -> Path:
+        """Where the cache entry for a key lives, fanned out over subdirectories"""
+        return self.cache_dir / key[:2] / f"{key}{ext}"
+    
+    async def hit(self, path: Path) -> bool:
+        """Whether an entry is cached, marking it recently used if so"""
+        if path not in self._entries:
+            return False
+        if not await asyncio.get_running_loop().run_in_executor(None, self._touch, path):
+            if path in self._entries:
+                self._total -= self._entries.pop(path)
+            return False
+        
+        if path in self._entries:
+            self._entries.move_to_end(path)
+        return True
+    
+    @staticmethod
+    def _touch(path: Path) -> bool:
+        """Bump the atime of a cache file, returning False if it is gone"""
+        # Persist recency in the atime so LRU order survives restarts. The mtime
+        # is left alone because it feeds the ETag of the cached file.
+        try:
+            os.utime(path, ns=(time.time_ns(), path.stat().st_mtime_ns))
+            return True
+        except FileNotFoundError:
+            return False
+        except OSError:
+            return True
+    
+    def add(self, path: Path, size: int):
+        """Register a newly written entry, evicting older ones to stay within max_bytes"""
+        if path in self._entries:
+            self._total -= self._entries.pop(path)
+        self._entries[path] = size
+        self._total += size
+        self._evict(keep=path)
+    
+    async def lookup(self, source: Path, stat_result: os.stat_result, codec: str, bitrate: int) -> Optional[Path]:
+        """Get the cached transcode of a source, marking it recently used"""
+        path = self.entry_path(self.cache_key(source, stat_result, codec, bitrate), CODECS[codec]["ext"])
+        return path if await self.hit(path) else None
+    
+    async def start(self, source: Path, stat_result: os.stat_result, codec: str, bitrate: int) -> Transcode:
+        """Start a transcode into the cache, or join the one already running for this variant"""
+        key = self.cache_key(source, stat_result, codec, bitrate)
+        running = self._running.get(key)
+        if running is not None:
+            return running
+        
+        await require_ffmpeg()
+        # A concurrent request may have started it while ffmpeg was looked up
+        running = self._running.get(key)
+        if running is not None:
+            return running
+        
+        final_path = self.entry_path(key, CODECS[codec]["ext"])
+        transcode = Transcode(source, codec, bitrate, final_path.with_name(final_path.name + ".part"), final_path)
+        self._running[key] = transcode
+        
+        task = asyncio.create_task(self._run(key, transcode))
+        # Hold a reference so the task survives its listeners disconnecting
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return transcode
+    
+    async def _run(self, key: str, transcode: Transcode):
+        try:
+            if await transcode.run():
+                self.add(transcode.final_path, transcode.size)
+        finally:
+            self._running.pop(key, None)
+    
+    def _evict(self, keep: Optional[Path] = None):
+        """Delete least recently used entries until the cache fits in max_bytes"""
+        for path in list(self._entries):
+            if self._total <= self.max_bytes:
+                break
+            if path == keep:
+                continue
+            try:
+                path.unlink(missing_ok=True)
+            except OSError:
+                # Still open by a reader on Windows - retry on the next eviction
+                continue
+            self._total -= self._entries.pop(path)
+    
+    async def close(self):
+        """Cancel running transcodes"""
+        for task in list(self._tasks):
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
@@ -0,0 +1,149 @@
+"""
+Waveform Peaks
+Decodes each track once and reduces it to fixed-resolution min/max peaks,
+stored as compact int8 blobs and resampled to whatever resolution a client
+asks for
+"""
+
+import asyncio
+import shutil
+import subprocess
+import wave
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from track_jobs import TrackJob
+
+# Peaks are stored at this many buckets and reduced on request
+BASE_RESOLUTION = 2048
+
+# Decoding to low-rate mono is plenty for peaks and keeps memory small
+DECODE_SAMPLE_RATE = 8000
+
+
+def decode_samples(path: Path, offset: float = 0.0, duration: Optional[float] = None) -> np.ndarray:
+    """
+    Decode an audio file (or duration seconds of it from offset) to mono
+    float32 samples in [-1, 1] at DECODE_SAMPLE_RATE
+    
+    Uses ffmpeg; WAV files are read directly when ffmpeg is not installed.
+    Raises RuntimeError when the file cannot be decoded.
+    """
+    if shutil.which("ffmpeg"):
+        window = (["-ss", str(offset)] if offset else []) + (["-t", str(duration)] if duration else [])
+        result = subprocess.run(
+            ["ffmpeg", "-nostdin", "-v", "error", *window, "-i", str(path),
+             "-map", "0:a:0", "-ac", "1", "-ar", str(DECODE_SAMPLE_RATE),
+             "-f", "s16le", "-acodec", "pcm_s16le", "pipe:1"],
+            capture_output=True,
+            timeout=300
+        )
+        if result.returncode != 0:
+            raise RuntimeError(result.stderr.decode(errors="ignore").strip() or "ffmpeg failed")
+        return np.frombuffer(result.stdout, dtype="<i2").astype(np.float32) / 32768.0
+    
+    if path.suffix.lower() == ".wav":
+        with wave.open(str(path), "rb") as wav:
+            width, channels, rate = wav.getsampwidth(), wav.getnchannels(), wav.getframerate()
+            wav.setpos(min(int(offset * rate), wav.getnframes()))
+            frames = wav.readframes(int(duration * rate) if duration else wav.getnframes())
+        if width == 1:
+            samples = (np.frombuffer(frames, dtype=np.uint8).astype(np.float32) - 128) / 128.0
+        elif width == 2:
+            samples = np.frombuffer(frames, dtype="<i2").astype(np.float32) / 32768.0
+        elif width == 4:
+            samples = np.frombuffer(frames, dtype="<i4").astype(np.float32) / 2147483648.0
+        else:
+            raise RuntimeError(f"Unsupported WAV sample width: {width}")
+        
+        # Match ffmpeg's output: channels averaged, linearly resampled
+        samples = samples[:len(samples) // channels * channels].reshape(-1, channels).mean(axis=1)
+        if rate != DECODE_SAMPLE_RATE and samples.size:
+            positions = np.arange(0, samples.size, rate / DECODE_SAMPLE_RATE)
+            samples = np.interp(positions, np.arange(samples.size), samples).astype(np.float32)
+        return samples
+    
+    raise RuntimeError("ffmpeg is not installed")
+
+
+def compute_peaks(samples: np.ndarray, resolution: int = BASE_RESOLUTION) -> np.ndarray:
+    """Reduce samples to a (resolution, 2) int8 array of per-bucket (min, max)"""
+    if samples.size == 0:
+        return np.zeros((resolution, 2), dtype=np.int8)
+    
+    starts = np.linspace(0, samples.size, resolution + 1).astype(np.int64)[:-1]
+    starts = np.minimum(starts, samples.size - 1)
+    mins = np.minimum.reduceat(samples, starts)
+    maxs = np.maximum.reduceat(samples, starts)
+    peaks = np.stack([mins, maxs], axis=1)
+    return np.clip(np.round(peaks * 127), -127, 127).astype(np.int8)
+
+
+def resample_peaks(peaks: np.ndarray, resolution: int) -> np.ndarray:
+    """Reduce stored peaks to a lower resolution, keeping the extremes of each bucket"""
+    if resolution >= len(peaks):
+        return peaks
+    
+    starts = np.linspace(0, len(peaks), resolution + 1).astype(np.int64)[:-1]
+    mins = np.minimum.reduceat(peaks[:, 0], starts)
+    maxs = np.maximum.reduceat(peaks[:, 1], starts)
+    return np.stack([mins, maxs], axis=1)
+
+
+def peaks_from_blob(blob: bytes) -> np.ndarray:
+    return np.frombuffer(blob, dtype=np.int8).reshape(-1, 2)
+
+
+def build_waveform(path: Path) -> Dict:
+    """Decode a file and compute its stored waveform record"""
+    stat_result = path.stat()
+    peaks = compute_peaks(decode_samples(path))
+    return {
+        "resolution": len(peaks),
+        "peaks": peaks.tobytes(),
+        "file_size": stat_result.st_size,
+        "file_mtime_ns": stat_result.st_mtime_ns
+    }
+
+
+class WaveformGenerator(TrackJob):
+    """
+    Computes waveforms for tracks that lack one (or whose file changed)
+    
+    Runs as a background job after library scans, and on demand for a
+    single track when a client asks before the job got to it.
+    """
+    
+    name = "Waveform"
+    workers_env = "WAVEFORM_WORKERS"
+    
+    def __init__(self, database, workers: Optional[int] = None):
+        super().__init__(database, workers)
+        self._pending: Dict[str, asyncio.Task] = {}
+    
+    async def pending_tracks(self) -> List[Dict[str, str]]:
+        return await self.db.aio.get_tracks_without_waveform()
+    
+    async def process(self, track_id: str, file_path: str) -> bool:
+        return await self.generate(track_id, file_path)
+    
+    async def generate(self, track_id: str, file_path: str) -> bool:
+        """Compute and store one track's waveform, sharing the work with concurrent callers"""
+        task = self._pending.get(track_id)
+        if task is None:
+            task = asyncio.create_task(self._generate(track_id, Path(file_path)))
+            self._pending[track_id] = task
+            task.add_done_callback(lambda _: self._pending.pop(track_id, None))
+        return await asyncio.shield(task)
+    
+    async def _generate(self, track_id: str, path: Path) -> bool:
+        try:
+            loop = asyncio.get_running_loop()
+            record = await loop.run_in_executor(None, build_waveform, path)
+            await self.db.aio.save_waveform(track_id, **record)
+            return True
+        except Exception as e:
+            print(f"Could not compute waveform for {path}: {e}")
+            return False
@@ -6,7 +6,6 @@ import { ListIcon, Pause, Play } from '../../../Icons';
 // Redux
 import { playerService } from '../../../../services/player';
 import { useEffect, useState } from 'react';
-import { getImageAnalysis2 } from '../../../../utils/imageAnyliser';
 import { uiActions } from '../../../../store/slices/ui';
 import tinycolor from 'tinycolor2';
 import { AddSongToLibraryButton } from '../../../Actions/AddSongToLibrary';
@@ -44,14 +43,17 @@ const NowPlayingBarMobile = () => {
   const [currentColor, setColor] = useState('blue');
 
   useEffect(() => {
-    if (currentSong) {
-      getImageAnalysis2(currentSong.album.images[0].url).then((r) => {
-        let color = tinycolor(r);
-        while (color.isLight()) {
-          color = color.darken(10);
-        }
-        setColor(color.toHexString());
-      });
+    // The backend precomputes the cover's dominant colour
+    const dominantColor = (currentSong?.album as { dominant_color?: string | null } | undefined)
+      ?.dominant_color;
+    if (dominantColor) {
+      let color = tinycolor(dominantColor);
+      while (color.isLight()) {
+        color = color.darken(10);
+      }
+      setColor(color.toHexString());
+    } else {
+      setColor('blue');
     }
   }, [currentSong]);
 
@@ -28,6 +28,12 @@ export interface Album {
     height: number;
   }[];
 
+  /** @description Dominant colour of the cover art as a hex string, precomputed by the server (null without art). */
+  dominant_color?: string | null;
+
+  /** @description Colours of the cover art as hex strings, dominant first (null without art). */
+  palette?: string[] | null;
+
   /** @description The name of the album. In case of an album takedown, the value may be an empty string. */
   name: string;
 
@@ -4,9 +4,6 @@ import { FC, RefObject, useEffect, useRef, useState } from 'react';
 import { AlbumList } from './table';
 import { AlbumHeader } from './header';
 
-// Utils
-import { getImageAnalysis2 } from '../../../utils/imageAnyliser';
-
 // Redux
 import { useAppSelector } from '../../../store/store';
 
@@ -21,14 +18,15 @@ const AlbumPageContainer: FC<{ container: RefObject<HTMLDivElement | null> }> =
   const [color, setColor] = useState<string>(DEFAULT_PAGE_COLOR);
 
   useEffect(() => {
-    if (album && album.images?.length) {
-      getImageAnalysis2(album.images[0].url).then((r) => {
-        let color = tinycolor(r);
-        while (color.isLight()) {
-          color = color.darken(10);
-        }
-        setColor(color.toHexString());
-      });
+    // The backend precomputes the cover's dominant colour
+    if (album?.dominant_color) {
+      let color = tinycolor(album.dominant_color);
+      while (color.isLight()) {
+        color = color.darken(10);
+      }
+      setColor(color.toHexString());
+    } else {
+      setColor(DEFAULT_PAGE_COLOR);
     }
   }, [album]);
 
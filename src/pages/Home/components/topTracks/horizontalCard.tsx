@@ -9,10 +9,9 @@ import { uiActions } from '../../../../store/slices/ui';
 // Utils
 import tinycolor from 'tinycolor2';
 import useIsMobile from '../../../../utils/isMobile';
-import { getImageAnalysis2 } from '../../../../utils/imageAnyliser';
 
 // Interfaces
-import { memo, useCallback, useEffect, type FC } from 'react';
+import { memo, useCallback, type FC } from 'react';
 import type { Track } from '../../../../interfaces/track';
 
 // Services
@@ -41,10 +40,6 @@ export const HorizontalCard: FC<HorizontalCardProps> = memo(({ item, setColor })
     playerService.startPlayback({ uris: [item.uri] });
   }, [isCurrent, item.uri, dispatch]);
 
-  useEffect(() => {
-    if (item) getImageAnalysis2(item.album.images[0].url).then();
-  }, [item]);
-
   return (
     <TrackActionsWrapper track={item} trigger={['contextMenu']}>
       <div
@@ -54,13 +49,13 @@ export const HorizontalCard: FC<HorizontalCardProps> = memo(({ item, setColor })
         onMouseEnter={
           !isMobile
             ? () => {
-                getImageAnalysis2(item.album.images[0].url).then((r) => {
-                  let color = tinycolor(r);
-                  while (color.isLight()) {
-                    color = color.darken(10);
-                  }
-                  setColor(color.toHexString());
-                });
+                // The backend precomputes the cover's dominant colour
+                if (!item.album.dominant_color) return;
+                let color = tinycolor(item.album.dominant_color);
+                while (color.isLight()) {
+                  color = color.darken(10);
+                }
+                setColor(color.toHexString());
               }
             : undefined
         }
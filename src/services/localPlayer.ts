@@ -215,11 +215,27 @@ class LocalPlayerService {
       await this.audioPlayer.loadTrack(track.id, streamUrl);
       await this.audioPlayer.play();
       this.emitPlaybackState();
+      this.prefetchUpcoming();
     } catch (error) {
       console.error('Error playing track:', error);
       throw error;
     }
   }
+
+  // Let the server warm the next tracks in the queue while this one plays
+  private prefetchUpcoming() {
+    if (this.shuffle) return;
+
+    const ids = this.queue
+      .slice(this.currentIndex + 1, this.currentIndex + 3)
+      .map((queued) => queued?.id)
+      .filter(Boolean);
+    if (ids.length === 0) return;
+
+    axios.post(`${API_URL}/tracks/prefetch`, { ids, quality: this.currentQuality }).catch(() => {
+      // Prefetching is best-effort
+    });
+  }
   
   public async switchQuality(quality: 'standard' | 'enhanced') {
     if (!this.currentTrack) return;